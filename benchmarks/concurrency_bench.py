@@ -0,0 +1,263 @@
+"""线程模式与异步模式的并发上限与内存对比
+
+对每种服务模式、每个并发级别：启动一个DeepSeek替身服务（固定的慢响应）和一个后端进程，
+同时发起N个生成请求（每个请求的子类别都不同，不会命中缓存或被合并），统计：
+- 成功/失败数与延迟（p50/p95）
+- 上游（替身服务）观察到的并发峰值：即后端实际同时挂起了多少个生成
+- 后端进程的常驻内存峰值（RSS）与线程数峰值（读取/proc，仅限Linux）
+
+模式：
+- threaded：app.py + Werkzeug多线程服务器（每个连接一个线程，上游请求走requests）
+- async：asgi.py + uvicorn（协程，上游请求走httpx）
+
+场景：
+- stream：POST /api/generate_plan/stream，读完整个SSE流
+- generate：POST /api/generate_plan 提交任务，再轮询 /api/jobs/<id> 直到结束
+
+需要：pip install uvicorn httpx
+用法：
+    python benchmarks/concurrency_bench.py --levels 100,500,1000,2000 --upstream-latency 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND = os.path.join(ROOT, "travel-planner", "backend")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"端口{port}在{timeout}秒内没有就绪")
+
+
+def read_proc_status(pid):
+    """返回 (RSS字节数, 线程数)；进程不存在或不是Linux时返回None"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return int(fields["VmRSS"].split()[0]) * 1024, int(fields["Threads"])
+
+
+class ProcessSampler:
+    """后台定期采样进程的RSS与线程数，记录峰值"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            sample = read_proc_status(self.pid)
+            if sample is not None:
+                self.peak_rss = max(self.peak_rss, sample[0])
+                self.peak_threads = max(self.peak_threads, sample[1])
+            self._stop.wait(self.interval)
+
+
+def start_mock(port, args):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "mock_deepseek.py"), "--port", str(port),
+         "--latency", f"fixed:{args.upstream_latency}", "--ttft", f"fixed:{args.upstream_latency}",
+         "--chunk-delay", "0.01", "--chunk-chars", "64"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def start_backend(mode, port, mock_port, level, workdir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": BACKEND + os.pathsep + ROOT,
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_API_URL": f"http://127.0.0.1:{mock_port}/v1/chat/completions",
+        # 不限速，并让连接池、在途上限与任务并发都不低于压测并发，只比较服务模式本身
+        "LLM_RATE": "0",
+        "LLM_MAX_IN_FLIGHT": str(level),
+        "LLM_POOL_SIZE": str(level),
+        "LLM_ASYNC_POOL_SIZE": str(level),
+        "LLM_QUEUE_TIMEOUT": "300",
+        "LLM_READ_TIMEOUT": "300",
+        "JOB_WORKERS": str(level),
+        "JOB_MAX_PENDING": str(level * 2),
+        "ASYNC_JOB_WORKERS": str(level),
+        "ASYNC_JOB_MAX_PENDING": str(level * 2),
+        "TRACE_LOG": os.path.join(workdir, "logs", "trace.jsonl")
+    })
+    if mode == "threaded":
+        command = [sys.executable, "-c",
+                   f"import app; app.app.run(port={port}, threaded=True, debug=False)"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                   "--log-level", "warning", "--backlog", "4096"]
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def stream_once(client, base_url, deadline):
+    selection = {"city": "北京", "category": "人文景观", "subcategory": f"压测-{uuid.uuid4().hex[:12]}"}
+    async with client.stream("POST", f"{base_url}/api/generate_plan/stream", json=selection,
+                             timeout=deadline) as response:
+        if response.status_code != 200:
+            return False
+        async for line in response.aiter_lines():
+            if line.startswith("event: error"):
+                return False
+            if line.startswith("event: done"):
+                return True
+    return False
+
+
+async def generate_once(client, base_url, deadline):
+    selection = {"city": "北京", "category": "人文景观", "subcategory": f"压测-{uuid.uuid4().hex[:12]}"}
+    response = await client.post(f"{base_url}/api/generate_plan", json=selection)
+    if response.status_code != 202:
+        return False
+    job_url = f"{base_url}/api/jobs/{response.json()['job_id']}"
+    end = time.monotonic() + deadline
+    while time.monotonic() < end:
+        await asyncio.sleep(0.5)
+        job = (await client.get(job_url)).json()
+        if job["status"] == "succeeded":
+            return True
+        if job["status"] in ("failed", "cancelled"):
+            return False
+    return False
+
+
+async def drive(base_url, scenario, level, deadline):
+    """同时发起level个请求，返回 (成功数, 失败数, 延迟列表)"""
+    # 每100个连接一个客户端：httpx的连接池很大时分配连接的开销随并发数平方增长，会拖慢压测端
+    once = stream_once if scenario == "stream" else generate_once
+    limits = httpx.Limits(max_connections=110, max_keepalive_connections=110)
+    clients = [httpx.AsyncClient(limits=limits, timeout=deadline) for _ in range(-(-level // 100))]
+
+    async def timed(client):
+        start = time.perf_counter()
+        try:
+            ok = await once(client, base_url, deadline)
+        except (httpx.HTTPError, ValueError):
+            ok = False
+        return ok, time.perf_counter() - start
+
+    try:
+        results = await asyncio.gather(*(timed(clients[i % len(clients)]) for i in range(level)))
+    finally:
+        for client in clients:
+            await client.aclose()
+    latencies = sorted(elapsed for ok, elapsed in results if ok)
+    succeeded = len(latencies)
+    return succeeded, level - succeeded, latencies
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_one(mode, level, args):
+    mock_port, backend_port = free_port(), free_port()
+    mock = start_mock(mock_port, args)
+    with tempfile.TemporaryDirectory() as workdir:
+        backend = start_backend(mode, backend_port, mock_port, level, workdir)
+        try:
+            wait_for_port(mock_port)
+            wait_for_port(backend_port)
+            idle = read_proc_status(backend.pid)
+            with ProcessSampler(backend.pid) as sampler:
+                started = time.perf_counter()
+                succeeded, failed, latencies = asyncio.run(
+                    drive(f"http://127.0.0.1:{backend_port}", args.scenario, level, args.deadline))
+                elapsed = time.perf_counter() - started
+            upstream = httpx.get(f"http://127.0.0.1:{mock_port}/stats").json()
+        finally:
+            backend.terminate()
+            mock.terminate()
+            backend.wait(10)
+            mock.wait(10)
+    return {
+        "mode": mode,
+        "level": level,
+        "succeeded": succeeded,
+        "failed": failed,
+        "elapsed": elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "upstream_peak": upstream["peak_in_flight"],
+        "idle_rss": idle[0] if idle else 0,
+        "peak_rss": sampler.peak_rss,
+        "peak_threads": sampler.peak_threads
+    }
+
+
+def print_report(results):
+    print(f"{'模式':<10}{'并发':>6}{'成功':>6}{'失败':>6}{'上游峰值':>9}{'内存峰值':>10}{'每请求':>9}{'线程':>6}"
+          f"{'p50':>8}{'p95':>8}")
+    for r in results:
+        per_request = (r["peak_rss"] - r["idle_rss"]) / max(1, r["upstream_peak"]) / 1024
+        print(f"{r['mode']:<10}{r['level']:>6}{r['succeeded']:>6}{r['failed']:>6}{r['upstream_peak']:>9}"
+              f"{r['peak_rss'] / 1048576:>8.1f}MB{per_request:>7.0f}KB{r['peak_threads']:>6}"
+              f"{r['p50']:>7.1f}s{r['p95']:>7.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线程模式与异步模式的并发上限与内存对比")
+    parser.add_argument("--modes", default="threaded,async", help="要对比的模式")
+    parser.add_argument("--levels", default="100,500,1000", help="并发级别（逗号分隔）")
+    parser.add_argument("--scenario", choices=("stream", "generate"), default="stream")
+    parser.add_argument("--upstream-latency", type=float, default=10.0, help="替身服务的响应延迟（秒）")
+    parser.add_argument("--deadline", type=float, default=120.0, help="单个请求的最长等待时间（秒）")
+    parser.add_argument("--output", help="把结果保存为JSON文件")
+    args = parser.parse_args()
+
+    results = []
+    for level in [int(value) for value in args.levels.split(",")]:
+        for mode in args.modes.split(","):
+            print(f"运行 {mode} 模式，并发 {level} ...", flush=True)
+            results.append(run_one(mode, level, args))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""后端压测工具
+
+以固定的目标RPS（开环）驱动Flask后端的接口，统计吞吐量与p50/p95/p99延迟，
+并可以保存为基线、与基线对比。配合 mock_deepseek.py 使用即可离线衡量生成链路的性能变化。
+
+场景：
+- catalog：GET 城市/分类/子类别接口
+- generate：POST /api/generate_plan 提交任务并轮询 /api/jobs/<id> 直到结束（端到端延迟）
+- stream：POST /api/generate_plan/stream，分别统计首字延迟（ttft）与总耗时
+
+用法：
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --rps 20 --duration 30 \\
+        --mix catalog=0.7,generate=0.2,stream=0.1 --save-baseline baseline.json
+    python benchmarks/loadtest.py ... --baseline baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+_local = threading.local()
+
+
+def session():
+    """每个工作线程一个Session（复用连接）"""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+class Recorder:
+    """按名称收集延迟样本与错误数"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name):
+        with self.lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        result = {}
+        with self.lock:
+            names = set(self.samples) | set(self.errors)
+            for name in sorted(names):
+                values = sorted(self.samples.get(name, []))
+                result[name] = {
+                    "count": len(values),
+                    "errors": self.errors.get(name, 0),
+                    "throughput": len(values) / elapsed if elapsed else 0.0,
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                    "max": values[-1] if values else 0.0
+                }
+        return result
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Scenarios:
+    def __init__(self, base_url, recorder, cache_busting, poll_interval, job_timeout):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.cache_busting = cache_busting
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.catalog = self._load_catalog()
+
+    def _load_catalog(self):
+        """预先取一次目录，用于构造请求"""
+        catalog = []
+        cities = requests.get(f"{self.base_url}/api/cities").json()
+        for city in cities:
+            for category in requests.get(f"{self.base_url}/api/city/{city}/categories").json():
+                subcategories = requests.get(f"{self.base_url}/api/city/{city}/category/{category}").json()
+                for subcategory in subcategories or ["默认"]:
+                    catalog.append((city, category, subcategory))
+        return catalog
+
+    def _selection(self):
+        city, category, subcategory = random.choice(self.catalog)
+        if self.cache_busting:
+            subcategory = f"{subcategory}-{uuid.uuid4().hex[:8]}"
+        return {"city": city, "category": category, "subcategory": subcategory}
+
+    def catalog_request(self):
+        city, category, _ = random.choice(self.catalog)
+        path = random.choice(["/api/cities", f"/api/city/{city}/categories", f"/api/city/{city}/category/{category}"])
+        start = time.perf_counter()
+        response = session().get(self.base_url + path)
+        if response.status_code == 200:
+            self.recorder.record("catalog", time.perf_counter() - start)
+        else:
+            self.recorder.error("catalog")
+
+    def generate_request(self):
+        start = time.perf_counter()
+        response = session().post(f"{self.base_url}/api/generate_plan", json=self._selection())
+        if response.status_code != 202:
+            self.recorder.error("generate")
+            return
+        self.recorder.record("generate_submit", time.perf_counter() - start)
+        job_url = f"{self.base_url}/api/jobs/{response.json()['job_id']}"
+        deadline = start + self.job_timeout
+        while time.perf_counter() < deadline:
+            job = session().get(job_url).json()
+            if job["status"] == "succeeded":
+                self.recorder.record("generate", time.perf_counter() - start)
+                return
+            if job["status"] in ("failed", "cancelled"):
+                break
+            time.sleep(self.poll_interval)
+        self.recorder.error("generate")
+
+    def stream_request(self):
+        start = time.perf_counter()
+        first = None
+        try:
+            with session().post(f"{self.base_url}/api/generate_plan/stream", json=self._selection(),
+                                stream=True) as response:
+                if response.status_code != 200:
+                    self.recorder.error("stream")
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if first is None and line.startswith("event: token"):
+                        first = time.perf_counter() - start
+                    if line.startswith("event: error"):
+                        self.recorder.error("stream")
+                        return
+        except requests.RequestException:
+            self.recorder.error("stream")
+            return
+        if first is not None:
+            self.recorder.record("stream_ttft", first)
+        self.recorder.record("stream", time.perf_counter() - start)
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(args):
+    recorder = Recorder()
+    scenarios = Scenarios(args.url, recorder, args.cache_busting, args.poll_interval, args.job_timeout)
+    mix = parse_mix(args.mix)
+    actions = {
+        "catalog": scenarios.catalog_request,
+        "generate": scenarios.generate_request,
+        "stream": scenarios.stream_request
+    }
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    def guarded(name):
+        try:
+            actions[name]()
+        except Exception:
+            recorder.error(name)
+
+    interval = 1.0 / args.rps
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        for i in range(total):
+            # 开环调度：按计划时间发出请求，不等待前一个请求完成
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(guarded, random.choices(names, weights)[0])
+    elapsed = time.perf_counter() - start
+    return {"rps": args.rps, "duration": elapsed, "results": recorder.summary(elapsed)}
+
+
+def print_report(report, baseline=None):
+    print(f"目标RPS {report['rps']}，实际用时 {report['duration']:.1f}s")
+    print(f"{'名称':<16}{'次数':>8}{'错误':>6}{'吞吐/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, stats in report["results"].items():
+        line = (f"{name:<16}{stats['count']:>8}{stats['errors']:>6}{stats['throughput']:>9.2f}"
+                f"{stats['p50'] * 1000:>8.0f}ms{stats['p95'] * 1000:>7.0f}ms{stats['p99'] * 1000:>7.0f}ms")
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base["p95"]:
+            change = (stats["p95"] - base["p95"]) / base["p95"]
+            line += f"  p95较基线 {change:+.0%}"
+        print(line)
+
+
+def regressions(report, baseline, max_regression):
+    """返回p95相对基线恶化超过阈值的名称"""
+    failed = []
+    for name, base in baseline.get("results", {}).items():
+        stats = report["results"].get(name)
+        if stats and base["p95"] and (stats["p95"] - base["p95"]) / base["p95"] > max_regression:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端压测工具")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="后端地址")
+    parser.add_argument("--rps", type=float, default=10.0, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--mix", default="catalog=0.7,generate=0.2,stream=0.1", help="场景及权重")
+    parser.add_argument("--max-workers", type=int, default=200, help="压测端最大并发数")
+    parser.add_argument("--cache-busting", action="store_true", help="给子类别加随机后缀，绕过规划缓存")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="轮询任务状态的间隔（秒）")
+    parser.add_argument("--job-timeout", type=float, default=120.0, help="单个生成任务的最长等待时间（秒）")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线文件")
+    parser.add_argument("--baseline", help="与基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="p95允许的最大恶化比例")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存至 {args.save_baseline}")
+
+    if baseline:
+        failed = regressions(report, baseline, args.max_regression)
+        if failed:
+            print(f"p95恶化超过{args.max_regression:.0%}: {', '.join(failed)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""本地DeepSeek替身服务（/v1/chat/completions）
+
+用于在不消耗真实API额度的情况下对后端做压测：
+- 可配置的延迟分布（固定、均匀、对数正态）
+- 支持 stream: true 的流式响应（SSE），可配置首字延迟与分段间隔
+- 按比例注入5xx错误，周期性地返回429（模拟限流突发）
+- 响应中带有与DeepSeek一致的usage字段
+- /stats 返回请求计数以及同时在处理的请求数（in_flight）与峰值（peak_in_flight）
+
+用法：
+    python benchmarks/mock_deepseek.py --port 8900 --latency lognormal:2.0,0.4 --error-rate 0.02 \\
+        --throttle-every 30 --throttle-for 3
+    # 后端指向替身服务
+    DEEPSEEK_API_KEY=test DEEPSEEK_API_URL=http://127.0.0.1:8900/v1/chat/completions python app.py
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PLAN_TEMPLATE = """# {city}三日游 - 特色行程
+
+## 第一天
+
+### 上午
+- 8:00-9:00 酒店早餐
+- 9:30-12:00 游览当地著名景点
+
+### 下午
+- 12:30-13:30 享用当地特色午餐
+- 14:00-17:00 参观博物馆
+
+### 晚上
+- 18:00-20:00 品尝夜市美食
+
+## 第二天
+
+### 上午
+- 9:00-12:00 自然风光徒步
+
+### 下午
+- 14:00-17:00 古镇漫步
+
+### 晚上
+- 19:00-21:00 观看民俗演出
+
+## 第三天
+
+### 上午
+- 9:00-11:30 特色街区购物
+
+### 下午
+- 13:00-16:00 自由活动
+
+## 住宿推荐
+- 中档选择：市中心舒适酒店
+
+## 交通建议
+- 市内交通：建议使用地铁或出租车
+"""
+
+
+class LatencyModel:
+    """延迟分布：fixed:秒 / uniform:最小,最大 / lognormal:中位数,sigma"""
+
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",")] if params else []
+        self.kind = kind
+        self.values = values
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+
+    def sample(self):
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            return random.uniform(self.values[0], self.values[1])
+        median, sigma = self.values
+        return random.lognormvariate(math.log(median), sigma)
+
+
+class MockState:
+    """替身服务的配置与计数"""
+
+    def __init__(self, args):
+        self.latency = LatencyModel(args.latency)
+        self.ttft = LatencyModel(args.ttft)
+        self.chunk_delay = args.chunk_delay
+        self.chunk_chars = args.chunk_chars
+        self.error_rate = args.error_rate
+        self.throttle_every = args.throttle_every
+        self.throttle_for = args.throttle_for
+        self.retry_after = args.retry_after
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "streams": 0, "errors": 0, "throttled": 0}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def throttling(self):
+        """当前是否处于429突发窗口"""
+        if not self.throttle_every:
+            return False
+        return (time.monotonic() - self.started) % self.throttle_every < self.throttle_for
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    stats = dict(state.counters, in_flight=state.in_flight, peak_in_flight=state.peak_in_flight)
+                self._send_json(200, stats)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            state.enter()
+            try:
+                self._handle_post()
+            finally:
+                state.leave()
+
+        def _handle_post(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid json"}})
+                return
+            state.count("requests")
+
+            if state.throttling():
+                state.count("throttled")
+                self._send_json(429, {"error": {"message": "rate limit exceeded"}},
+                                {"Retry-After": str(state.retry_after)})
+                return
+            if random.random() < state.error_rate:
+                state.count("errors")
+                self._send_json(503, {"error": {"message": "service unavailable"}})
+                return
+
+            prompt = payload.get("messages", [{}])[-1].get("content", "")
+            city = "城市"
+            for line in prompt.splitlines():
+                if line.strip().startswith("城市："):
+                    city = line.strip()[3:]
+            content = PLAN_TEMPLATE.format(city=city)
+            usage = {
+                "prompt_tokens": len(prompt),
+                "completion_tokens": len(content),
+                "total_tokens": len(prompt) + len(content)
+            }
+
+            if payload.get("stream"):
+                state.count("streams")
+                self._stream(payload, content, usage)
+            else:
+                time.sleep(state.latency.sample())
+                self._send_json(200, {
+                    "id": uuid.uuid4().hex,
+                    "object": "chat.completion",
+                    "model": payload.get("model", "deepseek-chat"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage
+                })
+
+        def _stream(self, payload, content, usage):
+            time.sleep(state.ttft.sample())
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            completion_id = uuid.uuid4().hex
+            for i in range(0, len(content), state.chunk_chars):
+                self._write_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + state.chunk_chars]}}]
+                })
+                time.sleep(state.chunk_delay)
+            self._write_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_event(self, data):
+            self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status, data, headers=None):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地DeepSeek替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:2.0,0.4", help="非流式响应的延迟分布")
+    parser.add_argument("--ttft", default="uniform:0.3,0.8", help="流式响应的首字延迟分布")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="流式分段之间的间隔（秒）")
+    parser.add_argument("--chunk-chars", type=int, default=8, help="每个流式分段的字符数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的比例")
+    parser.add_argument("--throttle-every", type=float, default=0.0, help="每隔多少秒出现一次429突发（0表示关闭）")
+    parser.add_argument("--throttle-for", type=float, default=2.0, help="每次429突发持续的秒数")
+    parser.add_argument("--retry-after", type=int, default=1, help="429响应中的Retry-After")
+    args = parser.parse_args()
+
+    # 压测时会有上千个并发连接，加大监听队列
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    server.daemon_threads = True
+    print(f"DeepSeek替身服务已启动: http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""桌面应用的页面切换耗时
+
+用合成的目录（城市数、每个类别的子类别数可调）启动TravelPlannerApp，依次执行
+主页 → 城市 → 子类别 → 结果 → 子类别 → 主页 的导航，每一步统计两种耗时（含布局与重绘）：
+- rebuild：导航前先销毁目标页面，相当于之前每次导航都销毁并重建整个界面的做法
+- persistent：页面已存在，只切换与原地更新
+
+需要图形界面（无显示器的Linux可用 xvfb-run）
+用法：
+    python benchmarks/navigation_bench.py --cities 34 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def make_catalog(cities, subcategories):
+    return {
+        f"城市{i:04d}": {
+            category: [f"{category}{j}" for j in range(subcategories)]
+            for category in ("人文景观", "自然景观", "饮食文化")
+        }
+        for i in range(cities)
+    }
+
+
+def timed(root, action):
+    started = time.perf_counter()
+    action()
+    root.update()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桌面应用的页面切换耗时")
+    parser.add_argument("--cities", type=int, default=34, help="目录中的城市数量")
+    parser.add_argument("--subcategories", type=int, default=8, help="每个类别的子类别数量")
+    parser.add_argument("--repeat", type=int, default=5, help="每一步重复的次数（取中位数）")
+    parser.add_argument("--output", help="把结果保存为JSON文件")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    # main.py会在当前目录下创建缓存与存储目录，放到临时目录中
+    workdir = tempfile.mkdtemp(prefix="navigation_bench_")
+    os.chdir(workdir)
+    import main as desktop
+
+    catalog = make_catalog(args.cities, args.subcategories)
+    desktop.TravelPlannerApp.load_city_data = lambda self: setattr(self, "city_data", catalog)
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"无法创建窗口（{e}），无显示器时请使用 xvfb-run 运行")
+    app = desktop.TravelPlannerApp(root)
+    root.update()
+
+    city = sorted(catalog)[0]
+    plan = app.generate_mock_plan(city, "人文景观", catalog[city]["人文景观"][0])
+    app.selected_subcategory = catalog[city]["人文景观"][0]
+    steps = [
+        ("主页 → 城市", "city", lambda: app.show_city_detail(city)),
+        ("城市 → 子类别", "subcategory", lambda: app.show_subcategory("人文景观")),
+        ("子类别 → 结果", "result", lambda: app.show_plan_result(plan)),
+        ("结果 → 子类别", "subcategory", lambda: app.show_subcategory("人文景观")),
+        ("子类别 → 主页", "main", app.create_main_page)
+    ]
+
+    def rebuild_page(page, action):
+        page_frame = app.pages.pop(page, None)
+        if page_frame is not None:
+            page_frame.destroy()
+        action()
+
+    # 先完整走一遍，所有页面都创建好；之后每一轮都从主页出发回到主页
+    for name, page, action in steps:
+        timed(root, action)
+    results = []
+    for _ in range(args.repeat):
+        for name, page, action in steps:
+            results.append((name, "rebuild", timed(root, lambda: rebuild_page(page, action))))
+        for name, page, action in steps:
+            results.append((name, "persistent", timed(root, action)))
+    root.destroy()
+
+    report = []
+    print(f"城市 {args.cities}，每类子类别 {args.subcategories}，重复 {args.repeat} 次（中位数）")
+    print(f"{'导航':<12}{'rebuild':>12}{'persistent':>14}{'加速':>8}")
+    for name, _, _ in steps:
+        rebuild = statistics.median(t for n, mode, t in results if n == name and mode == "rebuild")
+        persistent = statistics.median(t for n, mode, t in results if n == name and mode == "persistent")
+        report.append({"step": name, "rebuild": rebuild, "persistent": persistent})
+        print(f"{name:<12}{rebuild * 1000:>10.1f}ms{persistent * 1000:>12.1f}ms{rebuild / max(persistent, 1e-9):>7.1f}x")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""结果页渲染耗时与规划长度的关系
+
+对不同天数的模拟规划，比较两种渲染方式：
+- sync：逐行 insert(END, line, tag)，一次在主线程插完（之前的做法）
+- sliced：PlanRenderer分片渲染，每片合并为一次insert
+
+统计总耗时与主线程最长的一次连续占用（决定窗口会卡多久；sync模式两者相同）。
+streaming场景模拟流式生成：每次追加若干行，统计每次追加的耗时，验证追加不随已显示内容变慢。
+
+需要图形界面（无显示器的Linux可用 xvfb-run）
+用法：
+    python benchmarks/render_bench.py --days 3,10,30,100,300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tkinter as tk
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from common.itinerary import parse_plan  # noqa: E402
+from common.plan_renderer import PlanRenderer  # noqa: E402
+
+# 与main.py的PLAN_LINE_STYLES相同
+STYLES = {
+    "title": ("", "title"),
+    "heading1": ("", "heading1"),
+    "heading2": ("", "heading2"),
+    "bullet": ("• ", "bullet"),
+    "detail": ("   ◦ ", "bullet"),
+    "text": ("", "normal")
+}
+
+
+def make_plan(days):
+    lines = ["# 北京旅游规划", ""]
+    for day in range(1, days + 1):
+        lines.append(f"## 第{day}天")
+        for slot in ("上午", "下午", "晚上"):
+            lines.append(f"### {slot}")
+            for i in range(4):
+                lines.append(f"- 景点{day}-{slot}-{i}：参观游览，感受当地的历史文化与风土人情，建议预留两小时")
+                lines.append("  - 门票约60元，建议提前在官方渠道预约")
+        lines.append("")
+    lines += ["## 住宿推荐", "- 市中心：交通便利，适合初次到访的游客", "## 实用提示", "- 最佳旅游季节：春秋两季"]
+    return "\n".join(lines)
+
+
+def make_text(root):
+    text = tk.Text(root, wrap="word", width=100, height=40)
+    text.tag_configure("title", font=("Heiti SC", 20, "bold"), spacing1=10, spacing3=10)
+    text.tag_configure("heading1", font=("Heiti SC", 18, "bold"), spacing1=10, spacing3=6)
+    text.tag_configure("heading2", font=("Heiti SC", 16, "bold"), spacing1=8, spacing3=4)
+    text.tag_configure("normal", font=("Heiti SC", 12), spacing1=3, spacing3=3)
+    text.tag_configure("bullet", font=("Heiti SC", 12), spacing1=2, lmargin1=20, lmargin2=30)
+    text.pack(fill=tk.BOTH, expand=True)
+    root.update()
+    return text
+
+
+def render_sync(root, lines):
+    text = make_text(root)
+    started = time.perf_counter()
+    for kind, value in lines:
+        prefix, tag = STYLES[kind]
+        text.insert(tk.END, prefix + value + "\n", tag)
+    root.update()  # 包括布局与重绘
+    elapsed = time.perf_counter() - started
+    text.destroy()
+    return elapsed, elapsed
+
+
+def run_sliced(root, renderer):
+    """驱动事件循环直到渲染完成，返回 (总耗时, 最长的一片)"""
+    longest = 0.0
+    run = renderer._run
+
+    def timed_run():
+        nonlocal longest
+        slice_started = time.perf_counter()
+        run()
+        longest = max(longest, time.perf_counter() - slice_started)
+
+    renderer._run = timed_run
+    started = time.perf_counter()
+    while renderer.busy:
+        root.update()
+    root.update()
+    return time.perf_counter() - started, longest
+
+
+def render_sliced(root, lines, args):
+    text = make_text(root)
+    renderer = PlanRenderer(text, STYLES, slice_ms=args.slice_ms, batch_lines=args.batch_lines)
+    renderer.append(lines)
+    result = run_sliced(root, renderer)
+    text.destroy()
+    return result
+
+
+def render_streaming(root, lines, args):
+    """每次追加chunk行，返回每次追加（含重绘）的耗时"""
+    text = make_text(root)
+    renderer = PlanRenderer(text, STYLES, slice_ms=args.slice_ms, batch_lines=args.batch_lines, follow=True)
+    costs = []
+    for start in range(0, len(lines), args.chunk_lines):
+        renderer.append(lines[start:start + args.chunk_lines])
+        costs.append(run_sliced(root, renderer)[0])
+    text.destroy()
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果页渲染耗时与规划长度的关系")
+    parser.add_argument("--days", default="3,10,30,100,300", help="规划天数（逗号分隔）")
+    parser.add_argument("--slice-ms", type=float, default=8, help="每片最多占用主线程的毫秒数")
+    parser.add_argument("--batch-lines", type=int, default=200, help="每次insert合并的行数")
+    parser.add_argument("--chunk-lines", type=int, default=20, help="streaming场景每次追加的行数")
+    parser.add_argument("--output", help="把结果保存为JSON文件")
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"无法创建窗口（{e}），无显示器时请使用 xvfb-run 运行")
+    root.geometry("900x700")
+
+    results = []
+    print(f"{'天数':>6}{'行数':>8}{'sync总耗时':>12}{'sliced总耗时':>14}{'sliced最长一片':>16}"
+          f"{'追加首次':>10}{'追加末次':>10}")
+    for days in [int(value) for value in args.days.split(",")]:
+        lines = list(parse_plan(make_plan(days)).lines())
+        sync_total, _ = render_sync(root, lines)
+        sliced_total, sliced_longest = render_sliced(root, lines, args)
+        stream_costs = render_streaming(root, lines, args)
+        results.append({
+            "days": days,
+            "lines": len(lines),
+            "sync_total": sync_total,
+            "sliced_total": sliced_total,
+            "sliced_longest": sliced_longest,
+            "append_first": stream_costs[0],
+            "append_last": stream_costs[-1]
+        })
+        print(f"{days:>6}{len(lines):>8}{sync_total * 1000:>10.1f}ms{sliced_total * 1000:>12.1f}ms"
+              f"{sliced_longest * 1000:>14.1f}ms{stream_costs[0] * 1000:>8.1f}ms{stream_costs[-1] * 1000:>8.1f}ms")
+    root.destroy()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""桌面应用的启动耗时（导入与首屏）
+
+每一轮都在新的Python进程里测量（模块缓存不会被上一轮复用），取中位数：
+- import：import main 的耗时（不含解释器本身的启动），同时检查网络、图像、asyncio、sqlite3等
+  只在用到时才需要的模块没有在导入阶段被加载
+- first paint：从进程开始导入到主窗口第一次显示出来（创建TravelPlannerApp、完成布局与绘制）
+
+进程在临时目录中运行（目录快照、缩略图缓存等不会写到仓库里），第一轮不计时，用来生成目录快照，
+之后的每一轮与用户第二次打开应用的情况一致。
+
+与基线对比时，任一项的中位数比基线慢超过 --max-regression 即以非零状态退出；也可以用
+--max-import-ms / --max-paint-ms 指定绝对上限。首屏需要图形界面（无显示器的Linux可用 xvfb-run），
+只检查导入时加 --import-only。
+用法：
+    python benchmarks/startup_bench.py --repeat 10 --save-baseline startup_baseline.json
+    python benchmarks/startup_bench.py --repeat 10 --baseline startup_baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 导入main时不应该加载的模块（只在生成规划、解码图片、使用异步服务模式或打开规划存储时才需要）
+DEFERRED_MODULES = ["requests", "urllib3", "PIL", "asyncio", "sqlite3"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"import": elapsed, "loaded": loaded}}))
+"""
+
+PAINT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import tkinter as tk
+import main
+imported = time.perf_counter()
+try:
+    root = tk.Tk()
+except tk.TclError as e:
+    print(json.dumps({{"error": str(e)}}))
+    sys.exit(0)
+app = main.TravelPlannerApp(root)
+deadline = time.perf_counter() + 30
+while not root.winfo_viewable() and time.perf_counter() < deadline:
+    root.update()
+root.update()
+painted = time.perf_counter()
+print(json.dumps({{"import": imported - started, "paint": painted - started}}))
+root.destroy()
+"""
+
+
+def make_workdir():
+    """临时工作目录：目录文件与城市图片指向仓库，其余运行时文件写在这里"""
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    for name in ("induction.me", "travel-planner"):
+        os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    return workdir
+
+
+def run_child(script, workdir):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    # 应用本身可能打印日志，结果在最后一行
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(args, workdir):
+    import_script = IMPORT_SCRIPT.format(root=ROOT, deferred=DEFERRED_MODULES)
+    paint_script = PAINT_SCRIPT.format(root=ROOT)
+
+    # 第一轮不计时：生成目录快照、缩略图缓存与字节码
+    first = run_child(import_script, workdir)
+    if not args.import_only:
+        first = run_child(paint_script, workdir)
+        if "error" in first:
+            sys.exit(f"无法创建窗口（{first['error']}），无显示器时请使用 xvfb-run 运行，或加 --import-only")
+
+    imports, paints, loaded = [], [], set()
+    for _ in range(args.repeat):
+        result = run_child(import_script, workdir)
+        imports.append(result["import"])
+        loaded.update(result["loaded"])
+        if not args.import_only:
+            paints.append(run_child(paint_script, workdir)["paint"])
+
+    results = {"import": statistics.median(imports)}
+    if paints:
+        results["first_paint"] = statistics.median(paints)
+    return {"repeat": args.repeat, "results": results, "loaded": sorted(loaded)}
+
+
+def print_report(report, baseline=None):
+    print(f"重复 {report['repeat']} 次（中位数）")
+    for name, value in report["results"].items():
+        line = f"{name:<12}{value * 1000:>9.1f}ms"
+        base = (baseline or {}).get("results", {}).get(name)
+        if base:
+            line += f"  较基线 {(value - base) / base:+.0%}"
+        print(line)
+    if report["loaded"]:
+        print(f"导入时加载了应当延迟导入的模块: {', '.join(report['loaded'])}")
+
+
+def regressions(report, baseline, max_regression, limits):
+    """返回超过基线阈值或绝对上限的项"""
+    failed = []
+    for name, value in report["results"].items():
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and (value - base) / base > max_regression:
+            failed.append(f"{name} 较基线慢 {(value - base) / base:.0%}")
+        limit = limits.get(name)
+        if limit is not None and value * 1000 > limit:
+            failed.append(f"{name} {value * 1000:.1f}ms 超过上限 {limit:.0f}ms")
+    if report["loaded"]:
+        failed.append(f"导入时加载了 {', '.join(report['loaded'])}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桌面应用的启动耗时")
+    parser.add_argument("--repeat", type=int, default=10, help="测量的轮数（取中位数）")
+    parser.add_argument("--import-only", action="store_true", help="只测量导入（不需要图形界面）")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线文件")
+    parser.add_argument("--baseline", help="与基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允许比基线慢的最大比例")
+    parser.add_argument("--max-import-ms", type=float, help="导入耗时的绝对上限（毫秒）")
+    parser.add_argument("--max-paint-ms", type=float, help="首屏耗时的绝对上限（毫秒）")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = measure(args, make_workdir())
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存至 {args.save_baseline}")
+
+    limits = {"import": args.max_import_ms, "first_paint": args.max_paint_ms}
+    failed = regressions(report, baseline, args.max_regression, limits)
+    if failed:
+        print("启动耗时回退: " + "；".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
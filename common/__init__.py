@@ -0,0 +1 @@
+"""桌面端（main.py）与后端（travel-planner/backend/app.py）共用的模块"""
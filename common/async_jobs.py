@@ -0,0 +1,135 @@
+"""协程版任务队列（异步服务模式使用）
+
+与jobs.JobQueue共用任务对象、共享状态目录与取消逻辑，每个任务是一个asyncio任务。
+单独放在一个模块里，桌面应用等只用线程版队列的地方不需要导入asyncio。
+"""
+import asyncio
+import threading
+import time
+
+from common.jobs import (
+    CANCELLED, FAILED, FINISHED_STATES, QUEUED, RUNNING, SUCCEEDED,
+    Job, JobQueue, JobQueueFull, JobSnapshot, SharedJobState
+)
+
+
+class AsyncJobQueue:
+    """协程版任务队列：最多workers个任务同时运行，任务函数是协程函数
+
+    与JobQueue的接口一致；取消运行中的任务会直接取消对应的asyncio任务（中断上游请求）。
+    submit需要在事件循环中调用。
+    """
+
+    def __init__(self, workers=1000, max_pending=10000, retention=3600, state_dir=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.shared = SharedJobState(state_dir, retention) if state_dir else None
+
+        self._jobs = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._semaphore = None
+        self._pending = 0
+        self._running = 0
+
+    def submit(self, func, *args, **kwargs):
+        """提交任务，等待中的任务已达上限时抛出JobQueueFull"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"等待中的任务已达上限（{self.max_pending}）")
+            self._prune()
+            job = Job(func, args, kwargs)
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._run(job))
+        self._publish(job)
+        return job
+
+    get = JobQueue.get
+    _check_cancel = JobQueue._check_cancel
+    _publish = JobQueue._publish
+
+    def cancel(self, job_id):
+        """取消任务，任务不存在时返回None"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if isinstance(job, JobSnapshot):
+            if job.status not in FINISHED_STATES:
+                self.shared.request_cancel(job_id)
+            return job
+        job.cancel()
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+        if job.status == QUEUED:
+            job._finish(CANCELLED)
+            self._publish(job)
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "running": self._running,
+                "max_pending": self.max_pending,
+                "jobs": counts
+            }
+
+    async def shutdown(self):
+        """等待所有任务结束"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job):
+        started = False
+        try:
+            async with self._semaphore:
+                with self._lock:
+                    self._pending -= 1
+                    self._running += 1
+                started = True
+                if self._check_cancel(job):
+                    if not job.done:
+                        job._finish(CANCELLED)
+                    return
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._publish(job)
+                try:
+                    result = await job.func(job, *job.args, **job.kwargs)
+                except asyncio.CancelledError:
+                    job._finish(CANCELLED)
+                except Exception as e:
+                    job._finish(CANCELLED if job.cancelled else FAILED, error=str(e))
+                else:
+                    cancelled = self._check_cancel(job)
+                    job._finish(CANCELLED if cancelled else SUCCEEDED, result=None if cancelled else result)
+        except asyncio.CancelledError:
+            # 排队期间被取消
+            if not job.done:
+                job._finish(CANCELLED)
+        finally:
+            with self._lock:
+                if started:
+                    self._running -= 1
+                else:
+                    self._pending -= 1
+            self._tasks.pop(job.id, None)
+            self._publish(job)
+
+    def _prune(self):
+        """清理超过保留时间的已结束任务（调用方需持有锁）"""
+        deadline = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at is not None and job.finished_at < deadline]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,191 @@
+"""异步的DeepSeek HTTP客户端（异步服务模式使用，依赖httpx）
+
+与llm_client.LLMClient的行为一致：共享连接池、连接/读取超时、429/5xx与连接错误的
+指数退避重试（遵循Retry-After）、经过限流器排队；区别是等待网络与排队时不占用线程，
+一个进程可以同时挂起成千上万个上游请求。
+
+httpx是可选依赖，只有异步服务模式需要（见 requirements-serving.txt）
+"""
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from common.llm_client import DEEPSEEK_API_URL, RETRY_STATUS_CODES, LLMClient
+from common.metrics import LLM_REQUEST_DURATION, LLM_RESPONSES
+from common.rate_limit import AsyncUpstreamGovernor
+from common.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 单个httpx连接池的最大连接数
+POOL_SHARD_SIZE = 100
+
+
+class AsyncLLMClient:
+    """带连接池、超时与重试的异步chat/completions客户端"""
+
+    def __init__(self, api_url=DEEPSEEK_API_URL, pool_size=100, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, retry_after_max=30.0,
+                 rate=5.0, burst=5, max_in_flight=None, queue_timeout=30.0):
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.queue_timeout = queue_timeout
+        self.governor = AsyncUpstreamGovernor(rate=rate, burst=burst, max_in_flight=max_in_flight or pool_size)
+
+        # AsyncClient绑定事件循环，第一次使用时再创建。
+        # httpcore每次分配连接都要遍历整个连接池，池子很大时开销随并发数平方增长，
+        # 所以拆成若干个不超过POOL_SHARD_SIZE的小池子轮流使用
+        self._clients = []
+        self._next_client = None
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "connection_errors": 0,
+            "status_codes": {}
+        }
+
+    def _http(self):
+        if not self._clients:
+            shards = max(1, -(-self.pool_size // POOL_SHARD_SIZE))
+            size = -(-self.pool_size // shards)
+            limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+            self._clients = [httpx.AsyncClient(timeout=self.timeout, limits=limits) for _ in range(shards)]
+            self._next_client = itertools.cycle(self._clients)
+        return next(self._next_client)
+
+    async def chat_completions(self, api_key, payload, stream=False, queue_timeout=None):
+        """发送chat/completions请求，返回最终的httpx响应
+
+        非流式响应已读完正文；流式响应只读了响应头，调用方读完后需要 ``await response.aclose()``
+        以归还名额。重试与超时语义同LLMClient.chat_completions。
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        deadline = time.monotonic() + (self.queue_timeout if queue_timeout is None else queue_timeout)
+        attempt = 0
+        while True:
+            with span("llm_queue"):
+                await self.governor.acquire_async(max(0.0, deadline - time.monotonic()))
+            self._counters["requests"] += 1
+            started = time.perf_counter()
+            try:
+                with span("llm_upstream"):
+                    client = self._http()
+                    request = client.build_request("POST", self.api_url, headers=headers, json=payload)
+                    response = await client.send(request, stream=stream)
+            except BaseException as e:
+                # 任何错误都要归还名额（包括调用方被取消、DecodingError、重定向过多等），否则名额永久丢失
+                self.governor.release()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self._counters["connection_errors"] += 1
+                LLM_RESPONSES.labels("error").inc()
+                LLM_REQUEST_DURATION.labels("error", str(stream).lower()).observe(time.perf_counter() - started)
+                if not isinstance(e, httpx.TransportError) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"调用大模型接口出错，{delay:.1f}秒后重试: {e}")
+            else:
+                codes = self._counters["status_codes"]
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                retry_after = self._retry_after(response)
+                if response.status_code == 429:
+                    self.governor.on_throttled(retry_after)
+                elif response.status_code == 200:
+                    self.governor.on_success()
+
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if stream:
+                        self._release_on_close(response, started)
+                    else:
+                        self.governor.release()
+                        self._observe(response.status_code, False, started)
+                    return response
+
+                self.governor.release()
+                self._observe(response.status_code, stream, started)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                logger.warning(f"大模型接口返回{response.status_code}，{delay:.1f}秒后重试")
+                await response.aclose()
+
+            attempt += 1
+            self._counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def _release_on_close(self, response, started):
+        """流式响应关闭时归还调用名额并记录耗时（只执行一次）"""
+        aclose = response.aclose
+        released = False
+
+        async def aclose_and_release():
+            nonlocal released
+            try:
+                await aclose()
+            finally:
+                if not released:
+                    released = True
+                    self.governor.release()
+                    self._observe(response.status_code, True, started)
+
+        response.aclose = aclose_and_release
+
+    def _observe(self, status_code, stream, started):
+        LLM_RESPONSES.labels(status_code).inc()
+        LLM_REQUEST_DURATION.labels(status_code, str(stream).lower()).observe(time.perf_counter() - started)
+
+    def stats(self):
+        """返回请求计数与限流器状态"""
+        stats = {
+            "requests": self._counters["requests"],
+            "retries": self._counters["retries"],
+            "connection_errors": self._counters["connection_errors"],
+            "status_codes": dict(self._counters["status_codes"]),
+            "pool_size": self.pool_size,
+            "governor": self.governor.stats()
+        }
+        return stats
+
+    async def aclose(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.aclose()
+
+    def _backoff(self, attempt):
+        """指数退避 + 全随机抖动"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # Retry-After的解析与同步客户端相同（只依赖response.headers）
+    _retry_after = LLMClient._retry_after
+
+
+_client = None
+
+
+def get_async_client():
+    """获取进程内共享的异步客户端（环境变量同get_client，连接池默认更大）"""
+    global _client
+    if _client is None:
+        _client = AsyncLLMClient(
+            api_url=os.getenv("DEEPSEEK_API_URL", DEEPSEEK_API_URL),
+            pool_size=int(os.getenv("LLM_ASYNC_POOL_SIZE", "100")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            rate=float(os.getenv("LLM_RATE", "5")),
+            burst=int(os.getenv("LLM_BURST", "5")),
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "0")) or None,
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+        )
+    return _client
@@ -0,0 +1,118 @@
+"""城市目录（induction.me）的解析与快照
+
+induction.me是自由格式的文本，解析成本随目录规模增长。这里把解析结果编译成
+带版本号的JSON快照，以源文件的mtime/大小/sha256为键：
+- 源文件未变（mtime与大小一致）时直接加载快照，不再解析也不计算哈希
+- mtime变了但内容哈希一致时，只刷新快照中的mtime
+- 内容变化或快照版本不符时才重新解析
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+# 快照格式版本，解析规则变化时需要递增
+SNAPSHOT_VERSION = 1
+
+CATEGORIES = ("人文景观", "自然景观", "饮食文化")
+
+# 目录加载失败时使用的默认数据
+DEFAULT_CATALOG = {
+    "北京": {
+        "人文景观": ["故宫博物院", "八达岭长城", "颐和园"],
+        "自然景观": ["百里画廊", "京东大峡谷", "八达岭国家森林公园"],
+        "饮食文化": ["北京烤鸭", "稻香村糕点", "涮羊肉"]
+    }
+}
+
+
+def parse_catalog(content):
+    """解析induction.me文本，返回 {城市: {分类: [子类别, ...]}}"""
+    catalog = {}
+    seen = {}  # (城市, 分类) -> 已添加的子类别集合，用于O(1)去重
+    current_city = None
+    current_category = None
+
+    for line in content.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+
+        category = None
+        for name in CATEGORIES:
+            if line.startswith(name):
+                category = name
+                break
+
+        # 检查是否是新城市
+        if category is None and not any(c.isdigit() for c in line):
+            current_city = line.replace("：", "").strip()
+            if current_city not in catalog:
+                catalog[current_city] = {name: [] for name in CATEGORIES}
+
+        # 检查是否是新分类
+        elif category is not None:
+            current_category = category
+
+        # 处理分类内容
+        elif current_city and current_category and "：" not in line:
+            items = catalog[current_city][current_category]
+            known = seen.setdefault((current_city, current_category), set(items))
+            for item in line.replace("，", ",").split(","):
+                item = item.strip()
+                if item and not item.isdigit() and item not in known:
+                    known.add(item)
+                    items.append(item)
+
+    return catalog
+
+
+def load_catalog(path="induction.me", snapshot_path="cache/catalog.json"):
+    """加载城市目录，优先使用快照；源文件不存在时抛出OSError"""
+    st = os.stat(path)
+    snapshot = _read_snapshot(snapshot_path)
+    if snapshot is not None and snapshot["mtime_ns"] == st.st_mtime_ns and snapshot["size"] == st.st_size:
+        return snapshot["catalog"]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    if snapshot is not None and snapshot["sha256"] == digest:
+        catalog = snapshot["catalog"]
+    else:
+        catalog = parse_catalog(raw.decode("utf-8"))
+
+    _write_snapshot(snapshot_path, {
+        "version": SNAPSHOT_VERSION,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": digest,
+        "catalog": catalog
+    })
+    return catalog
+
+
+def _read_snapshot(snapshot_path):
+    """读取快照，不存在、损坏或版本不符时返回None"""
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def _write_snapshot(snapshot_path, snapshot):
+    """原子写入快照；写入失败不影响本次加载"""
+    directory = os.path.dirname(snapshot_path) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        pass
@@ -0,0 +1,270 @@
+"""结构化的行程模型
+
+生成的规划是Markdown：``# 标题``、``## 第一天`` / ``## 住宿推荐`` 这样的段落、``### 上午`` 这样的时段，
+以及 ``- `` 列表项（缩进的 ``- `` 是上一项的补充说明）。规划在生成（保存）时解析一次，
+结构与原文一起存储；渲染与查询直接使用结构，不用每次再逐行匹配。
+段落之间的空行保留为BLANK行（渲染时是行间距，与原文的版式一致），接口返回的结构里不含空行：
+
+    itinerary = parse_plan(text)
+    itinerary.slot(2, "下午")          # 第二天下午
+    for kind, text in itinerary.lines():  # 按原文顺序逐行渲染
+        ...
+
+各个类都使用 ``__slots__``，一篇规划只占很少的内存；``to_data``/``from_data`` 与紧凑的
+JSON数组互相转换，用于存储。``to_dict`` 是接口返回的可读格式。
+"""
+import json
+import re
+
+# 行的类型（渲染器据此选择样式）
+TITLE = "title"
+HEADING1 = "heading1"
+HEADING2 = "heading2"
+BULLET = "bullet"
+DETAIL = "detail"
+TEXT = "text"
+BLANK = "blank"
+
+# 存储格式的版本（2：保留空行与没有上一项的补充说明）
+FORMAT_VERSION = 2
+
+BULLET_PATTERN = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+DAY_PATTERN = re.compile(r"第\s*([一二两三四五六七八九十\d]+)\s*天|day\s*(\d+)", re.IGNORECASE)
+CHINESE_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+class Entry:
+    """一行内容：列表项（可带缩进的补充说明）、普通文字或空行"""
+
+    __slots__ = ("kind", "text", "details")
+
+    def __init__(self, kind, text, details=None):
+        self.kind = kind
+        self.text = text
+        self.details = details or []
+
+    def to_dict(self):
+        data = {"type": self.kind, "text": self.text}
+        if self.details:
+            data["details"] = list(self.details)
+        return data
+
+
+class Slot:
+    """一个时段（### 上午）"""
+
+    __slots__ = ("name", "entries")
+
+    def __init__(self, name, entries=None):
+        self.name = name
+        self.entries = entries or []
+
+    @property
+    def items(self):
+        return [entry for entry in self.entries if entry.kind == BULLET]
+
+    def to_dict(self):
+        return {"name": self.name, "entries": _entries_dict(self.entries)}
+
+
+class Section:
+    """一个段落（## 第一天 / ## 住宿推荐）；day是第几天，不是按天的段落为None"""
+
+    __slots__ = ("title", "day", "entries", "slots")
+
+    def __init__(self, title, day=None, entries=None, slots=None):
+        self.title = title
+        self.day = day
+        self.entries = entries or []  # 第一个时段之前的内容
+        self.slots = slots or []
+
+    def slot(self, name):
+        """名称包含name的第一个时段（"下午" 可以匹配 "### 下午（14:00-17:00）"）"""
+        for slot in self.slots:
+            if name in slot.name:
+                return slot
+        return None
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "day": self.day,
+            "entries": _entries_dict(self.entries),
+            "slots": [slot.to_dict() for slot in self.slots]
+        }
+
+
+class Itinerary:
+    """一篇规划的结构"""
+
+    __slots__ = ("title", "entries", "sections")
+
+    def __init__(self, title="", entries=None, sections=None):
+        self.title = title
+        self.entries = entries or []  # 第一个段落之前的内容
+        self.sections = sections or []
+
+    @property
+    def days(self):
+        return [section for section in self.sections if section.day is not None]
+
+    def day(self, number):
+        """第number天的段落，没有时返回None"""
+        for section in self.sections:
+            if section.day == number:
+                return section
+        return None
+
+    def section(self, title):
+        """标题包含title的第一个段落（例如 "住宿"）"""
+        for section in self.sections:
+            if title in section.title:
+                return section
+        return None
+
+    def slot(self, day, name):
+        """第day天名为name的时段，例如 slot(2, "下午")"""
+        section = self.day(day)
+        return section.slot(name) if section is not None else None
+
+    def lines(self):
+        """按原文顺序逐行产出 (类型, 文字)，供渲染器使用"""
+        if self.title:
+            yield TITLE, self.title
+        yield from _entry_lines(self.entries)
+        for section in self.sections:
+            if section.title:
+                yield HEADING1, section.title
+            yield from _entry_lines(section.entries)
+            for slot in section.slots:
+                yield HEADING2, slot.name
+                yield from _entry_lines(slot.entries)
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "entries": _entries_dict(self.entries),
+            "sections": [section.to_dict() for section in self.sections]
+        }
+
+    def to_data(self):
+        """紧凑的存储格式（嵌套数组）"""
+        return [
+            FORMAT_VERSION,
+            self.title,
+            _entries_data(self.entries),
+            [[section.title, section.day, _entries_data(section.entries),
+              [[slot.name, _entries_data(slot.entries)] for slot in section.slots]]
+             for section in self.sections]
+        ]
+
+    @classmethod
+    def from_data(cls, data):
+        version, title, entries, sections = data
+        if version != FORMAT_VERSION:
+            raise ValueError(f"不支持的行程格式版本: {version}")
+        return cls(title, _entries_from_data(entries), [
+            Section(section_title, day, _entries_from_data(section_entries),
+                    [Slot(name, _entries_from_data(slot_entries)) for name, slot_entries in slots])
+            for section_title, day, section_entries, slots in sections
+        ])
+
+    def dumps(self):
+        return json.dumps(self.to_data(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_data(json.loads(text))
+
+
+def classify_line(line):
+    """判断一行Markdown的类型，返回 (类型, 去掉标记后的文字)；空行返回 (BLANK, "")"""
+    stripped = line.strip()
+    if not stripped:
+        return BLANK, ""
+    if line.startswith("# "):
+        return TITLE, line[2:].strip()
+    if line.startswith("## "):
+        return HEADING1, line[3:].strip()
+    if line.startswith("### "):
+        return HEADING2, line[4:].strip()
+    match = BULLET_PATTERN.match(line)
+    if match and match.group(2):
+        return (DETAIL if len(match.group(1).expandtabs(4)) >= 2 else BULLET), match.group(2).strip()
+    return TEXT, stripped
+
+
+def parse_day(title):
+    """从段落标题中解析第几天（"第二天"、"第 3 天"、"Day 2"），不是按天的段落返回None"""
+    match = DAY_PATTERN.search(title)
+    if not match:
+        return None
+    if match.group(2):
+        return int(match.group(2))
+    value = match.group(1)
+    if value.isdigit():
+        return int(value)
+    # 中文数字（到九十九为止）
+    if "十" in value:
+        tens, _, ones = value.partition("十")
+        return CHINESE_DIGITS.get(tens, 1) * 10 + CHINESE_DIGITS.get(ones, 0)
+    return CHINESE_DIGITS.get(value)
+
+
+def parse_plan(text):
+    """把Markdown规划解析为Itinerary（开头与结尾的空行不保留）"""
+    itinerary = Itinerary()
+    section = None
+    slot = None
+    blanks = 0  # 还没有放入结构的空行（后面有内容时才放入，结尾的空行因此被丢掉）
+    for line in (text or "").splitlines():
+        kind, value = classify_line(line)
+        if kind == BLANK:
+            if itinerary.title or itinerary.entries or itinerary.sections:
+                blanks += 1
+            continue
+        if blanks:
+            entries = slot.entries if slot is not None else (
+                section.entries if section is not None else itinerary.entries)
+            entries.extend(Entry(BLANK, "") for _ in range(blanks))
+            blanks = 0
+        if kind == TITLE and not itinerary.title and section is None:
+            itinerary.title = value
+        elif kind in (TITLE, HEADING1):
+            section = Section(value, parse_day(value))
+            itinerary.sections.append(section)
+            slot = None
+        elif kind == HEADING2:
+            if section is None:
+                section = Section("")
+                itinerary.sections.append(section)
+            slot = Slot(value)
+            section.slots.append(slot)
+        else:
+            entries = slot.entries if slot is not None else (
+                section.entries if section is not None else itinerary.entries)
+            if kind == DETAIL and entries and entries[-1].kind == BULLET:
+                entries[-1].details.append(value)
+            else:
+                # 前面没有列表项的补充说明仍按补充说明显示
+                entries.append(Entry(kind, value))
+    return itinerary
+
+
+def _entry_lines(entries):
+    for entry in entries:
+        yield entry.kind, entry.text
+        for detail in entry.details:
+            yield DETAIL, detail
+
+
+def _entries_dict(entries):
+    return [entry.to_dict() for entry in entries if entry.kind != BLANK]
+
+
+def _entries_data(entries):
+    return [[entry.kind, entry.text] + ([entry.details] if entry.details else []) for entry in entries]
+
+
+def _entries_from_data(data):
+    return [Entry(item[0], item[1], item[2] if len(item) > 2 else None) for item in data]
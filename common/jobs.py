@@ -0,0 +1,363 @@
+"""后台任务队列（有界工作线程池）
+
+请求线程只负责提交任务并立即返回任务ID，真正耗时的生成工作由固定数量的
+工作线程完成，吞吐量因此受上游限制，而不是受Web服务器线程数限制。
+异步服务模式下的协程版本是 ``common.async_jobs.AsyncJobQueue``，每个任务是一个asyncio任务。
+
+多进程部署时任务表在各个工作进程里各有一份；指定 ``state_dir`` 后任务状态会同时写入共享目录，
+轮询请求落到其他工作进程时也能查到任务，取消请求通过目录中的标记文件转交给执行任务的进程。
+"""
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """等待中的任务已达上限"""
+
+
+class JobCancelled(Exception):
+    """任务在执行过程中被取消"""
+
+
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class Job:
+    """一个后台任务
+
+    任务函数的第一个参数是Job本身，可以通过 ``job.cancelled`` 检查是否已被取消；
+    Job也是传给LLMClient的取消令牌：``job.on_cancel`` 登记的回调（例如关闭进行中的响应）在取消时执行。
+    """
+
+    def __init__(self, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._cancel_callbacks = []
+        self._callback_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self._done_event.is_set()
+
+    def cancel(self):
+        """请求取消任务；排队中的任务不会再执行，运行中的任务结果会被丢弃"""
+        with self._callback_lock:
+            self._cancel_event.set()
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # 取消是尽力而为，回调失败不影响取消本身
+
+    def on_cancel(self, callback):
+        """登记取消时执行的回调（已取消时立即执行），返回注销回调的函数"""
+        with self._callback_lock:
+            if not self._cancel_event.is_set():
+                self._cancel_callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def wait_cancelled(self, timeout):
+        """最多等待timeout秒，期间被取消时立即返回True"""
+        return self._cancel_event.wait(timeout)
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回是否已结束"""
+        return self._done_event.wait(timeout)
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+    def _remove_callback(self, callback):
+        with self._callback_lock:
+            if callback in self._cancel_callbacks:
+                self._cancel_callbacks.remove(callback)
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._done_event.set()
+
+
+class JobSnapshot:
+    """其他工作进程中的任务（只有状态快照）"""
+
+    trace = None
+
+    def __init__(self, data):
+        self.id = data["job_id"]
+        self.status = data["status"]
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class SharedJobState:
+    """任务状态的共享目录：每个任务一个JSON快照，取消请求是一个 ``.cancel`` 标记文件"""
+
+    def __init__(self, directory, retention=3600, prune_interval=60):
+        self.directory = directory
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._pruned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def publish(self, job):
+        """原子地写入任务快照"""
+        data = json.dumps(job.to_dict(), ensure_ascii=False).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(job.id, ".json"))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        self._prune()
+
+    def load(self, job_id):
+        """读取任务快照，不存在时返回None"""
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json"), "r", encoding="utf-8") as f:
+                return JobSnapshot(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def discard(self, job_id):
+        try:
+            os.remove(self._path(job_id, ".json"))
+        except OSError:
+            pass
+
+    def request_cancel(self, job_id):
+        with open(self._path(job_id, ".cancel"), "w"):
+            pass
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self._path(job_id, ".cancel"))
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def _prune(self):
+        """定期删除超过保留时间的快照与标记"""
+        now = time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        deadline = now - self.retention
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < deadline:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class JobQueue:
+    """有界工作线程池 + 任务表"""
+
+    def __init__(self, workers=4, max_pending=100, retention=3600, state_dir=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention  # 已结束任务的保留时间（秒）
+        self.shared = SharedJobState(state_dir, retention) if state_dir else None
+
+        # 上限由_pending计数（而不是队列本身的maxsize）：排队中被取消的任务立即让出名额，
+        # 不必等工作线程把它从队列里取出
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+
+    def submit(self, func, *args, **kwargs):
+        """提交任务，队列已满时抛出JobQueueFull"""
+        self._ensure_workers()
+        job = Job(func, args, kwargs)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise JobQueueFull(f"等待中的任务已达上限（{self.max_pending}）")
+            self._prune()
+            self._jobs[job.id] = job
+            self._pending.add(job.id)
+        # 先发布排队状态，工作线程随后写入的运行状态才不会被覆盖
+        self._publish(job)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """查询任务；本进程没有时查共享目录（返回JobSnapshot）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.shared is not None:
+            return self.shared.load(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """取消任务，任务不存在时返回None"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if isinstance(job, JobSnapshot):
+            # 任务在其他工作进程中，留下取消标记由它处理
+            if job.status not in FINISHED_STATES:
+                self.shared.request_cancel(job_id)
+            return job
+        job.cancel()
+        if job.status == QUEUED:
+            # 任务对象仍留在队列里，工作线程取出后直接跳过；名额现在就归还
+            with self._lock:
+                self._pending.discard(job.id)
+            job._finish(CANCELLED)
+            self._publish(job)
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            running = self._running
+            pending = len(self._pending)
+        return {
+            "workers": self.workers,
+            "pending": pending,
+            "running": running,
+            "max_pending": self.max_pending,
+            "jobs": counts
+        }
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """停止工作线程（已排队的任务会先执行完；cancel_pending为True时直接取消排队中的任务）"""
+        while cancel_pending:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._pending.discard(job.id)
+            job.cancel()
+            if not job.done:
+                job._finish(CANCELLED)
+                self._publish(job)
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _ensure_workers(self):
+        """按需启动工作线程（延迟到第一次提交，避免在fork之前创建线程）"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._lock:
+                self._pending.discard(job.id)
+            if self._check_cancel(job):
+                if not job.done:
+                    job._finish(CANCELLED)
+                    self._publish(job)
+                continue
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._publish(job)
+            with self._lock:
+                self._running += 1
+            try:
+                result = job.func(job, *job.args, **job.kwargs)
+            except Exception as e:
+                job._finish(CANCELLED if job.cancelled else FAILED, error=str(e))
+            else:
+                # 运行期间被取消的任务，结果直接丢弃
+                if self._check_cancel(job):
+                    job._finish(CANCELLED)
+                else:
+                    job._finish(SUCCEEDED, result=result)
+            finally:
+                with self._lock:
+                    self._running -= 1
+            self._publish(job)
+
+    def _check_cancel(self, job):
+        """任务是否已取消（包括其他工作进程转交来的取消请求）"""
+        if not job.cancelled and self.shared is not None and self.shared.cancel_requested(job.id):
+            job.cancel()
+        return job.cancelled
+
+    def _publish(self, job):
+        if self.shared is not None:
+            self.shared.publish(job)
+
+    def _prune(self):
+        """清理超过保留时间的已结束任务（调用方需持有锁）"""
+        deadline = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at is not None and job.finished_at < deadline]
+        for job_id in expired:
+            del self._jobs[job_id]
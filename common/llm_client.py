@@ -0,0 +1,358 @@
+"""共享的DeepSeek HTTP客户端
+
+桌面端与后端的所有大模型调用都经过这里：
+- 复用同一个连接池（keep-alive），避免每次请求都重新握手TCP+TLS
+- 连接/读取分别设置超时，上游卡住时不会永久占用工作线程
+- 遇到429/5xx或连接错误时按指数退避+随机抖动重试，并遵循Retry-After
+- 所有请求经过限流器排队（见rate_limit.py），超过截止时间才放弃
+- 传入取消令牌时，排队、发送、等待响应头、读取流式正文的各个阶段都可以被取消
+"""
+import email.utils
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from common.jobs import JobCancelled
+from common.metrics import LLM_REQUEST_DURATION, LLM_RESPONSES
+from common.rate_limit import UpstreamGovernor
+from common.tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+
+# 需要重试的HTTP状态码
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# 需要重试的请求错误：连接失败、超时、正文读到一半连接断开
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+# 当前线程正在发送的请求（InFlightRequest），连接池取出连接时登记到它上面
+_in_flight = threading.local()
+
+
+class InFlightRequest:
+    """一个正在发送、还没有收到响应头的请求
+
+    取消时关闭它正在使用的连接的socket，阻塞在发送或等待响应头的线程随即出错返回；
+    取消发生在建立连接期间时，连接建立后立即关闭。
+    """
+
+    def __init__(self):
+        self.aborted = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        """登记请求使用的连接（在发送请求的线程中调用）"""
+        with self._lock:
+            self._conn = conn
+            aborted = self.aborted
+        if aborted:
+            _shutdown(conn)
+
+    def detach(self):
+        """请求已收到响应头，之后的取消由关闭响应处理"""
+        with self._lock:
+            self._conn = None
+
+    def abort(self):
+        """取消请求（可在任意线程中调用）"""
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+        if conn is not None:
+            _shutdown(conn)
+
+
+def _shutdown(conn):
+    # 响应需要关闭连接（Connection: close）时http.client在返回响应头后就把conn.sock置为None，
+    # 正文仍从原来的socket读取，所以用连接建立时记下的socket
+    sock = getattr(conn, "sock", None) or getattr(conn, "abort_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _current_request():
+    return getattr(_in_flight, "request", None)
+
+
+class AbortableConnectionMixin:
+    abort_sock = None
+
+    def connect(self):
+        super().connect()
+        self.abort_sock = self.sock
+        request = _current_request()
+        if request is not None and request.aborted:
+            _shutdown(self)
+
+
+class AbortableHTTPConnection(AbortableConnectionMixin, HTTPConnection):
+    pass
+
+
+class AbortableHTTPSConnection(AbortableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class AbortableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = AbortableHTTPConnection
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        request = _current_request()
+        if request is not None:
+            request.attach(conn)
+        return conn
+
+
+class AbortableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = AbortableHTTPSConnection
+    _get_conn = AbortableHTTPConnectionPool._get_conn
+
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    """连接池中的连接可以被其他线程中止（用于取消正在发送的请求）"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": AbortableHTTPConnectionPool,
+            "https": AbortableHTTPSConnectionPool
+        }
+
+
+class LLMClient:
+    """带连接池、超时与重试的chat/completions客户端"""
+
+    def __init__(self, api_url=DEEPSEEK_API_URL, pool_size=10, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, retry_after_max=30.0,
+                 rate=5.0, burst=5, max_in_flight=None, queue_timeout=30.0):
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.queue_timeout = queue_timeout
+        self.governor = UpstreamGovernor(rate=rate, burst=burst, max_in_flight=max_in_flight or pool_size)
+
+        # 连接池大小与并发量一致；池满时阻塞等待而不是额外新建连接
+        self._adapter = AbortableHTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "connection_errors": 0,
+            "status_codes": {}
+        }
+
+    def chat_completions(self, api_key, payload, stream=False, queue_timeout=None, cancel=None):
+        """发送chat/completions请求，返回最终的响应对象
+
+        可重试的失败在重试次数用尽后：状态码错误返回最后一次响应，连接错误抛出异常。
+        流式请求只在收到响应头之前重试，调用方读完后需要关闭响应以归还名额。
+        在截止时间（queue_timeout秒）内拿不到调用名额时抛出RateLimitTimeout。
+
+        cancel是取消令牌（jobs.Job）：取消后不再排队、发起或重试请求（抛出JobCancelled）；
+        正在发送、等待响应头的请求会被中止（关闭它使用的连接）；
+        已返回的流式响应会被关闭，正在读取正文的线程随即出错退出。
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        deadline = time.monotonic() + (self.queue_timeout if queue_timeout is None else queue_timeout)
+        attempt = 0
+        while True:
+            with span("llm_queue"):
+                self.governor.acquire(max(0.0, deadline - time.monotonic()), cancel=cancel)
+            if cancel is not None and cancel.cancelled:
+                self.governor.release()
+                raise JobCancelled("任务已取消，不再调用大模型接口")
+            self._count("requests")
+            started = time.perf_counter()
+            request = unregister = None
+            if cancel is not None:
+                request = _in_flight.request = InFlightRequest()
+                unregister = cancel.on_cancel(request.abort)
+            try:
+                with span("llm_upstream"):
+                    response = self.session.post(self.api_url, headers=headers, json=payload,
+                                                 stream=stream, timeout=self.timeout)
+            except Exception as e:
+                # 任何请求错误都要归还名额（包括读取正文时的ChunkedEncodingError、重定向过多等），否则名额永久丢失
+                self.governor.release()
+                if request is not None and request.aborted:
+                    # 取消时关闭连接导致的错误，不算上游故障，也不重试
+                    raise JobCancelled("任务已取消，已中止进行中的请求") from e
+                self._count("connection_errors")
+                LLM_RESPONSES.labels("error").inc()
+                LLM_REQUEST_DURATION.labels("error", str(stream).lower()).observe(time.perf_counter() - started)
+                if not isinstance(e, RETRY_EXCEPTIONS) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"调用大模型接口出错，{delay:.1f}秒后重试: {e}")
+            else:
+                if cancel is not None and cancel.cancelled:
+                    # 收到响应头的同时被取消
+                    self.governor.release()
+                    response.close()
+                    raise JobCancelled("任务已取消，已中止进行中的请求")
+                self._count_status(response.status_code)
+                retry_after = self._retry_after(response)
+                if response.status_code == 429:
+                    self.governor.on_throttled(retry_after)
+                elif response.status_code == 200:
+                    self.governor.on_success()
+
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if stream:
+                        self._release_on_close(response, started)
+                        if cancel is not None:
+                            # 响应关闭后注销回调，取消令牌不再持有已结束的响应
+                            response.on_close = cancel.on_cancel(response.close)
+                    else:
+                        self.governor.release()
+                        self._observe(response.status_code, False, started)
+                    return response
+
+                self.governor.release()
+                self._observe(response.status_code, stream, started)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                logger.warning(f"大模型接口返回{response.status_code}，{delay:.1f}秒后重试")
+                response.close()
+            finally:
+                if request is not None:
+                    request.detach()
+                    unregister()
+                    _in_flight.request = None
+
+            attempt += 1
+            self._count("retries")
+            if cancel is not None:
+                if cancel.wait_cancelled(delay):
+                    raise JobCancelled("任务已取消，不再重试")
+            else:
+                time.sleep(delay)
+
+    def _release_on_close(self, response, started):
+        """流式响应关闭时归还调用名额、记录耗时并调用response.on_close（只执行一次）"""
+        close = response.close
+        released = threading.Event()
+        response.on_close = None
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    self.governor.release()
+                    self._observe(response.status_code, True, started)
+                    if response.on_close is not None:
+                        response.on_close()
+
+        response.close = close_and_release
+
+    def _observe(self, status_code, stream, started):
+        LLM_RESPONSES.labels(status_code).inc()
+        LLM_REQUEST_DURATION.labels(status_code, str(stream).lower()).observe(time.perf_counter() - started)
+
+    def stats(self):
+        """返回请求计数与连接池状态"""
+        with self._lock:
+            stats = {
+                "requests": self._counters["requests"],
+                "retries": self._counters["retries"],
+                "connection_errors": self._counters["connection_errors"],
+                "status_codes": dict(self._counters["status_codes"])
+            }
+        pools = []
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            # 池中未建立连接的槽位以None占位
+            idle = [conn for conn in list(pool.pool.queue) if conn is not None] if pool.pool is not None else []
+            pools.append({
+                "host": pool.host,
+                "port": pool.port,
+                "maxsize": pool.pool.maxsize if pool.pool is not None else 0,
+                "idle_connections": len(idle),
+                "connections_opened": pool.num_connections,
+                "requests_served": pool.num_requests
+            })
+        stats["pool_size"] = self.pool_size
+        stats["pools"] = pools
+        stats["governor"] = self.governor.stats()
+        return stats
+
+    def _backoff(self, attempt):
+        """指数退避 + 全随机抖动"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        """解析Retry-After（秒数或HTTP日期），无效时返回None"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.retry_after_max)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _count_status(self, status_code):
+        with self._lock:
+            codes = self._counters["status_codes"]
+            codes[status_code] = codes.get(status_code, 0) + 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取进程内共享的客户端（参数可通过环境变量配置）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    api_url=os.getenv("DEEPSEEK_API_URL", DEEPSEEK_API_URL),
+                    pool_size=int(os.getenv("LLM_POOL_SIZE", "10")),
+                    connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+                    read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+                    rate=float(os.getenv("LLM_RATE", "5")),
+                    burst=int(os.getenv("LLM_BURST", "5")),
+                    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "0")) or None,
+                    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+                )
+    return _client
@@ -0,0 +1,248 @@
+"""Prometheus文本格式的指标
+
+不依赖prometheus_client，只实现这里用到的Counter、Gauge、Histogram（带标签），
+并在模块级定义后端与大模型客户端共用的指标。用 ``REGISTRY.render()`` 输出 /metrics 的内容。
+"""
+import bisect
+import threading
+
+# 默认的延迟分桶（秒），覆盖从毫秒级的缓存命中到数十秒的大模型生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, function):
+        """采集时调用function取值（用于转发其他组件自己维护的计数）"""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def set_function(self, function):
+        """采集时调用function取值"""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---- 后端与大模型客户端共用的指标 ----
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ("route", "method", "status"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数")
+
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "上游大模型请求耗时（流式请求统计到读完为止）", ("status", "stream"))
+LLM_RESPONSES = Counter(
+    "llm_responses_total", "上游大模型响应数（按状态码，连接错误记为error）", ("status",))
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "上游返回的usage中的token数", ("type",))
+LLM_REQUESTS_IN_FLIGHT = Gauge(
+    "llm_requests_in_flight", "在途的上游大模型请求数")
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth", "等待上游调用名额的请求数")
+
+PLAN_MOCK_FALLBACKS = Counter(
+    "plan_mock_fallbacks_total", "回退到模拟规划的次数", ("reason",))
+PLAN_WRITE_DURATION = Histogram(
+    "plan_write_seconds", "规划批量写入规划存储的耗时（每批一次）",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+PLAN_WRITE_LAG = Histogram(
+    "plan_write_lag_seconds", "规划从进入预写日志到落库的时间",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+PLAN_WRITE_QUEUE_DEPTH = Gauge(
+    "plan_write_queue_depth", "预写日志中等待落库的规划数")
+PLAN_CACHE_LOOKUPS = Counter(
+    "plan_cache_lookups_total", "规划缓存查询次数（按结果）", ("result",))
+PLAN_CACHE_HIT_RATIO = Gauge(
+    "plan_cache_hit_ratio", "规划缓存命中率")
+
+
+def record_usage(usage):
+    """累计上游响应usage字段中的token数"""
+    if not usage:
+        return
+    for name in ("prompt_tokens", "completion_tokens"):
+        if usage.get(name):
+            LLM_TOKENS.labels(name[:-len("_tokens")]).inc(usage[name])
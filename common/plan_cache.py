@@ -0,0 +1,297 @@
+"""两级规划缓存：进程内LRU + 磁盘持久化
+
+- 内存层：有界的OrderedDict LRU，命中时无需任何IO；按条目数与字节数双重限制
+- 磁盘层：每条规划一个文件（按键的前两位分目录），进程重启后仍然有效
+- 两层都支持TTL过期；磁盘层按总字节数淘汰最久未写入的条目
+- 两层保存的都是字典压缩后的正文（见 common/plan_codec.py），命中时才解压，
+  同样的内存能多放几倍的规划；磁盘文件是一行JSON头（含编码与字典版本）加压缩后的正文，
+  旧版本的纯JSON缓存文件仍然可以读取
+
+多个工作进程指向同一个目录时，磁盘层就是它们共享的缓存：任何一个进程写入的规划，
+其他进程在内存层未命中时都能直接读到。各进程的磁盘索引定期重新扫描目录，
+容量统计与淘汰因此也包含其他进程写入的条目。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from common.plan_codec import PlanCodec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 3600           # 默认缓存7天
+DEFAULT_MAX_ENTRIES = 2048            # 内存层最多条目数
+DEFAULT_MAX_MEMORY_BYTES = 16 * 1024 * 1024  # 内存层正文（压缩后）最多占用16MB
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024  # 磁盘层最多占用256MB
+
+
+class PlanCache:
+    """规划缓存"""
+
+    def __init__(self, directory="cache/plans", max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl=DEFAULT_TTL, max_disk_bytes=DEFAULT_MAX_DISK_BYTES, rescan_interval=60,
+                 max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES, codec=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.codec = codec or PlanCodec()
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.rescan_interval = rescan_interval  # 重新扫描磁盘层的间隔（秒）
+
+        self._memory = OrderedDict()  # key -> (expires_at, 压缩后的正文, 编码)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expirations": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "decode_errors": 0
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._disk_index = self._scan_disk()  # key -> (mtime, size)
+        self._disk_bytes = sum(size for _, size in self._disk_index.values())
+        self._scanned_at = time.monotonic()
+
+    # ---- 公共接口 ----
+
+    def get(self, key):
+        """读取缓存的规划，未命中、已过期或无法解码（正文损坏、字典缺失）时返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, body, encoding = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                else:
+                    self._forget(key)
+                    self._counters["expirations"] += 1
+                    entry = None
+        if entry is not None:
+            plan = self._decode(key, body, encoding)
+            if plan is None:
+                return None
+            with self._lock:
+                self._counters["memory_hits"] += 1
+            return plan
+
+        record = self._read_disk(key)
+        if record is not None and record["expires_at"] > now:
+            if "plan" in record:
+                # 旧格式的缓存文件，正文未压缩
+                plan = record["plan"]
+                body, encoding = self.codec.encode(plan)
+            else:
+                body, encoding = record["body"], record["encoding"]
+                plan = self._decode(key, body, encoding)
+                if plan is None:
+                    return None
+            with self._lock:
+                self._remember(key, record["expires_at"], body, encoding)
+                self._counters["disk_hits"] += 1
+            return plan
+
+        if record is not None:
+            self._remove_disk(key)
+            with self._lock:
+                self._counters["expirations"] += 1
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, plan, meta=None):
+        """写入缓存（内存层 + 磁盘层）"""
+        now = time.time()
+        expires_at = now + self.ttl
+        body, encoding = self.codec.encode(plan)
+        header = {
+            "key": key,
+            "created_at": now,
+            "expires_at": expires_at,
+            "meta": meta or {},
+            "encoding": encoding
+        }
+        with self._lock:
+            self._remember(key, expires_at, body, encoding)
+            self._counters["stores"] += 1
+        self._write_disk(key, header, body)
+
+    def is_fresh(self, key, min_remaining=0):
+        """是否存在剩余有效期不少于min_remaining秒的条目（不计入命中统计）"""
+        deadline = time.time() + min_remaining
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > deadline:
+                return True
+        record = self._read_disk(key)
+        return record is not None and record["expires_at"] > deadline
+
+    def invalidate(self, key):
+        """删除指定缓存条目"""
+        with self._lock:
+            self._forget(key)
+        self._remove_disk(key)
+
+    def stats(self):
+        """返回命中/未命中计数与各层容量"""
+        self._maybe_rescan()
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_entries"] = len(self._disk_index)
+            stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _decode(self, key, body, encoding):
+        """解压正文；失败时丢弃这个条目（内存与磁盘），按未命中计数并返回None"""
+        try:
+            return self.codec.decode(body, encoding)
+        except Exception as e:
+            logger.warning(f"缓存的规划无法解码，已丢弃: {key}: {e}")
+            with self._lock:
+                self._forget(key)
+                self._counters["decode_errors"] += 1
+                self._counters["misses"] += 1
+            self._remove_disk(key)
+            return None
+
+    # ---- 内存层 ----
+
+    def _remember(self, key, expires_at, body, encoding):
+        """放入内存LRU（调用方需持有锁）"""
+        self._forget(key)
+        self._memory[key] = (expires_at, body, encoding)
+        self._memory_bytes += len(body)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["memory_evictions"] += 1
+
+    def _forget(self, key):
+        """从内存LRU中移除（调用方需持有锁）"""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+    # ---- 磁盘层 ----
+
+    def _path(self, key, suffix=".plan"):
+        return os.path.join(self.directory, key[:2], f"{key}{suffix}")
+
+    def _scan_disk(self):
+        """扫描磁盘层，建立索引（包括旧格式的.json文件）"""
+        index = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                key, suffix = os.path.splitext(name)
+                if suffix not in (".plan", ".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                old = index.get(key)
+                index[key] = (st.st_mtime, st.st_size + (old[1] if old else 0))
+        return index
+
+    def _maybe_rescan(self):
+        """其他进程也在写同一个目录：定期用实际的目录内容刷新索引"""
+        if time.monotonic() - self._scanned_at < self.rescan_interval:
+            return
+        self._scanned_at = time.monotonic()
+        index = self._scan_disk()
+        with self._lock:
+            self._disk_index = index
+            self._disk_bytes = sum(size for _, size in index.values())
+
+    def _read_disk(self, key):
+        """读取磁盘层的记录：JSON头 + 压缩正文（body）；旧格式的文件是带plan字段的JSON"""
+        try:
+            with open(self._path(key), "rb") as f:
+                header, _, body = f.read().partition(b"\n")
+            record = json.loads(header)
+            record["body"] = body
+            return record
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            return None
+        try:
+            with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, header, body):
+        """原子写入：先写临时文件再重命名，避免读到半个文件"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n" + body
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        # 同一个键的旧格式文件不再需要
+        try:
+            os.remove(self._path(key, ".json"))
+        except OSError:
+            pass
+
+        self._maybe_rescan()
+        with self._lock:
+            old = self._disk_index.get(key)
+            if old is not None:
+                self._disk_bytes -= old[1]
+            self._disk_index[key] = (time.time(), len(data))
+            self._disk_bytes += len(data)
+            victims = self._pick_disk_victims()
+
+        for victim in victims:
+            self._remove_disk(victim, evicted=True)
+
+    def _pick_disk_victims(self):
+        """超出容量时挑选最早写入的条目（调用方需持有锁）"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return []
+        victims = []
+        excess = self._disk_bytes - self.max_disk_bytes
+        for key, (_, size) in sorted(self._disk_index.items(), key=lambda item: item[1][0]):
+            if excess <= 0:
+                break
+            victims.append(key)
+            excess -= size
+        return victims
+
+    def _remove_disk(self, key, evicted=False):
+        for suffix in (".plan", ".json"):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+        with self._lock:
+            old = self._disk_index.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old[1]
+            if evicted:
+                self._counters["disk_evictions"] += 1
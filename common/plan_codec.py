@@ -0,0 +1,207 @@
+"""规划正文的字典压缩
+
+生成的规划高度重复：“## 第一天 / ### 上午 / 住宿推荐 / 交通建议 / 实用提示”这类骨架每篇都有，
+而单篇只有几KB，压缩算法从零开始学不到这些重复。用在规划语料上训练出的字典压缩，
+同样的正文能再小好几倍，磁盘与内存缓存都能多放几倍的规划。
+
+- 安装了zstandard（pip install zstandard）时用zstd + 字典；否则退回zlib的预设字典（取字典末尾32KB）
+- 字典按版本保存在字典目录下（v1.zstd、v2.raw ……），每条记录的编码带上字典版本，
+  例如 "zstd:2"、"zlib:2"；重新训练后新记录使用新字典，旧记录仍按各自的版本解压
+- 还没有字典时使用不带字典的zlib（编码 "zlib"），与之前的记录格式相同
+
+重新训练字典（以规划库中最近的规划为样本），--recompress 同时用新字典重写库中已有的正文：
+    python -m common.plan_codec train --db plans/plans.db --dict-dir plans/dicts
+运行中的服务在重启（或gunicorn平滑重启）后开始使用新字典，其他进程写入的新版本记录随时都能解压。
+"""
+import argparse
+import os
+import re
+import tempfile
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_DICT_SIZE = 64 * 1024
+ZSTD_LEVEL = 12
+ZLIB_LEVEL = 9
+ZLIB_MAX_DICT = 32 * 1024  # zlib的窗口大小，预设字典只有末尾这部分有效
+
+DICT_FILENAME = re.compile(r"^v(\d+)\.(zstd|raw)$")
+
+
+class PlanCodec:
+    """按字典版本压缩/解压规划正文（线程安全）"""
+
+    def __init__(self, dict_dir=None):
+        self.dict_dir = dict_dir
+        self._dicts = {}  # 版本 -> (类型, 字典数据)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 每个线程自己的zstd压缩/解压对象（不能跨线程共用）
+        if dict_dir:
+            os.makedirs(dict_dir, exist_ok=True)
+            self._load()
+
+    @property
+    def version(self):
+        """编码新记录使用的字典版本（没有字典时为None）"""
+        return max(self._dicts) if self._dicts else None
+
+    def encode(self, text):
+        """压缩正文，返回 (数据, 编码)"""
+        data = text.encode("utf-8")
+        version = self.version
+        if version is None:
+            return zlib.compress(data, 6), "zlib"
+        if zstandard is not None:
+            return self._zstd(version, "compressor").compress(data), f"zstd:{version}"
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=self._zlib_dict(version))
+        return compressor.compress(data) + compressor.flush(), f"zlib:{version}"
+
+    def decode(self, body, encoding):
+        """按记录的编码解压正文"""
+        if encoding == "zlib":
+            return zlib.decompress(body).decode("utf-8")
+        if encoding == "plain":
+            return bytes(body).decode("utf-8")
+        codec, _, version = encoding.partition(":")
+        if codec not in ("zstd", "zlib") or not version.isdigit():
+            raise ValueError(f"未知的正文编码: {encoding}")
+        version = int(version)
+        if version not in self._dicts:
+            # 可能是其他进程用新训练的字典写入的记录
+            self._load()
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError(f"正文使用zstd压缩（{encoding}），需要安装zstandard：pip install zstandard")
+            return self._zstd(version, "decompressor").decompress(body).decode("utf-8")
+        decompressor = zlib.decompressobj(zdict=self._zlib_dict(version))
+        return (decompressor.decompress(body) + decompressor.flush()).decode("utf-8")
+
+    def train(self, samples, size=DEFAULT_DICT_SIZE):
+        """用样本正文训练新版本的字典并保存，返回新的版本号"""
+        if not self.dict_dir:
+            raise ValueError("没有指定字典目录")
+        encoded = [sample.encode("utf-8") for sample in samples if sample]
+        if not encoded:
+            raise ValueError("没有可用于训练的样本")
+        kind, data = "raw", None
+        if zstandard is not None:
+            try:
+                data = zstandard.train_dictionary(size, encoded).as_bytes()
+                kind = "zstd"
+            except zstandard.ZstdError:
+                # 样本太少时zstd训练不出字典，改用常见片段拼成的原始字典
+                data = None
+        if data is None:
+            data = build_raw_dictionary(samples, size)
+
+        with self._lock:
+            self._load_locked()
+            version = (max(self._dicts) if self._dicts else 0) + 1
+            path = os.path.join(self.dict_dir, f"v{version}.{kind}")
+            fd, tmp_path = tempfile.mkstemp(dir=self.dict_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._dicts[version] = (kind, data)
+        return version
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "versions": sorted(self._dicts),
+            "zstd": zstandard is not None
+        }
+
+    def _load(self):
+        with self._lock:
+            self._load_locked()
+
+    def _load_locked(self):
+        """读取字典目录中尚未加载的字典（调用方需持有锁）"""
+        if not self.dict_dir or not os.path.isdir(self.dict_dir):
+            return
+        for name in os.listdir(self.dict_dir):
+            match = DICT_FILENAME.match(name)
+            if not match or int(match.group(1)) in self._dicts:
+                continue
+            with open(os.path.join(self.dict_dir, name), "rb") as f:
+                self._dicts[int(match.group(1))] = (match.group(2), f.read())
+
+    def _dictionary(self, version):
+        try:
+            return self._dicts[version]
+        except KeyError:
+            raise ValueError(f"找不到第{version}版字典（字典目录: {self.dict_dir}）") from None
+
+    def _zlib_dict(self, version):
+        return self._dictionary(version)[1][-ZLIB_MAX_DICT:]
+
+    def _zstd(self, version, role):
+        """当前线程中某个字典版本的zstd压缩或解压对象"""
+        cache = self._local.__dict__.setdefault(role, {})
+        obj = cache.get(version)
+        if obj is None:
+            kind, data = self._dictionary(version)
+            dict_type = zstandard.DICT_TYPE_AUTO if kind == "zstd" else zstandard.DICT_TYPE_RAWCONTENT
+            dictionary = zstandard.ZstdCompressionDict(data, dict_type=dict_type)
+            if role == "compressor":
+                obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+            else:
+                obj = zstandard.ZstdDecompressor(dict_data=dictionary)
+            cache[version] = obj
+        return obj
+
+
+def build_raw_dictionary(samples, size=DEFAULT_DICT_SIZE):
+    """不依赖zstd的字典：多篇规划中都出现过的行，越常见越靠后（离待压缩数据越近，引用越便宜）"""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line.strip() for line in sample.splitlines() if line.strip()))
+    common_lines = [line for line, count in counts.items() if count >= 2]
+    common_lines.sort(key=lambda line: (counts[line], line))
+    data = b""
+    for line in reversed(common_lines):
+        encoded = line.encode("utf-8") + b"\n"
+        if len(data) + len(encoded) > size:
+            break
+        data = encoded + data
+    return data
+
+
+def main():
+    from common.plan_store import PlanStore
+
+    parser = argparse.ArgumentParser(description="规划正文压缩字典工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="用规划库中的规划训练新版本的字典")
+    train_parser.add_argument("--db", default="plans/plans.db", help="数据库路径")
+    train_parser.add_argument("--dict-dir", default="plans/dicts", help="字典目录")
+    train_parser.add_argument("--samples", type=int, default=2000, help="最多使用多少条最近的规划作为样本")
+    train_parser.add_argument("--size", type=int, default=DEFAULT_DICT_SIZE, help="字典大小（字节）")
+    train_parser.add_argument("--recompress", action="store_true", help="训练后用新字典重写库中已有的正文")
+    args = parser.parse_args()
+
+    codec = PlanCodec(args.dict_dir)
+    store = PlanStore(args.db, codec=codec)
+    samples = store.sample_bodies(args.samples)
+    if not samples:
+        parser.error(f"{args.db} 中没有规划，无法训练字典")
+    before = store.body_bytes()
+    version = codec.train(samples, args.size)
+    print(f"已用 {len(samples)} 条规划训练第{version}版字典（{'zstd' if zstandard else 'zlib'}），保存在 {args.dict_dir}")
+    if args.recompress:
+        count = store.recompress()
+        store.reparse()  # 行程结构也用新字典重新压缩
+        # 重写后腾出的页要VACUUM才会还给文件系统
+        store._connection().execute("VACUUM")
+        print(f"已重写 {count} 条正文：{before} -> {store.body_bytes()} 字节")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Tk结果页的增量渲染
+
+逐行 ``text.insert(END, line, tag)`` 在主线程里一次插完整篇规划，规划越长窗口卡得越久。
+PlanRenderer把待插入的行放进队列，用 ``after`` 分片执行：
+
+- 每片最多占用主线程 slice_ms 毫秒，片与片之间让出主线程处理事件（滚动、点击、重绘）
+- 一片内的多行合并成一次insert调用：Tk的insert接受 ``文字1 标签1 文字2 标签2 ...``，
+  相邻同样式的行合并成一段，一次调用同时插入文字与标签，不再逐行insert/逐行打标签
+- append只把新行加入队列，流式生成时已显示的内容不会重新渲染
+
+    renderer = PlanRenderer(text_widget, PLAN_LINE_STYLES)
+    renderer.render(itinerary.lines())   # 替换全部内容
+    renderer.append([(kind, text)])      # 在末尾追加
+"""
+import time
+from collections import deque
+
+DEFAULT_SLICE_MS = 8
+DEFAULT_BATCH_LINES = 200
+
+
+class PlanRenderer:
+    """把 (类型, 文字) 行分片插入tk.Text（只能在主线程中使用）"""
+
+    def __init__(self, widget, styles, slice_ms=DEFAULT_SLICE_MS, batch_lines=DEFAULT_BATCH_LINES,
+                 follow=False, on_idle=None):
+        self.widget = widget
+        self.styles = styles  # 类型 -> (前缀, 标签)
+        self.slice_ms = slice_ms
+        self.batch_lines = batch_lines
+        self.follow = follow  # 插入后滚动到末尾（流式生成时使用）
+        self.on_idle = on_idle  # 队列清空时调用
+        self._pending = deque()
+        self._after_id = None
+
+    @property
+    def busy(self):
+        """是否还有未插入的行"""
+        return bool(self._pending)
+
+    def render(self, lines):
+        """清空文本框，重新渲染全部行"""
+        self.cancel()
+        self._edit(lambda: self.widget.delete("1.0", "end"))
+        self.append(lines)
+
+    def append(self, lines):
+        """在末尾追加若干行，已显示的内容保持不变"""
+        self._pending.extend(lines)
+        if self._pending and self._after_id is None:
+            self._after_id = self.widget.after_idle(self._run)
+
+    def flush(self):
+        """立即插入所有待插入的行（例如需要马上读取文本框内容时）"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        while self._pending:
+            self._insert_batch()
+        self._idle()
+
+    def cancel(self):
+        """丢弃未插入的行"""
+        self._pending.clear()
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass  # 文本框已销毁
+            self._after_id = None
+
+    def _run(self):
+        self._after_id = None
+        if not self.widget.winfo_exists():
+            # 页面已切换，文本框被销毁
+            self._pending.clear()
+            return
+        deadline = time.perf_counter() + self.slice_ms / 1000.0
+        while self._pending and time.perf_counter() < deadline:
+            self._insert_batch()
+        if self._pending:
+            # after(1)而不是after_idle：让输入事件与重绘先于下一片执行
+            self._after_id = self.widget.after(1, self._run)
+        else:
+            self._idle()
+
+    def _insert_batch(self):
+        """取出最多batch_lines行，合并为一次insert"""
+        args = []
+        run_tag = None
+        run = []
+        for _ in range(min(self.batch_lines, len(self._pending))):
+            kind, text = self._pending.popleft()
+            prefix, tag = self.styles[kind]
+            if tag != run_tag and run:
+                args += ["".join(run), run_tag]
+                run = []
+            run_tag = tag
+            run.append(prefix + text + "\n")
+        if run:
+            args += ["".join(run), run_tag]
+        self._edit(lambda: self.widget.insert("end", *args))
+        if self.follow:
+            self.widget.see("end")
+
+    def _edit(self, action):
+        """文本框是只读的，修改前后临时切换状态"""
+        self.widget.config(state="normal")
+        action()
+        self.widget.config(state="disabled")
+
+    def _idle(self):
+        if self.on_idle is not None:
+            self.on_idle()
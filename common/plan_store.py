@@ -0,0 +1,375 @@
+"""基于SQLite的规划存储
+
+替代 plans/ 目录下“每个选择一个Markdown文件”的做法：
+- WAL模式，读写互不阻塞；每个线程使用自己的连接（fork出的子进程重新建立连接，多个工作进程可共用一个库）
+- 按 城市/分类/子类别 唯一，保存时在一个事务内原子地upsert，并把每个版本记入历史表
+- 正文用规划语料训练的字典压缩存储（见 common/plan_codec.py），每条记录的编码带字典版本；
+  city/category/subcategory/created_at 上建有索引，支持分页查询
+- 保存时同步更新全文检索的倒排索引（见 common/search.py）
+- 保存时把规划解析为结构化的行程（见 common/itinerary.py），与正文一起压缩存储
+- 后台写入器（见 common/plan_writer.py）保存时记下 写入ID -> 规划ID，调用方可以用写入ID查到落库后的规划
+
+导入旧的Markdown文件 / 重建检索索引 / 重新解析行程结构（解析规则改变之后）：
+    python -m common.plan_store import plans/ --db plans/plans.db
+    python -m common.plan_store reindex --db plans/plans.db
+    python -m common.plan_store reparse --db plans/plans.db
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from common import search
+from common.itinerary import Itinerary, parse_plan
+from common.plan_codec import PlanCodec
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    city TEXT NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    body BLOB NOT NULL,
+    encoding TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    structure BLOB,
+    structure_encoding TEXT,
+    UNIQUE (city, category, subcategory)
+);
+CREATE INDEX IF NOT EXISTS idx_plans_city ON plans (city);
+CREATE INDEX IF NOT EXISTS idx_plans_category ON plans (category);
+CREATE INDEX IF NOT EXISTS idx_plans_subcategory ON plans (subcategory);
+CREATE INDEX IF NOT EXISTS idx_plans_created_at ON plans (created_at);
+
+CREATE TABLE IF NOT EXISTS plan_history (
+    id INTEGER PRIMARY KEY,
+    plan_id INTEGER NOT NULL REFERENCES plans (id),
+    body BLOB NOT NULL,
+    encoding TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plan_history_plan_id ON plan_history (plan_id, created_at);
+
+CREATE TABLE IF NOT EXISTS plan_writes (
+    write_id TEXT PRIMARY KEY,
+    plan_id INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plan_writes_created_at ON plan_writes (created_at);
+"""
+
+# 写入ID -> 规划ID 的对应关系保留多久（秒）
+WRITE_ID_RETENTION = 24 * 3600
+
+# 旧文件名：{城市}_{分类}_{子类别}规划.md
+LEGACY_FILENAME = re.compile(r"^(.+?)_(人文景观|自然景观|饮食文化)_(.+)规划\.md$")
+
+
+class PlanStore:
+    """规划存储"""
+
+    def __init__(self, path="plans/plans.db", codec=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 默认使用数据库旁边的 dicts/ 目录中的字典
+        self.codec = codec or PlanCodec(os.path.join(directory, "dicts"))
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(search.SCHEMA)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(plans)")]
+            if "structure" not in columns:
+                conn.execute("ALTER TABLE plans ADD COLUMN structure BLOB")
+                conn.execute("ALTER TABLE plans ADD COLUMN structure_encoding TEXT")
+        # 建立检索索引、保存行程结构之前保存的规划，补建索引与结构
+        self.reindex(missing_only=True)
+        self.reparse(missing_only=True)
+
+    def _connection(self):
+        """当前线程的连接（sqlite3连接不能跨线程共享，也不能在fork之后继续使用）"""
+        if self._pid != os.getpid():
+            # 预加载后fork出的工作进程：丢弃从父进程继承的连接（不关闭，父进程还在用）
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, city, category, subcategory, plan, created_at=None):
+        """保存规划（同一选择只保留最新版本，旧版本进入历史表），返回规划ID"""
+        return self.save_many([(city, category, subcategory, plan, created_at)])[0]
+
+    def save_many(self, records, durable=False, write_ids=None):
+        """在一个事务内保存多条规划，records为 (城市, 分类, 子类别, 正文, 创建时间或None)，返回ID列表
+
+        正文与已保存的版本相同时（缓存命中、合并的重复生成再次保存）不做任何写入，直接返回已有的ID，
+        历史表与检索索引不会因为重复保存而增长。
+        durable为True时本次提交使用synchronous=FULL，返回时数据已确保落盘（断电也不会丢）。
+        write_ids与records一一对应时，在同一事务内记下每条记录的 写入ID -> 规划ID（见resolve_write）。
+        """
+        conn = self._connection()
+        ids = []
+        if durable:
+            conn.execute("PRAGMA synchronous=FULL")
+        try:
+            with conn:
+                for city, category, subcategory, plan, created_at in records:
+                    existing = conn.execute(
+                        "SELECT id, body, encoding, size FROM plans WHERE city = ? AND category = ? AND subcategory = ?",
+                        (city, category, subcategory)
+                    ).fetchone()
+                    if (existing is not None and existing["size"] == len(plan)
+                            and self.codec.decode(existing["body"], existing["encoding"]) == plan):
+                        ids.append(existing["id"])
+                        continue
+                    now = created_at or time.time()
+                    body, encoding = self.codec.encode(plan)
+                    structure, structure_encoding = self.codec.encode(parse_plan(plan).dumps())
+                    conn.execute(
+                        "INSERT INTO plans (city, category, subcategory, body, encoding, size, created_at, updated_at, "
+                        "structure, structure_encoding) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (city, category, subcategory) DO UPDATE SET "
+                        "body = excluded.body, encoding = excluded.encoding, size = excluded.size, "
+                        "updated_at = excluded.updated_at, structure = excluded.structure, "
+                        "structure_encoding = excluded.structure_encoding",
+                        (city, category, subcategory, body, encoding, len(plan), now, now,
+                         structure, structure_encoding)
+                    )
+                    plan_id = conn.execute(
+                        "SELECT id FROM plans WHERE city = ? AND category = ? AND subcategory = ?",
+                        (city, category, subcategory)
+                    ).fetchone()[0]
+                    conn.execute(
+                        "INSERT INTO plan_history (plan_id, body, encoding, created_at) VALUES (?, ?, ?, ?)",
+                        (plan_id, body, encoding, now)
+                    )
+                    search.index_plan(conn, plan_id, plan)
+                    ids.append(plan_id)
+                if write_ids:
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO plan_writes (write_id, plan_id, created_at) VALUES (?, ?, ?)",
+                        [(write_id, plan_id, now) for write_id, plan_id in zip(write_ids, ids)]
+                    )
+                    conn.execute("DELETE FROM plan_writes WHERE created_at < ?", (now - WRITE_ID_RETENTION,))
+        finally:
+            if durable:
+                conn.execute("PRAGMA synchronous=NORMAL")
+        return ids
+
+    def resolve_write(self, write_id):
+        """写入ID对应的规划ID；还没落库（或已超过保留时间）时返回None"""
+        row = self._connection().execute(
+            "SELECT plan_id FROM plan_writes WHERE write_id = ?", (write_id,)
+        ).fetchone()
+        return row["plan_id"] if row is not None else None
+
+    def get(self, plan_id, itinerary=False):
+        """按ID读取规划（含正文），不存在返回None；itinerary为True时用行程结构（Itinerary）代替正文，
+        两者来自同一次查询，不会在中途被删除"""
+        row = self._connection().execute("SELECT * FROM plans WHERE id = ?", (plan_id,)).fetchone()
+        if row is None:
+            return None
+        if not itinerary:
+            return self._to_dict(row, with_body=True)
+        data = self._to_dict(row)
+        data["itinerary"] = self._itinerary(row)
+        return data
+
+    def get_itinerary(self, plan_id):
+        """按ID读取规划的行程结构（Itinerary），不存在返回None"""
+        row = self._connection().execute(
+            "SELECT body, encoding, structure, structure_encoding FROM plans WHERE id = ?", (plan_id,)
+        ).fetchone()
+        return self._itinerary(row) if row is not None else None
+
+    def find(self, city, category, subcategory):
+        """按选择读取规划（含正文），不存在返回None"""
+        row = self._connection().execute(
+            "SELECT * FROM plans WHERE city = ? AND category = ? AND subcategory = ?",
+            (city, category, subcategory)
+        ).fetchone()
+        return self._to_dict(row, with_body=True) if row is not None else None
+
+    def list(self, city=None, category=None, subcategory=None, page=1, page_size=20):
+        """分页列出规划（不含正文），按创建时间倒序，返回 (列表, 总数)"""
+        conditions = []
+        params = []
+        for column, value in (("city", city), ("category", category), ("subcategory", subcategory)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM plans {where}", params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT id, city, category, subcategory, size, created_at, updated_at FROM plans "
+            f"{where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+    def history(self, plan_id):
+        """某条规划的所有历史版本（含正文），按时间倒序"""
+        rows = self._connection().execute(
+            "SELECT body, encoding, created_at FROM plan_history WHERE plan_id = ? ORDER BY created_at DESC, id DESC",
+            (plan_id,)
+        ).fetchall()
+        return [{"plan": self.codec.decode(row["body"], row["encoding"]), "created_at": row["created_at"]} for row in rows]
+
+    def search(self, query, limit=20, offset=0):
+        """全文检索规划，返回 (结果列表, 命中总数)；结果按相关度排序，带命中片段"""
+        conn = self._connection()
+        ranked, total = search.search(conn, query, limit, offset)
+        results = []
+        for plan_id, score in ranked:
+            plan = self.get(plan_id)
+            if plan is None:
+                continue
+            text = plan.pop("plan")
+            plan["score"] = round(score, 4)
+            plan["snippet"] = search.make_snippet(text, query)
+            results.append(plan)
+        return results, total
+
+    def reindex(self, missing_only=False):
+        """重建检索索引（missing_only时只补建缺少索引的规划），返回处理的数量"""
+        conn = self._connection()
+        sql = "SELECT id, body, encoding FROM plans"
+        if missing_only:
+            sql += " WHERE id NOT IN (SELECT plan_id FROM plan_index)"
+        rows = conn.execute(sql).fetchall()
+        with conn:
+            for row in rows:
+                search.index_plan(conn, row["id"], self.codec.decode(row["body"], row["encoding"]))
+        return len(rows)
+
+    def reparse(self, missing_only=False):
+        """重新解析行程结构（missing_only时只补建缺少结构的规划），返回处理的数量"""
+        conn = self._connection()
+        sql = "SELECT id, body, encoding FROM plans"
+        if missing_only:
+            sql += " WHERE structure IS NULL"
+        rows = conn.execute(sql).fetchall()
+        with conn:
+            for row in rows:
+                itinerary = parse_plan(self.codec.decode(row["body"], row["encoding"]))
+                structure, structure_encoding = self.codec.encode(itinerary.dumps())
+                conn.execute(
+                    "UPDATE plans SET structure = ?, structure_encoding = ? WHERE id = ?",
+                    (structure, structure_encoding, row["id"])
+                )
+        return len(rows)
+
+    def sample_bodies(self, limit=2000):
+        """最近更新的若干条规划正文（训练压缩字典的样本）"""
+        rows = self._connection().execute(
+            "SELECT body, encoding FROM plans ORDER BY updated_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self.codec.decode(row["body"], row["encoding"]) for row in rows]
+
+    def body_bytes(self):
+        """规划与历史版本正文的压缩后总字节数"""
+        conn = self._connection()
+        return sum(
+            conn.execute(f"SELECT COALESCE(SUM(LENGTH(body)), 0) FROM {table}").fetchone()[0]
+            for table in ("plans", "plan_history")
+        )
+
+    def recompress(self, batch_size=500):
+        """用当前版本的字典重写所有正文（含历史版本），返回重写的条数"""
+        conn = self._connection()
+        count = 0
+        for table in ("plans", "plan_history"):
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    f"SELECT id, body, encoding FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                with conn:
+                    for row in rows:
+                        body, encoding = self.codec.encode(self.codec.decode(row["body"], row["encoding"]))
+                        conn.execute(f"UPDATE {table} SET body = ?, encoding = ? WHERE id = ?", (body, encoding, row["id"]))
+                last_id = rows[-1]["id"]
+                count += len(rows)
+        return count
+
+    def import_directory(self, directory):
+        """导入旧的Markdown规划文件，返回导入的数量"""
+        records = []
+        for name in sorted(os.listdir(directory)):
+            match = LEGACY_FILENAME.match(name)
+            if not match:
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "r", encoding="utf-8") as f:
+                plan = f.read()
+            records.append(match.groups() + (plan, os.path.getmtime(path)))
+        if records:
+            self.save_many(records)
+        return len(records)
+
+    def _itinerary(self, row):
+        if row["structure"] is not None:
+            try:
+                return Itinerary.loads(self.codec.decode(row["structure"], row["structure_encoding"]))
+            except ValueError:
+                # 旧版本的存储格式：从正文重新解析（reparse命令可以一次性更新全部规划）
+                pass
+        return parse_plan(self.codec.decode(row["body"], row["encoding"]))
+
+    def _to_dict(self, row, with_body=False):
+        data = {
+            "id": row["id"],
+            "city": row["city"],
+            "category": row["category"],
+            "subcategory": row["subcategory"],
+            "size": row["size"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+        if with_body:
+            data["plan"] = self.codec.decode(row["body"], row["encoding"])
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规划存储工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="导入旧的Markdown规划文件")
+    import_parser.add_argument("directory", help="Markdown文件所在目录，例如 plans/")
+    import_parser.add_argument("--db", default="plans/plans.db", help="数据库路径")
+    reindex_parser = subparsers.add_parser("reindex", help="重建全文检索索引")
+    reindex_parser.add_argument("--db", default="plans/plans.db", help="数据库路径")
+    reparse_parser = subparsers.add_parser("reparse", help="重新解析所有规划的行程结构")
+    reparse_parser.add_argument("--db", default="plans/plans.db", help="数据库路径")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = PlanStore(args.db).import_directory(args.directory)
+        print(f"已导入 {count} 条规划到 {args.db}")
+    elif args.command == "reindex":
+        count = PlanStore(args.db).reindex()
+        print(f"已重建 {count} 条规划的检索索引")
+    elif args.command == "reparse":
+        count = PlanStore(args.db).reparse()
+        print(f"已重新解析 {count} 条规划的行程结构")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""后台规划写入器（预写日志 + 批量提交）
+
+请求线程只把规划追加到预写日志（journal）并fsync，随即返回写入ID（write_id）；后台线程把排队的
+规划攒成一批，在一个事务里写入规划存储（同时记下 写入ID -> 规划ID，任何进程都能查到），
+提交后如果日志里已经没有待写入的记录就直接截断日志。提交期间又有新记录时日志保留原样，
+超过max_journal_bytes后才用剩余记录重写：先写入临时文件并fsync，再用os.replace原子替换。
+日志里残留已落库的记录没有关系：重放时正文与已保存的版本相同，规划存储不会重复写入。
+
+每个进程写自己的日志（journal目录下的 ``<进程号>.jsonl``），存活期间持有它的文件锁，
+多个工作进程可以共用一个日志目录。进程启动时会重放日志目录中已经没有进程持有的日志
+（上次退出或崩溃时尚未落库的记录）；日志最后一行如果是崩溃时写了一半的，直接丢弃
+（对应的请求当时还没有返回）。``shutdown`` 会先把队列里的规划全部写完再退出。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from common.metrics import PLAN_WRITE_DURATION, PLAN_WRITE_LAG
+
+logger = logging.getLogger(__name__)
+
+
+class PendingWrite:
+    """一条已进入预写日志、等待落库的规划"""
+
+    def __init__(self, seq, city, category, subcategory, plan, submitted_at=None, write_id=None):
+        self.seq = seq
+        self.write_id = write_id or uuid.uuid4().hex  # 全局唯一，落库后可以用它查到规划ID
+        self.city = city
+        self.category = category
+        self.subcategory = subcategory
+        self.plan = plan
+        self.submitted_at = submitted_at or time.time()
+        self.plan_id = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._callback_lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        """等待落库，返回规划ID（超时返回None）"""
+        self._done.wait(timeout)
+        return self.plan_id
+
+    def add_done_callback(self, callback):
+        """落库后调用callback(规划ID)；在写入线程中调用，已落库时立即调用"""
+        with self._callback_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self.plan_id)
+
+    def _set_done(self, plan_id):
+        with self._callback_lock:
+            self.plan_id = plan_id
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(plan_id)
+
+    def to_record(self):
+        return {
+            "seq": self.seq,
+            "write_id": self.write_id,
+            "city": self.city,
+            "category": self.category,
+            "subcategory": self.subcategory,
+            "plan": self.plan,
+            "submitted_at": self.submitted_at
+        }
+
+
+class PlanWriter:
+    """把规划异步、批量、持久地写入PlanStore"""
+
+    def __init__(self, store, journal_dir="plans/journal", batch_size=50, flush_interval=0.2, retry_delay=1.0,
+                 max_journal_bytes=4 * 1024 * 1024):
+        self.store = store
+        self.journal_dir = journal_dir
+        self.max_journal_bytes = max_journal_bytes  # 日志里残留的已落库记录超过这个大小时才重写日志
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # 攒批的最长等待时间（秒）
+        self.retry_delay = retry_delay
+        os.makedirs(journal_dir, exist_ok=True)
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self):
+        """清空本进程的状态；日志延迟到第一次使用时才打开"""
+        self._pid = None
+        self.journal_path = None
+        self._journal = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = {}  # seq -> PendingWrite，即日志中尚未落库的记录
+        self._seq = 0
+        self._stopping = False
+        self._thread = None
+        self._written = 0
+        self._batches = 0
+        self._failures = 0
+
+    def _after_fork(self):
+        """fork出的子进程不使用父进程的日志和线程：关掉继承来的文件（父进程的文件锁不受影响），重新开始"""
+        if self._journal is not None:
+            self._journal.close()
+        self._reset()
+
+    def start(self):
+        """打开本进程的预写日志，接管已退出进程遗留的日志，并启动后台线程
+
+        第一次提交时会自动调用；服务启动时主动调用可以尽早重放上次未落库的规划。
+        """
+        if self._pid is None:
+            with self._lock:
+                if self._pid is None:
+                    self._open_journal()
+        if self._pending:
+            self._ensure_thread()
+
+    def _open_journal(self):
+        """创建并锁定本进程的日志，重放无人持有的日志（调用方需持有锁）"""
+        pid = os.getpid()
+        self.journal_path = os.path.join(self.journal_dir, f"{pid}.jsonl")
+
+        # 日志文件按进程号命名，并在进程存活期间持有文件锁；拿得到锁的日志属于已退出的进程
+        # （包括进程号相同的上一个进程留下的日志）
+        orphans = []
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            f = open(path, "rb")
+            if not _lock_file(f, blocking=False) or os.fstat(f.fileno()).st_nlink == 0:
+                # 进程还在运行，或日志刚被其他进程接管并删除
+                f.close()
+                continue
+            orphans.append((path, f))
+
+        records = []
+        for path, f in orphans:
+            records.extend(self._read_journal(path))
+            if fcntl is None:
+                f.close()  # Windows不能替换或删除打开着的文件
+        # 同一选择以最后提交的版本为准，按提交时间重放
+        records.sort(key=lambda record: record.get("submitted_at") or 0)
+        for record in records:
+            self._seq += 1
+            entry = PendingWrite(self._seq, record["city"], record["category"], record["subcategory"],
+                                 record["plan"], record.get("submitted_at"), record.get("write_id"))
+            self._pending[entry.seq] = entry
+        if self._pending:
+            logger.info(f"从预写日志恢复 {len(self._pending)} 条待写入的规划")
+
+        # 本进程的日志与压缩时一样，先写好并加锁再原子地放到位，其他进程不会看到未加锁的日志；
+        # 恢复出的记录写进本进程的日志之后，才能删除接管的日志
+        self._compact()
+        for path, f in orphans:
+            # 删除之后才释放锁，其他进程不会重复接管
+            if path != self.journal_path:
+                os.remove(path)
+            f.close()
+        self._pid = pid
+
+    def submit(self, city, category, subcategory, plan):
+        """把规划写入预写日志并fsync，返回PendingWrite（此时规划已经不会丢失）"""
+        self.start()
+        self._ensure_thread()
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("规划写入器已关闭")
+            self._seq += 1
+            entry = PendingWrite(self._seq, city, category, subcategory, plan)
+            line = json.dumps(entry.to_record(), ensure_ascii=False).encode("utf-8") + b"\n"
+            self._journal.write(line)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending[entry.seq] = entry
+            self._wakeup.notify()
+        return entry
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": len(self._pending),
+                "written": self._written,
+                "batches": self._batches,
+                "failures": self._failures,
+                "journal": self.journal_path
+            }
+
+    def shutdown(self, timeout=None):
+        """写完队列中的所有规划后停止后台线程；日志已清空时删除日志文件"""
+        if self._pid is None:
+            return
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            if self._journal is not None and not self._journal.closed:
+                if not self._pending:
+                    os.remove(self.journal_path)
+                self._journal.close()
+
+    def _ensure_thread(self):
+        """按需启动后台线程（延迟到第一次使用，避免在fork之前创建线程）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="plan-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                # 攒批：没有满一批时再等一会儿（关闭时不等）
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    self._wakeup.wait(self.flush_interval)
+                batch = sorted(self._pending.values(), key=lambda entry: entry.seq)[:self.batch_size]
+
+            started = time.perf_counter()
+            try:
+                ids = self.store.save_many(
+                    [(entry.city, entry.category, entry.subcategory, entry.plan, None) for entry in batch],
+                    durable=True,
+                    write_ids=[entry.write_id for entry in batch]
+                )
+            except Exception as e:
+                logger.error(f"规划批量写入失败，{self.retry_delay}秒后重试: {e}")
+                with self._lock:
+                    self._failures += 1
+                    if self._stopping and self._failures > 3:
+                        # 关闭时不无限重试，未落库的记录留在日志里，下次启动时重放
+                        return
+                time.sleep(self.retry_delay)
+                continue
+            PLAN_WRITE_DURATION.observe(time.perf_counter() - started)
+
+            now = time.time()
+            with self._lock:
+                for entry, plan_id in zip(batch, ids):
+                    del self._pending[entry.seq]
+                    entry._set_done(plan_id)
+                    PLAN_WRITE_LAG.observe(now - entry.submitted_at)
+                self._written += len(batch)
+                self._batches += 1
+                self._trim()
+
+    def _trim(self):
+        """批次提交后收缩日志（调用方需持有锁），不在提交者等待的锁里重写整个日志
+
+        没有待写入的记录时直接截断（不需要fsync：截断没落盘时重放的都是已落库的记录）；
+        否则日志保持原样，只有超过max_journal_bytes时才用剩余记录重写。
+        """
+        if not self._pending:
+            self._journal.seek(0)
+            self._journal.truncate()
+        elif self._journal.tell() > self.max_journal_bytes:
+            self._compact()
+
+    def _compact(self):
+        """用尚未落库的记录原子地重写日志（调用方需持有锁）
+
+        新文件在替换之前就加上文件锁，其他进程任何时候都不会把它当成无人持有的日志。
+        """
+        tmp_path = f"{self.journal_path}.tmp"
+        f = open(tmp_path, "wb")
+        try:
+            _lock_file(f)
+            for entry in sorted(self._pending.values(), key=lambda entry: entry.seq):
+                f.write(json.dumps(entry.to_record(), ensure_ascii=False).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+            if fcntl is None and self._journal is not None:
+                self._journal.close()  # Windows不能替换打开着的文件
+            os.replace(tmp_path, self.journal_path)
+        except BaseException:
+            f.close()
+            raise
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = f
+        _fsync_directory(self.journal_path)
+
+    def _read_journal(self, path):
+        """读取日志中的记录；最后一行如果是崩溃时写了一半的，直接丢弃"""
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"丢弃预写日志 {path} 中不完整的记录")
+        return records
+
+
+def _lock_file(f, blocking=True):
+    """给文件加排他锁，返回是否成功（Windows上没有fcntl，只支持单进程运行，总是返回True）"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _fsync_directory(path):
+    """fsync文件所在目录，保证rename本身落盘（Windows不支持，跳过）"""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
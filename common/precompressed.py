@@ -0,0 +1,81 @@
+"""预先序列化、预先压缩的只读响应
+
+目录类接口的响应在目录加载时一次性生成：JSON正文、强ETag以及gzip/brotli压缩版本，
+请求时只需做一次ETag比较和编码选择。brotli为可选依赖，未安装时只提供gzip。
+"""
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PrecompressedResponse:
+    """一份预先生成的JSON响应"""
+
+    def __init__(self, data, max_age=300):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.cache_control = f"public, max-age={max_age}"
+
+        # 只保留比原文更小的压缩版本
+        self.encoded = {}
+        gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(gzipped) < len(self.body):
+            self.encoded["gzip"] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(self.body, quality=11)
+            if len(compressed) < len(self.body):
+                self.encoded["br"] = compressed
+
+    def not_modified(self, if_none_match):
+        """If-None-Match是否与当前ETag匹配（按弱比较）"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == self.etag:
+                return True
+        return False
+
+    def select(self, accept_encoding):
+        """根据Accept-Encoding选择正文，返回 (正文, 编码)，编码为None表示未压缩"""
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.encoded and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return self.encoded[encoding], encoding
+        return self.body, None
+
+    def headers(self):
+        """缓存相关的响应头"""
+        return {
+            "ETag": self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+
+def _parse_accept_encoding(value):
+    """解析Accept-Encoding，返回 {编码: q值}"""
+    accepted = {}
+    for part in (value or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
@@ -0,0 +1,67 @@
+"""旅游规划提示词与模型参数
+
+桌面端与后端共用同一份提示词模板和模型参数，
+规划缓存的键也由它们的指纹派生，修改模板后旧缓存会自然失效。
+"""
+import hashlib
+import json
+import unicodedata
+
+PROMPT_TEMPLATE = """
+请根据以下信息生成一个详细的三天旅游行程规划：
+城市：{city}
+选择的旅游类别：{category}
+特别兴趣点：{subcategory}
+
+请提供一个包含以下内容的旅游规划：
+1. 每天的行程安排（上午、下午、晚上）
+2. 推荐的景点和活动，包括游玩时间
+3. 餐饮推荐，包括当地特色美食
+4. 交通建议
+5. 住宿推荐
+
+格式要求：分三天详细规划，每天的行程清晰列出，内容要丰富实用，使用Markdown格式。
+"""
+
+# 调用DeepSeek时使用的模型参数
+MODEL_PARAMS = {
+    "model": "deepseek-chat",
+    "temperature": 0.7,
+    "max_tokens": 2000
+}
+
+
+def build_prompt(city, category, subcategory):
+    """根据用户选择生成提示词"""
+    return PROMPT_TEMPLATE.format(city=city, category=category, subcategory=subcategory)
+
+
+def build_payload(city, category, subcategory, stream=False):
+    """生成chat/completions请求体"""
+    payload = dict(MODEL_PARAMS)
+    payload["messages"] = [
+        {"role": "user", "content": build_prompt(city, category, subcategory)}
+    ]
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def normalize_selection(city, category, subcategory):
+    """规范化用户选择（去除首尾空白、统一全角/半角字符）"""
+    return tuple(unicodedata.normalize("NFKC", str(value)).strip() for value in (city, category, subcategory))
+
+
+def prompt_fingerprint():
+    """提示词模板与模型参数的指纹"""
+    source = PROMPT_TEMPLATE + json.dumps(MODEL_PARAMS, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+_FINGERPRINT = prompt_fingerprint()
+
+
+def plan_cache_key(city, category, subcategory):
+    """规划缓存键：规范化后的选择 + 提示词指纹"""
+    parts = (_FINGERPRINT,) + normalize_selection(city, category, subcategory)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,218 @@
+"""上游大模型调用的限流与并发控制
+
+- 令牌桶限制每秒请求数，并发信号量限制同时在途的请求数
+- 拿不到名额的调用方排队等待，直到截止时间才放弃（抛出RateLimitTimeout）
+- 收到429时速率减半并按Retry-After暂停放行，之后每次成功逐步恢复（AIMD）
+- ``AsyncUpstreamGovernor`` 供异步服务模式使用：排队的协程不占用线程
+"""
+import asyncio
+import collections
+import threading
+import time
+
+from common.jobs import JobCancelled
+
+
+class RateLimitTimeout(Exception):
+    """在截止时间前没有等到上游调用名额"""
+
+
+class UpstreamGovernor:
+    """令牌桶 + 最大在途请求数"""
+
+    def __init__(self, rate=5.0, burst=5, max_in_flight=8, min_rate=0.2, recovery=0.1):
+        self.max_rate = rate          # 配置的速率上限（每秒请求数，0表示不限速）
+        self.rate = rate              # 当前速率，429后下调，成功后逐步恢复
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.min_rate = min_rate
+        self.recovery = recovery      # 每次成功后速率的增量
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._counters = {
+            "acquired": 0,
+            "timeouts": 0,
+            "throttled": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0
+        }
+
+    def configure(self, rate=None, max_in_flight=None):
+        """调整速率上限与最大在途请求数"""
+        with self._cond:
+            if rate is not None:
+                self.max_rate = rate
+                self.rate = rate
+            if max_in_flight is not None:
+                self.max_in_flight = max_in_flight
+            self._cond.notify_all()
+
+    def acquire(self, timeout, cancel=None):
+        """等待一个调用名额，最多等待timeout秒；返回实际等待的秒数
+
+        cancel是取消令牌（jobs.Job）：排队期间被取消时立即抛出JobCancelled，不再占着队列等到超时。
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        unregister = cancel.on_cancel(self._wake) if cancel is not None else None
+        try:
+            with self._cond:
+                self._waiting += 1
+                try:
+                    return self._acquire_locked(start, deadline, timeout, cancel)
+                finally:
+                    self._waiting -= 1
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def _acquire_locked(self, start, deadline, timeout, cancel):
+        """acquire的等待循环（调用方需持有锁）"""
+        while True:
+            if cancel is not None and cancel.cancelled:
+                raise JobCancelled("任务已取消，不再等待上游调用名额")
+            now = time.monotonic()
+            wait = self._try_acquire(now)
+            if wait is None:
+                return self._record_wait(start)
+            if now >= deadline:
+                self._counters["timeouts"] += 1
+                raise RateLimitTimeout(f"等待上游调用名额超过{timeout:.1f}秒")
+            # 在途请求已满时wait为inf，等待其他请求释放名额（或取消时被唤醒）
+            self._cond.wait(min(wait, deadline - now))
+
+    def _wake(self):
+        """唤醒排队的调用方重新检查（取消回调）"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self):
+        """归还调用名额"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_throttled(self, retry_after=None):
+        """上游返回429：速率减半，并在Retry-After期间暂停放行"""
+        with self._cond:
+            self._counters["throttled"] += 1
+            if self.max_rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_success(self):
+        """上游调用成功：逐步恢复速率"""
+        with self._cond:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def stats(self):
+        with self._cond:
+            acquired = self._counters["acquired"]
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "acquired": acquired,
+                "timeouts": self._counters["timeouts"],
+                "throttled": self._counters["throttled"],
+                "avg_wait": self._counters["total_wait"] / acquired if acquired else 0.0,
+                "max_wait": self._counters["max_wait"]
+            }
+
+    def _try_acquire(self, now):
+        """尝试拿一个名额（调用方需持有锁）：成功返回None，否则返回建议等待的秒数"""
+        self._refill(now)
+        if self._in_flight < self.max_in_flight and self._tokens >= 1 and now >= self._paused_until:
+            self._tokens -= 1
+            self._in_flight += 1
+            return None
+        if self._in_flight >= self.max_in_flight:
+            return float("inf")
+        token_wait = (1 - self._tokens) / self.rate if self.rate > 0 else 0.0
+        return max(self._paused_until - now, token_wait)
+
+    def _record_wait(self, start):
+        """记录一次成功获取名额的等待时间（调用方需持有锁）"""
+        waited = time.monotonic() - start
+        self._counters["acquired"] += 1
+        self._counters["total_wait"] += waited
+        self._counters["max_wait"] = max(self._counters["max_wait"], waited)
+        return waited
+
+    def _refill(self, now):
+        """按当前速率补充令牌（调用方需持有锁）"""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rate <= 0:
+            self._tokens = float(self.burst)
+            return
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+
+
+class AsyncUpstreamGovernor(UpstreamGovernor):
+    """UpstreamGovernor的协程版本（acquire_async只能在同一个事件循环中调用）
+
+    因在途请求已满而排队的协程按先来后到逐个唤醒，等待令牌或Retry-After时直接sleep。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_waiters = collections.deque()
+
+    async def acquire_async(self, timeout):
+        """等待一个调用名额，最多等待timeout秒；返回实际等待的秒数"""
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._try_acquire(now)
+                    if wait is None:
+                        return self._record_wait(start)
+                    if now >= deadline:
+                        self._counters["timeouts"] += 1
+                        raise RateLimitTimeout(f"等待上游调用名额超过{timeout:.1f}秒")
+                if wait == float("inf"):
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._async_waiters.append(waiter)
+                    try:
+                        await asyncio.wait_for(waiter, deadline - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    finally:
+                        if not waiter.done():
+                            waiter.cancel()
+                else:
+                    await asyncio.sleep(min(wait, deadline - now))
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def release(self):
+        super().release()
+        # 唤醒一个仍在等待的协程
+        while self._async_waiters:
+            waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def configure(self, rate=None, max_in_flight=None):
+        super().configure(rate, max_in_flight)
+        while self._async_waiters:
+            waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,189 @@
+"""规划全文检索：中文二元分词（bigram）倒排索引
+
+- 汉字按连续片段切成相邻两字的词项（“肉夹馍” -> “肉夹”“夹馍”），片段最后一个字另记一个单字词项，
+  这样任意单字查询也能通过词项前缀找到；英文字母与数字按整词（小写）切分
+- 倒排表与规划存在同一个SQLite库里，随规划保存在同一事务内增量更新
+- 查询要求包含全部词项，按BM25打分，并从正文中截取命中片段
+"""
+import html
+import math
+import re
+import unicodedata
+from collections import Counter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_terms (
+    term TEXT NOT NULL,
+    plan_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, plan_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_plan_terms_plan_id ON plan_terms (plan_id);
+
+CREATE TABLE IF NOT EXISTS plan_index (
+    plan_id INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL
+);
+"""
+
+# 汉字（含扩展A区）片段，或英文字母/数字组成的词
+TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿]+|[a-z0-9]+")
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CHARS = 40
+
+
+def normalize_text(text):
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def normalize_with_offsets(text):
+    """规范化文本，同时返回每个规范化字符在原文中的范围 [(开始, 结束)]
+
+    NFKC会改变长度（“……”->“......”，“㎞”->“km”），规范化文本中的位置不能直接用来切原文。
+    逐个字符（连同其后的组合字符）规范化，记下每个结果字符来自原文的哪一段。
+    """
+    pieces = []
+    spans = []
+    start = 0
+    while start < len(text):
+        end = start + 1
+        while end < len(text) and unicodedata.combining(text[end]):
+            end += 1
+        piece = normalize_text(text[start:end])
+        pieces.append(piece)
+        spans.extend([(start, end)] * len(piece))
+        start = end
+    return "".join(pieces), spans
+
+
+def tokenize(text):
+    """把文本切分为词项列表"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(normalize_text(text)):
+        run = match.group()
+        if not run.isascii():
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+            terms.append(run[-1])
+        else:
+            terms.append(run)
+    return terms
+
+
+def query_terms(query):
+    """查询词项（去重）：单个汉字的片段只保留该字，用前缀匹配"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(normalize_text(query)):
+        run = match.group()
+        if not run.isascii() and len(run) > 1:
+            candidates = [run[i:i + 2] for i in range(len(run) - 1)]
+        else:
+            candidates = [run]
+        for term in candidates:
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def index_plan(conn, plan_id, text):
+    """（重新）索引一条规划；需在调用方的事务内执行"""
+    counts = Counter(tokenize(text))
+    conn.execute("DELETE FROM plan_terms WHERE plan_id = ?", (plan_id,))
+    conn.executemany(
+        "INSERT INTO plan_terms (term, plan_id, tf) VALUES (?, ?, ?)",
+        [(term, plan_id, tf) for term, tf in counts.items()]
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO plan_index (plan_id, length) VALUES (?, ?)",
+        (plan_id, sum(counts.values()))
+    )
+
+
+def _postings(conn, term):
+    """词项的倒排列表 {plan_id: tf}；单个汉字匹配以它开头的所有词项"""
+    if len(term) == 1 and not term.isascii():
+        rows = conn.execute(
+            "SELECT plan_id, SUM(tf) FROM plan_terms WHERE term >= ? AND term < ? GROUP BY plan_id",
+            (term, chr(ord(term) + 1))
+        )
+    else:
+        rows = conn.execute("SELECT plan_id, tf FROM plan_terms WHERE term = ?", (term,))
+    return dict(rows.fetchall())
+
+
+def search(conn, query, limit=20, offset=0):
+    """检索规划，返回 ([(plan_id, 分数), ...], 命中总数)，按分数从高到低"""
+    terms = query_terms(query)
+    if not terms:
+        return [], 0
+
+    postings = [_postings(conn, term) for term in terms]
+    # 从最短的倒排列表开始求交集
+    postings.sort(key=len)
+    candidates = set(postings[0])
+    for posting in postings[1:]:
+        candidates.intersection_update(posting)
+        if not candidates:
+            return [], 0
+
+    total_docs, avg_length = conn.execute("SELECT COUNT(*), AVG(length) FROM plan_index").fetchone()
+    avg_length = avg_length or 1.0
+    lengths = {}
+    ids = list(candidates)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = conn.execute(
+            f"SELECT plan_id, length FROM plan_index WHERE plan_id IN ({','.join('?' * len(chunk))})", chunk
+        )
+        lengths.update(rows.fetchall())
+
+    idfs = [bm25_idf(total_docs, len(posting)) for posting in postings]
+    scores = []
+    for plan_id in candidates:
+        norm = K1 * (1 - B + B * lengths.get(plan_id, avg_length) / avg_length)
+        score = 0.0
+        for posting, idf in zip(postings, idfs):
+            tf = posting[plan_id]
+            score += idf * tf * (K1 + 1) / (tf + norm)
+        scores.append((plan_id, score))
+    scores.sort(key=lambda item: (-item[1], -item[0]))
+    return scores[offset:offset + limit], len(scores)
+
+
+def bm25_idf(total_docs, doc_freq):
+    return math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def make_snippet(text, query, width=SNIPPET_CHARS):
+    """截取正文中第一处命中附近的片段（HTML，已转义），命中部分用<mark>标出"""
+    normalized, spans = normalize_with_offsets(text)
+    needles = [normalize_text(query).strip()] + query_terms(query)
+    position, needle = -1, ""
+    for needle in needles:
+        if needle:
+            position = normalized.find(needle)
+            if position >= 0:
+                break
+    if position < 0:
+        return html.escape(" ".join(text[:width * 2].split()))
+
+    # 换算回原文中的位置
+    match_start = spans[position][0]
+    match_end = spans[position + len(needle) - 1][1]
+    start = max(0, match_start - width)
+    end = min(len(text), match_end + width)
+    # 正文可能来自客户端（/api/save_plan），转义后再加<mark>，片段可以直接当HTML渲染
+    snippet = (
+        html.escape(text[start:match_start])
+        + "<mark>" + html.escape(text[match_start:match_end]) + "</mark>"
+        + html.escape(text[match_end:end])
+    )
+    snippet = " ".join(snippet.split())
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet += "…"
+    return snippet
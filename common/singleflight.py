@@ -0,0 +1,118 @@
+"""相同键的并发请求合并（single-flight）
+
+同一时刻对同一个键的多次调用只会真正执行一次，其余调用等待并共享同一个结果
+（或同一个异常）。用于避免热门选择同时触发多次上游调用、并发覆盖同一个文件。
+``AsyncSingleFlight`` 是协程版本，供异步服务模式使用。
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,        # 实际执行的次数
+            "calls_saved": 0   # 被合并而节省的次数
+        }
+
+    def do(self, key, func, *args, **kwargs):
+        """执行func，若同一个键已有调用在进行中则等待其结果
+
+        返回 (结果, 是否为共享结果)。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._counters["calls_saved"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._counters["calls"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._calls)
+            stats["waiting"] = sum(call.waiters for call in self._calls.values())
+        return stats
+
+
+class AsyncSingleFlight:
+    """按键合并并发的协程调用（只能在同一个事件循环中使用）"""
+
+    def __init__(self):
+        self._calls = {}    # 键 -> 正在执行的asyncio任务
+        self._callers = {}  # 键 -> 正在等待该任务的调用数（含发起者）
+        self._counters = {
+            "calls": 0,
+            "calls_saved": 0
+        }
+
+    async def do(self, key, func, *args, **kwargs):
+        """执行协程函数func，若同一个键已有调用在进行中则等待其结果
+
+        返回 (结果, 是否为共享结果)。只有等待同一个键的调用方全部被取消时，
+        才会取消共享的执行（中断上游请求）。
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self._counters["calls_saved"] += 1
+        else:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            self._callers[key] = 0
+            self._counters["calls"] += 1
+            task.add_done_callback(lambda _: self._forget(key, task))
+        self._callers[key] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._calls.get(key) is task:
+                self._callers[key] -= 1
+                if self._callers[key] == 0:
+                    task.cancel()
+            raise
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._callers[key]
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats["in_flight"] = len(self._calls)
+        stats["waiting"] = sum(max(0, callers - 1) for callers in self._callers.values())
+        return stats
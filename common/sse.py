@@ -0,0 +1,60 @@
+"""DeepSeek流式响应解析与Server-Sent Events编码"""
+import json
+
+# 流结束标记（parse_stream_line的返回值）
+DONE = object()
+
+
+def iter_stream_content(response, on_usage=None):
+    """逐段产出DeepSeek流式响应（stream: true）中的文本增量
+
+    DeepSeek与OpenAI兼容，每个事件形如 ``data: {...}``，以 ``data: [DONE]`` 结束。
+    最后一个事件中带有usage字段时，通过on_usage回调交给调用方。
+    SSE规定按UTF-8解码：按字节切行后逐行解码，不使用requests按Content-Type猜测的编码
+    （text/event-stream没有charset时会被当成ISO-8859-1）。
+    """
+    for raw_line in response.iter_lines():
+        line = raw_line.decode("utf-8", errors="replace")
+        content = parse_stream_line(line, on_usage)
+        if content is DONE:
+            break
+        if content:
+            yield content
+
+
+async def aiter_stream_content(response, on_usage=None):
+    """iter_stream_content的异步版本，response为httpx的流式响应"""
+    async for line in response.aiter_lines():
+        content = parse_stream_line(line, on_usage)
+        if content is DONE:
+            break
+        if content:
+            yield content
+
+
+def parse_stream_line(line, on_usage=None):
+    """解析流式响应中的一行，返回文本增量、None（无内容）或DONE"""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return DONE
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None
+    if on_usage is not None and chunk.get("usage"):
+        on_usage(chunk["usage"])
+    choices = chunk.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content")
+
+
+def format_sse(data, event=None):
+    """把一条消息编码为SSE格式"""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return message
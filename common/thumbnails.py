@@ -0,0 +1,184 @@
+"""城市卡片图片的后台解码与缩略图缓存（Tk）
+
+原图（travel-planner/frontend/public/images/cities/*.jpg）按前端的尺寸提供，在主线程里解码、缩放
+会卡住界面。ThumbnailCache把这些工作放到后台线程：
+
+- 工作线程读取原图、按卡片尺寸裁剪缩放（JPEG用draft按缩小后的尺寸解码），结果以PPM写入磁盘缓存，
+  文件名是原图内容的哈希加尺寸（images/<sha1前16位>_<宽>x<高>.ppm）；原图不变时下次直接读缓存，
+  不需要PIL，也不需要再解码
+- 主线程只做 ``PhotoImage(data=PPM数据)``（逐像素拷贝，没有解码），解码好的图片放在LRU中
+- 图片没准备好时先返回占位图，准备好后在主线程中回调，由调用方换上真正的图片
+
+    thumbnails = ThumbnailCache("images", size=(180, 90), deliver=lambda fn, *args: root.after(0, fn, *args))
+    label.config(image=thumbnails.get(path, lambda image: label.config(image=image)))
+
+除PhotoImage外的所有方法都只能在主线程中调用；deliver负责把回调交给主线程。
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from io import BytesIO
+
+from common.jobs import JobQueue, JobQueueFull
+
+CITY_IMAGE_DIR = os.path.join("travel-planner", "frontend", "public", "images", "cities")
+DEFAULT_CITY_IMAGE = "default.jpg"
+
+# 城市 -> 图片文件名（与前端的城市id一致）
+CITY_IMAGE_IDS = {
+    "西安": "xian",
+    "青岛": "qingdao",
+    "北京": "beijing",
+    "南京": "nanjing",
+    "长沙": "changsha",
+    "重庆": "chongqing",
+    "哈尔滨": "haerbin",
+    "杭州": "hangzhou",
+    "贵州": "guizhou",
+    "成都": "chengdu",
+    "拉萨": "lhasa",
+    "天津": "tianjin",
+    "上海": "shanghai",
+    "广州": "guangzhou",
+    "呼和浩特": "huhehaote",
+    "海南": "hainan"
+}
+
+
+def city_image_path(city, image_dir=CITY_IMAGE_DIR):
+    """城市对应的原图路径，没有专门的图片时使用默认图片"""
+    city_id = CITY_IMAGE_IDS.get(city)
+    if city_id is not None:
+        path = os.path.join(image_dir, f"{city_id}.jpg")
+        if os.path.exists(path):
+            return path
+    return os.path.join(image_dir, DEFAULT_CITY_IMAGE)
+
+
+class ThumbnailCache:
+    """后台生成缩略图 + 磁盘缓存 + 主线程中的PhotoImage LRU"""
+
+    def __init__(self, cache_dir="images", size=(180, 90), max_images=128, workers=2, max_pending=256,
+                 deliver=None, placeholder_color="#ecf0f1"):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_images = max_images
+        self.deliver = deliver  # deliver(fn, *args)：在主线程中执行fn(*args)
+        self.placeholder_color = placeholder_color
+        self._placeholder = None
+        self._images = OrderedDict()  # 原图路径 -> PhotoImage
+        self._waiting = {}  # 原图路径 -> [回调]，正在后台生成的图片
+        self._failed = set()  # 无法生成缩略图的原图，不再重试
+        self._digests = {}  # (原图路径, mtime, 大小) -> 内容哈希（工作线程使用）
+        self._queue = JobQueue(workers=workers, max_pending=max_pending, retention=60)
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "loads": 0, "disk_hits": 0, "decodes": 0, "failures": 0}
+
+    @property
+    def placeholder(self):
+        """图片准备好之前显示的占位图"""
+        if self._placeholder is None:
+            width, height = self.size
+            self._placeholder = tk.PhotoImage(width=width, height=height)
+            self._placeholder.put(self.placeholder_color, to=(0, 0, width, height))
+        return self._placeholder
+
+    def get(self, path, callback=None):
+        """返回path的缩略图；还没有准备好时返回占位图，准备好后在主线程中调用callback(image)"""
+        image = self._images.get(path)
+        if image is not None:
+            self._images.move_to_end(path)
+            self._count("memory_hits")
+            return image
+        if path in self._failed:
+            return self.placeholder
+
+        waiting = self._waiting.get(path)
+        if waiting is None:
+            try:
+                self._queue.submit(self._load, path)
+            except JobQueueFull:
+                # 排队的图片太多（例如快速滚动），先显示占位图，下次显示这张卡片时再请求
+                return self.placeholder
+            waiting = self._waiting[path] = []
+        if callback is not None:
+            waiting.append(callback)
+        return self.placeholder
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["images"] = len(self._images)
+        stats["loading"] = len(self._waiting)
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _load(self, job, path):
+        """在工作线程中生成缩略图，结果交给主线程"""
+        try:
+            data = self._thumbnail_data(path)
+        except Exception as e:
+            print(f"生成缩略图失败: {path}: {e}")
+            data = None
+        self.deliver(self._loaded, path, data)
+
+    def _loaded(self, path, data):
+        """在主线程中创建PhotoImage并通知等待的卡片"""
+        callbacks = self._waiting.pop(path, [])
+        if data is None:
+            self._failed.add(path)
+            self._count("failures")
+            return
+        image = tk.PhotoImage(data=data)
+        self._count("loads")
+        self._images[path] = image
+        while len(self._images) > self.max_images:
+            # 仍在卡片上显示的图片由卡片持有引用，淘汰后不会消失
+            self._images.popitem(last=False)
+        for callback in callbacks:
+            callback(image)
+
+    def _thumbnail_data(self, path):
+        """返回缩略图的PPM数据：优先读磁盘缓存，没有时解码原图生成"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()[:16]
+            self._digests[key] = digest
+
+        width, height = self.size
+        cache_path = os.path.join(self.cache_dir, f"{digest}_{width}x{height}.ppm")
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            self._count("disk_hits")
+            return data
+        except FileNotFoundError:
+            pass
+
+        # PIL只在需要解码原图时才导入
+        from PIL import Image, ImageOps
+
+        with Image.open(path) as source:
+            # JPEG直接按接近目标的尺寸解码（DCT缩放），比解码整张原图再缩小快得多
+            source.draft("RGB", (width * 2, height * 2))
+            thumbnail = ImageOps.fit(source.convert("RGB"), self.size, Image.LANCZOS)
+        buffer = BytesIO()
+        thumbnail.save(buffer, "PPM")
+        data = buffer.getvalue()
+        self._count("decodes")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+        return data
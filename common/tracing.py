@@ -0,0 +1,130 @@
+"""轻量级分段计时（span）与按需性能剖析
+
+- ``start_trace`` 为当前线程/协程开启一次追踪，之后各处的 ``with span("名称"):`` 会记录耗时；
+  没有开启追踪时span不做任何事，可以放心地写在公共代码里
+- 追踪结束后以JSON行写入trace日志，并可以转换为Server-Timing响应头
+- ``Profiler`` 用cProfile包住一次请求，把结果保存为.prof文件
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+trace_logger = logging.getLogger("trace")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """一次请求（或一个后台任务）的分段耗时"""
+
+    def __init__(self, name, trace_id=None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []  # (名称, 相对开始时间, 耗时)，单位秒
+        self._token = None
+
+    def add_span(self, name, start, duration):
+        self.spans.append((name, start - self.started, duration))
+
+    def server_timing(self, prefix=""):
+        """转换为Server-Timing头：同名span的耗时会累加"""
+        totals = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        if self.duration is not None:
+            totals["total"] = self.duration
+        return ", ".join(f"{prefix}{name};dur={duration * 1000:.1f}" for name, duration in totals.items())
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+                for name, start, duration in self.spans
+            ]
+        }
+
+
+def start_trace(name, trace_id=None):
+    """开启追踪并设为当前追踪"""
+    trace = Trace(name, trace_id)
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace, **fields):
+    """结束追踪，写入trace日志（附带额外字段）"""
+    trace.duration = time.perf_counter() - trace.started
+    if trace._token is not None:
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # 在其他上下文中结束（例如流式响应的生成器），直接清空
+            _current_trace.set(None)
+        trace._token = None
+    if trace_logger.isEnabledFor(logging.INFO):
+        record = trace.to_dict()
+        record.update(fields)
+        trace_logger.info(json.dumps(record, ensure_ascii=False))
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name):
+    """记录一段代码的耗时；没有当前追踪时不做任何事"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter() - start)
+
+
+def configure_trace_log(path):
+    """把trace日志写入单独的JSON行文件（不向上传播到根日志）"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+
+class Profiler:
+    """用cProfile剖析一段代码，结果保存到directory"""
+
+    def __init__(self, directory="profiles"):
+        self.directory = directory
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self, label):
+        """停止剖析并保存，返回文件路径"""
+        self._profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "request"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}_{uuid.uuid4().hex[:6]}.prof")
+        self._profile.dump_stats(path)
+        return path
@@ -0,0 +1,109 @@
+"""虚拟化的卡片网格（Tk）
+
+目录里有成千上万个城市时，给每个城市都建一张卡片（Frame + Label + Button）要好几秒，
+内存也随城市数增长。VirtualGrid仍然是Canvas + 滚动条，但只为可见的行（多留一行）创建单元格：
+
+- 滚动区域按条目数计算（行数 × 行高），不需要真的把所有卡片摆上去
+- 滚动或改变窗口大小时，把移出视野的单元格挪到新出现的位置，重新绑定条目
+  （条目下标对单元格数取模，滚动一行只需要重新绑定一行的单元格）
+- 单元格数只取决于窗口能显示几行，与条目总数无关，创建耗时与内存都是常数
+
+    grid = VirtualGrid(container, columns=4, row_height=170, create_cell=..., bind_cell=...)
+    grid.set_items(cities)
+
+create_cell(canvas) 返回一个元组，第一个元素是放在canvas上的单元格框架，其余是需要更新的控件；
+bind_cell(cell, item) 用条目更新单元格。
+"""
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualGrid:
+    """只为可见行创建并循环使用单元格的滚动网格（只能在主线程中使用）"""
+
+    def __init__(self, parent, columns, row_height, create_cell, bind_cell, bg=None):
+        self.columns = columns
+        self.row_height = row_height
+        self.create_cell = create_cell
+        self.bind_cell = bind_cell
+        self.items = []
+
+        self.canvas = tk.Canvas(parent, bg=bg, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+
+        self._cells = []  # (单元格, canvas窗口)
+        self._bound = []  # 每个单元格当前绑定的条目下标
+        self._visible = None  # 可见的单元格数
+        self._region = None
+        self._cell_width = None
+
+    @property
+    def cell_count(self):
+        """已创建的单元格数量"""
+        return len(self._cells)
+
+    def set_items(self, items):
+        """替换全部条目并滚动到顶部"""
+        self.items = list(items)
+        self._bound = [None] * len(self._cells)
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def refresh(self):
+        """按当前的滚动位置与窗口大小摆放单元格"""
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        rows = -(-len(self.items) // self.columns)
+        region = (0, 0, width, rows * self.row_height)
+        if region != self._region:
+            self._region = region
+            self.canvas.configure(scrollregion=region)
+
+        # 可见的行数，多留一行，滚动时不露出空白
+        visible = (height // self.row_height + 2) * self.columns
+        while len(self._cells) < visible:
+            cell = self.create_cell(self.canvas)
+            window = self.canvas.create_window(0, 0, window=cell[0], anchor="nw", state="hidden")
+            self._cells.append((cell, window))
+            self._bound.append(None)
+        if len(self._cells) > visible:
+            # 窗口变矮，多余的单元格先隐藏，之后窗口变高还能再用
+            for _, window in self._cells[visible:]:
+                self.canvas.itemconfigure(window, state="hidden")
+        if visible != self._visible:
+            # 取模的基数变了，单元格与条目的对应关系全部重新计算
+            self._visible = visible
+            self._bound = [None] * len(self._cells)
+
+        cell_width = width // self.columns
+        resize = cell_width != self._cell_width
+        self._cell_width = cell_width
+        start = max(0, int(self.canvas.canvasy(0)) // self.row_height) * self.columns
+        end = min(len(self.items), start + visible)
+        shown = set()
+        for index in range(start, end):
+            slot = index % visible
+            shown.add(slot)
+            cell, window = self._cells[slot]
+            if self._bound[slot] != index:
+                self.bind_cell(cell, self.items[index])
+                self._bound[slot] = index
+                row, column = divmod(index, self.columns)
+                self.canvas.coords(window, column * cell_width, row * self.row_height)
+                self.canvas.itemconfigure(window, width=cell_width, height=self.row_height, state="normal")
+            elif resize:
+                row, column = divmod(index, self.columns)
+                self.canvas.coords(window, column * cell_width, row * self.row_height)
+                self.canvas.itemconfigure(window, width=cell_width, height=self.row_height)
+        for slot in range(min(visible, len(self._cells))):
+            if slot not in shown:
+                self.canvas.itemconfigure(self._cells[slot][1], state="hidden")
+                self._bound[slot] = None
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
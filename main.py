@@ -1,16 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, font
 import json
-import os
-from PIL import Image, ImageTk
-import requests
-from io import BytesIO
 import threading
-import time
 
-# 创建存储目录
-os.makedirs("images", exist_ok=True)
-os.makedirs("plans", exist_ok=True)
+from common.catalog import DEFAULT_CATALOG, load_catalog
+from common.itinerary import BLANK, BULLET, DETAIL, HEADING1, HEADING2, TEXT, TITLE, classify_line, parse_plan
+from common.jobs import JobQueue, JobQueueFull
+from common.plan_renderer import PlanRenderer
+from common.prompt import build_payload, plan_cache_key
+from common.sse import iter_stream_content
+from common.thumbnails import ThumbnailCache, city_image_path
+from common.virtual_grid import VirtualGrid
 
 # 定义颜色方案
 COLORS = {
@@ -26,6 +26,40 @@ COLORS = {
     "border": "#dfe4ea"      # 边框颜色
 }
 
+# 规划生成的工作线程数与最多排队的生成数
+GENERATION_WORKERS = 2
+GENERATION_MAX_PENDING = 4
+
+# 城市与子类别网格每行的卡片数量与行高（含卡片间距）
+CITY_COLUMNS = 4
+CITY_ROW_HEIGHT = 260
+CITY_IMAGE_SIZE = (180, 90)
+SUBCATEGORY_COLUMNS = 3
+SUBCATEGORY_ROW_HEIGHT = 180
+
+# 主窗口显示后过多久开始后台预热（初始化规划存储、预先导入网络模块），单位毫秒
+WARMUP_DELAY_MS = 100
+
+# 加载页面轮换显示的提示
+LOADING_TIPS = [
+    "正在为您分析目的地交通情况...",
+    "正在为您筛选最佳旅游路线...",
+    "正在为您整理当地特色美食...",
+    "正在为您规划合理的游玩时间...",
+    "正在为您推荐舒适的住宿选择..."
+]
+
+# 规划中各类行的 (前缀, 文本样式)
+PLAN_LINE_STYLES = {
+    TITLE: ("", "title"),
+    HEADING1: ("", "heading1"),
+    HEADING2: ("", "heading2"),
+    BULLET: ("• ", "bullet"),
+    DETAIL: ("   ◦ ", "bullet"),
+    TEXT: ("", "normal"),
+    BLANK: ("", "normal")
+}
+
 class TravelPlannerApp:
     def __init__(self, root):
         self.root = root
@@ -52,8 +86,11 @@ class TravelPlannerApp:
         # 初始化城市和分类数据
         self.load_city_data()
         
-        # 创建主界面
-        self.create_main_page()
+        # 规划缓存与存储打开数据库、扫描磁盘缓存都比较慢，主窗口显示之后再在后台初始化（见init_storage）
+        self.plan_codec = None
+        self._plan_cache = None
+        self._plan_store = None
+        self._storage_lock = threading.Lock()
         
         # 存储用户选择
         self.selected_city = None
@@ -62,92 +99,183 @@ class TravelPlannerApp:
         
         # 创建页面导航历史
         self.navigation_history = []
+        
+        # 流式渲染规划时的状态
+        self.plan_streaming = False
+        self.plan_stream_buffer = ""
+        self.current_plan = ""
+        self.current_itinerary = parse_plan("")
+        
+        # 城市图片：后台线程解码缩放，缩略图缓存在images目录，主线程只创建PhotoImage
+        self.thumbnails = ThumbnailCache(
+            "images",
+            size=CITY_IMAGE_SIZE,
+            deliver=lambda fn, *args: self.root.after(0, fn, *args),
+            placeholder_color=COLORS["light_bg"]
+        )
+        
+        # 页面只创建一次并一直保留，切换页面时把对应的框架提到最上层，
+        # 页面中随选择变化的部分（标题、路径、子类别卡片等）原地更新
+        self.page_container = tk.Frame(self.root, bg=COLORS["bg"])
+        self.page_container.pack(fill=tk.BOTH, expand=True)
+        self.page_container.grid_rowconfigure(0, weight=1)
+        self.page_container.grid_columnconfigure(0, weight=1)
+        self.page_builders = {
+            "main": self.build_main_page,
+            "city": self.build_city_page,
+            "subcategory": self.build_subcategory_page,
+            "loading": self.build_loading_page,
+            "result": self.build_result_page
+        }
+        self.pages = {}
+        self.current_page = None
+        self.scroll_canvases = {}  # 页面 -> 鼠标滚轮滚动的canvas
+        self.tip_after_id = None
+        
+        # 规划生成的工作线程池：取消的生成会中止进行中的请求，连续点击也不会堆积线程与上游调用
+        self.generation_queue = JobQueue(workers=GENERATION_WORKERS, max_pending=GENERATION_MAX_PENDING)
+        self.generation_job = None
+        
+        # 启用鼠标滚轮滚动（滚动当前页面的滚动区域）
+        self.root.bind_all("<MouseWheel>", self._on_mousewheel)
+        
+        # 创建主界面
+        self.create_main_page()
+        
+        # 第一帧画出来之后再做不影响首屏的初始化
+        self.root.after(WARMUP_DELAY_MS, self.start_warmup)
+
+    @property
+    def plan_cache(self):
+        """规划缓存（内存LRU + 磁盘持久化），第一次使用时初始化"""
+        self.init_storage()
+        return self._plan_cache
+
+    @property
+    def plan_store(self):
+        """规划存储（SQLite），第一次使用时初始化"""
+        self.init_storage()
+        return self._plan_store
+
+    def init_storage(self):
+        """初始化规划的压缩字典、缓存与存储（只执行一次，可以在任意线程中调用）"""
+        with self._storage_lock:
+            if self._plan_store is not None:
+                return
+            from common.plan_cache import PlanCache
+            from common.plan_codec import PlanCodec
+            from common.plan_store import PlanStore
+            
+            # 规划正文的字典压缩（缓存与存储共用同一套字典）
+            self.plan_codec = PlanCodec("plans/dicts")
+            
+            # 规划缓存（内存LRU + 磁盘持久化）
+            self._plan_cache = PlanCache("cache/plans", codec=self.plan_codec)
+            
+            # 规划存储（SQLite）
+            self._plan_store = PlanStore("plans/plans.db", codec=self.plan_codec)
+
+    def start_warmup(self):
+        """在后台线程中初始化规划存储并预先导入网络模块，第一次生成规划时不用再等"""
+        threading.Thread(target=self.warmup, name="warmup", daemon=True).start()
+
+    def warmup(self):
+        try:
+            self.init_storage()
+            import common.llm_client  # noqa: F401
+        except Exception as e:
+            # 预热失败不影响使用，第一次用到时会再初始化（并报告错误）
+            print(f"后台初始化失败: {e}")
 
     def load_city_data(self):
-        """加载城市和分类数据"""
-        self.city_data = {}
-        
-        # 解析induction.me文件
+        """加载城市和分类数据（优先使用已编译的目录快照）"""
         try:
-            with open("induction.me", "r", encoding="utf-8") as f:
-                content = f.read()
-                
-            current_city = None
-            current_category = None
-            
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 检查是否是新城市
-                if not line.startswith("人文景观") and not line.startswith("自然景观") and not line.startswith("饮食文化") and not any(c.isdigit() for c in line):
-                    current_city = line.replace("：", "").strip()
-                    if current_city not in self.city_data:
-                        self.city_data[current_city] = {
-                            "人文景观": [], 
-                            "自然景观": [], 
-                            "饮食文化": []
-                        }
-                
-                # 检查是否是新分类
-                elif line.startswith("人文景观"):
-                    current_category = "人文景观"
-                elif line.startswith("自然景观"):
-                    current_category = "自然景观"
-                elif line.startswith("饮食文化"):
-                    current_category = "饮食文化"
-                
-                # 处理分类内容
-                elif current_city and current_category and "：" not in line:
-                    items = [item.strip() for item in line.replace("，", ",").split(",")]
-                    for item in items:
-                        if item and not item.isdigit() and item not in self.city_data[current_city][current_category]:
-                            if item.strip():  # 确保不添加空字符串
-                                self.city_data[current_city][current_category].append(item.strip())
-        
+            self.city_data = load_catalog("induction.me")
         except Exception as e:
             print(f"加载城市数据出错: {e}")
             # 如果出错，使用默认数据
-            self.city_data = {
-                "北京": {
-                    "人文景观": ["故宫博物院", "八达岭长城", "颐和园"],
-                    "自然景观": ["百里画廊", "京东大峡谷", "八达岭国家森林公园"],
-                    "饮食文化": ["北京烤鸭", "稻香村糕点", "涮羊肉"]
-                }
-            }
+            self.city_data = DEFAULT_CATALOG
 
-    def create_main_page(self):
-        """创建主页面"""
-        # 清除当前页面内容
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        # 创建主框架
-        main_frame = tk.Frame(self.root, bg=COLORS["bg"])
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+    def show_page(self, name):
+        """切换到页面name（第一次显示时创建），返回页面的框架"""
+        page = self.pages.get(name)
+        if page is None:
+            page = tk.Frame(self.page_container, bg=COLORS["bg"])
+            page.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
+            self.page_builders[name](page)
+            self.pages[name] = page
+        if self.current_page == "loading" and name != "loading":
+            self.stop_loading_animation()
+        if name not in ("loading", "result"):
+            # 离开生成相关的页面（取消或返回）时，进行中的生成随之取消
+            self.cancel_generation()
+        self.current_page = name
+        page.tkraise()
+        return page
+
+    def _on_mousewheel(self, event):
+        canvas = self.scroll_canvases.get(self.current_page)
+        if canvas is not None:
+            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+
+    def create_footer(self, parent):
+        """添加底部版权信息"""
+        footer_frame = tk.Frame(parent, bg=COLORS["bg"])
+        footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
         
+        footer_text = tk.Label(
+            footer_frame,
+            text="© 2024 旅游规划生成器 - 使用AI技术定制您的旅行计划",
+            font=("Heiti SC", 10),
+            bg=COLORS["bg"],
+            fg=COLORS["light_text"]
+        )
+        footer_text.pack()
+
+    def create_back_button(self, parent, text, command):
+        """添加顶部导航栏的返回按钮"""
+        back_button = tk.Button(
+            parent,
+            text=text,
+            font=self.button_font,
+            bg=COLORS["light_bg"],
+            fg=COLORS["text"],
+            activebackground=COLORS["border"],
+            activeforeground=COLORS["text"],
+            relief=tk.FLAT,
+            padx=10,
+            pady=5,
+            cursor="hand2",
+            command=command
+        )
+        back_button.pack(side=tk.LEFT)
+
+    def create_main_page(self):
+        """显示主页面"""
+        self.show_page("main")
+
+    def build_main_page(self, main_frame):
+        """创建主页面（只在第一次显示时调用）"""
         # 创建欢迎标题区域
         title_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         title_frame.pack(pady=(10, 30))
         
         # 添加应用标题
         title_label = tk.Label(
-            title_frame, 
-            text="旅游规划生成器", 
-            font=self.title_font, 
-            bg=COLORS["bg"], 
+            title_frame,
+            text="旅游规划生成器",
+            font=self.title_font,
+            bg=COLORS["bg"],
             fg=COLORS["primary"]
         )
         title_label.pack()
         
         # 添加应用副标题
         subtitle_label = tk.Label(
-            title_frame, 
-            text="选择一个城市开始您的旅程规划", 
-            font=self.subtitle_font, 
-            bg=COLORS["bg"], 
+            title_frame,
+            text="选择一个城市开始您的旅程规划",
+            font=self.subtitle_font,
+            bg=COLORS["bg"],
             fg=COLORS["light_text"]
         )
         subtitle_label.pack(pady=8)
@@ -169,172 +297,132 @@ class TravelPlannerApp:
         separator = ttk.Separator(city_title_frame, orient='horizontal')
         separator.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
         
+        # 添加底部版权信息（先占住底部，滚动区域填满剩余空间）
+        self.create_footer(main_frame)
+        
         # 创建城市选择区域（使用网格布局）
         city_container = tk.Frame(main_frame, bg=COLORS["bg"])
         city_container.pack(fill=tk.BOTH, expand=True)
         
-        # 创建滚动区域
-        canvas = tk.Canvas(city_container, bg=COLORS["bg"], highlightthickness=0)
-        scrollbar = ttk.Scrollbar(city_container, orient="vertical", command=canvas.yview)
-        
-        city_frame = tk.Frame(canvas, bg=COLORS["bg"])
-        
-        # 配置滚动
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # 创建城市网格（只为可见的行创建卡片，滚动时循环使用）
+        self.city_grid = VirtualGrid(
+            city_container,
+            columns=CITY_COLUMNS,
+            row_height=CITY_ROW_HEIGHT,
+            create_cell=self.create_city_card,
+            bind_cell=self.bind_city_card,
+            bg=COLORS["bg"]
+        )
+        self.scroll_canvases["main"] = self.city_grid.canvas
+        self.city_card_cities = {}  # 城市卡片 -> 当前显示的城市
+        self.city_grid.set_items(sorted(self.city_data.keys()))
+
+    def create_city_card(self, parent):
+        """创建一张城市卡片，返回 (单元格, 城市图片, 城市名称, 选择按钮)"""
+        cell = tk.Frame(parent, bg=COLORS["bg"])
+        
+        # 创建城市卡片容器
+        city_card = tk.Frame(
+            cell,
+            bg=COLORS["card_bg"],
+            highlightbackground=COLORS["border"],
+            highlightthickness=1,
+            padx=15,
+            pady=15
+        )
+        city_card.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        canvas_frame = canvas.create_window((0, 0), window=city_frame, anchor="nw")
+        # 添加城市图片（先显示占位图，缩略图在后台生成）
+        city_image = tk.Label(city_card, bg=COLORS["card_bg"])
+        city_image.pack()
         
-        # 更新canvas滚动区域
-        def configure_scroll_region(event):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-            # 同时调整窗口宽度
-            canvas.itemconfig(canvas_frame, width=canvas.winfo_width())
-            
-        city_frame.bind("<Configure>", configure_scroll_region)
-        canvas.bind("<Configure>", lambda e: canvas.itemconfig(canvas_frame, width=canvas.winfo_width()))
+        # 添加城市名称
+        city_name = tk.Label(
+            city_card,
+            font=self.card_title_font,
+            bg=COLORS["card_bg"],
+            fg=COLORS["text"],
+            anchor="center"
+        )
+        city_name.pack(pady=(8, 8))
         
-        # 启用鼠标滚轮滚动
-        def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
+        # 添加选择按钮
+        select_button = tk.Button(
+            city_card,
+            text="选择此城市",
+            font=self.button_font,
+            bg=COLORS["primary"],
+            fg="white",
+            activebackground=COLORS["hover"],
+            activeforeground="white",
+            relief=tk.FLAT,
+            padx=10,
+            pady=5,
+            cursor="hand2"
+        )
+        select_button.pack(pady=5)
+        return cell, city_image, city_name, select_button
 
-        # 创建城市网格
-        cities = sorted(list(self.city_data.keys()))
-        row, col = 0, 0
-        max_cols = 4  # 每行显示的城市数量
+    def bind_city_card(self, card, city):
+        cell, city_image, city_name, select_button = card
+        city_name.config(text=city)
+        select_button.config(command=lambda: self.show_city_detail(city))
         
-        # 配置网格
-        for i in range(20):  # 预设更多行
-            city_frame.grid_rowconfigure(i, weight=1)
-            
-        for i in range(max_cols):
-            city_frame.grid_columnconfigure(i, weight=1)
-        
-        # 添加城市卡片
-        for city in cities:
-            # 创建城市卡片容器
-            city_card = tk.Frame(
-                city_frame, 
-                bg=COLORS["card_bg"],
-                highlightbackground=COLORS["border"],
-                highlightthickness=1,
-                padx=15,
-                pady=15,
-                width=200,
-                height=150
-            )
-            city_card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-            city_card.grid_propagate(False)  # 保持卡片大小固定
-            
-            # 添加城市名称
-            city_name = tk.Label(
-                city_card,
-                text=city,
-                font=self.card_title_font,
-                bg=COLORS["card_bg"],
-                fg=COLORS["text"],
-                anchor="center"
-            )
-            city_name.pack(pady=(10, 15))
-            
-            # 添加选择按钮
-            select_button = tk.Button(
-                city_card,
-                text="选择此城市",
-                font=self.button_font,
-                bg=COLORS["primary"],
-                fg="white",
-                activebackground=COLORS["hover"],
-                activeforeground="white",
-                relief=tk.FLAT,
-                padx=10,
-                pady=5,
-                cursor="hand2",
-                command=lambda c=city: self.show_city_detail(c)
-            )
-            select_button.pack(pady=5)
-            
-            # 更新行列索引
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
-                
-        # 添加底部版权信息
-        footer_frame = tk.Frame(main_frame, bg=COLORS["bg"])
-        footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
+        # 卡片会被循环使用，图片准备好时卡片仍显示这个城市才换上
+        self.city_card_cities[cell] = city
         
-        footer_text = tk.Label(
-            footer_frame,
-            text="© 2024 旅游规划生成器 - 使用AI技术定制您的旅行计划",
-            font=("Heiti SC", 10),
-            bg=COLORS["bg"],
-            fg=COLORS["light_text"]
-        )
-        footer_text.pack()
+        def show_image(image):
+            if self.city_card_cities.get(cell) == city:
+                self.set_card_image(city_image, image)
+        
+        self.set_card_image(city_image, self.thumbnails.get(city_image_path(city), show_image))
+
+    def set_card_image(self, label, image):
+        label.config(image=image)
+        label.image = image  # 保持引用，图片被LRU淘汰后也不会从卡片上消失
 
     def show_city_detail(self, city):
         """显示城市详情页面"""
         self.selected_city = city
         self.navigation_history.append("main")
         
-        # 清除当前页面内容
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        # 创建主框架
-        main_frame = tk.Frame(self.root, bg=COLORS["bg"])
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
+        self.show_page("city")
+        self.city_title_label.config(text=f"{city} · 旅游规划")
+        self.city_guide_label.config(text=f"请选择您在{city}感兴趣的旅游类别")
+
+    def build_city_page(self, main_frame):
+        """创建城市详情页面（城市相关的文字由show_city_detail更新）"""
         # 创建顶部导航栏
         nav_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         nav_frame.pack(fill=tk.X, pady=(0, 20))
         
         # 添加返回按钮
-        back_button = tk.Button(
-            nav_frame,
-            text="← 返回城市选择",
-            font=self.button_font,
-            bg=COLORS["light_bg"],
-            fg=COLORS["text"],
-            activebackground=COLORS["border"],
-            activeforeground=COLORS["text"],
-            relief=tk.FLAT,
-            padx=10,
-            pady=5,
-            cursor="hand2",
-            command=self.create_main_page
-        )
-        back_button.pack(side=tk.LEFT)
+        self.create_back_button(nav_frame, "← 返回城市选择", self.create_main_page)
         
         # 创建城市标题区域
         title_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         title_frame.pack(fill=tk.X, pady=15)
         
         # 城市标题
-        title_label = tk.Label(
-            title_frame, 
-            text=f"{city} · 旅游规划", 
-            font=self.title_font, 
-            bg=COLORS["bg"], 
+        self.city_title_label = tk.Label(
+            title_frame,
+            font=self.title_font,
+            bg=COLORS["bg"],
             fg=COLORS["primary"]
         )
-        title_label.pack(side=tk.LEFT)
+        self.city_title_label.pack(side=tk.LEFT)
         
         # 添加提示
         guide_frame = tk.Frame(main_frame, bg=COLORS["light_bg"], padx=15, pady=15)
         guide_frame.pack(fill=tk.X, pady=15)
         
-        guide_text = tk.Label(
+        self.city_guide_label = tk.Label(
             guide_frame,
-            text=f"请选择您在{city}感兴趣的旅游类别",
             font=self.subtitle_font,
             bg=COLORS["light_bg"],
             fg=COLORS["text"]
         )
-        guide_text.pack()
+        self.city_guide_label.pack()
         
         # 创建分类选择区域
         categories_frame = tk.Frame(main_frame, bg=COLORS["bg"])
@@ -352,7 +440,7 @@ class TravelPlannerApp:
         for i, (category, icon, desc) in enumerate(zip(categories, category_icons, category_desc)):
             # 创建分类卡片
             category_card = tk.Frame(
-                categories_frame, 
+                categories_frame,
                 bg=COLORS["card_bg"],
                 highlightbackground=COLORS["border"],
                 highlightthickness=1,
@@ -410,221 +498,183 @@ class TravelPlannerApp:
             category_button.pack(pady=5)
         
         # 添加底部版权信息
-        footer_frame = tk.Frame(main_frame, bg=COLORS["bg"])
-        footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
-        
-        footer_text = tk.Label(
-            footer_frame,
-            text="© 2024 旅游规划生成器 - 使用AI技术定制您的旅行计划",
-            font=("Heiti SC", 10),
-            bg=COLORS["bg"],
-            fg=COLORS["light_text"]
-        )
-        footer_text.pack()
+        self.create_footer(main_frame)
 
     def show_subcategory(self, category):
         """显示子类别选择页面"""
         self.selected_category = category
         self.navigation_history.append("city")
         
-        # 清除当前页面内容
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        self.show_page("subcategory")
+        self.subcategory_path_label.config(text=f"{self.selected_city} > {category}")
+        self.subcategory_title_label.config(text=f"{self.selected_city} · {category}")
+        self.subcategory_guide_label.config(text=f"请选择您在{self.selected_city}感兴趣的{category}")
         
-        # 创建主框架
-        main_frame = tk.Frame(self.root, bg=COLORS["bg"])
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        # 获取子类别
+        subcategories = self.city_data[self.selected_city][category]
+        
+        # 如果没有子类别，显示提示信息
+        if not subcategories:
+            self.subcategory_container.pack_forget()
+            self.no_data_label.config(text=f"抱歉，暂无{self.selected_city}的{category}数据")
+            self.no_data_frame.pack(fill=tk.BOTH, expand=True)
+            return
         
+        self.no_data_frame.pack_forget()
+        self.subcategory_container.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.subcategory_grid.set_items(subcategories)
+
+    def build_subcategory_page(self, main_frame):
+        """创建子类别选择页面（随选择变化的部分由show_subcategory更新）"""
         # 创建顶部导航栏
         nav_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         nav_frame.pack(fill=tk.X, pady=(0, 20))
         
         # 添加返回按钮
-        back_button = tk.Button(
-            nav_frame,
-            text="← 返回分类选择",
-            font=self.button_font,
-            bg=COLORS["light_bg"],
-            fg=COLORS["text"],
-            activebackground=COLORS["border"],
-            activeforeground=COLORS["text"],
-            relief=tk.FLAT,
-            padx=10,
-            pady=5,
-            cursor="hand2",
-            command=lambda: self.show_city_detail(self.selected_city)
-        )
-        back_button.pack(side=tk.LEFT)
+        self.create_back_button(nav_frame, "← 返回分类选择", lambda: self.show_city_detail(self.selected_city))
         
         # 添加当前路径
-        path_label = tk.Label(
+        self.subcategory_path_label = tk.Label(
             nav_frame,
-            text=f"{self.selected_city} > {category}",
             font=self.content_font,
             bg=COLORS["bg"],
             fg=COLORS["light_text"]
         )
-        path_label.pack(side=tk.RIGHT)
+        self.subcategory_path_label.pack(side=tk.RIGHT)
         
         # 创建标题区域
         title_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         title_frame.pack(fill=tk.X, pady=15)
         
         # 添加标题
-        title_label = tk.Label(
-            title_frame, 
-            text=f"{self.selected_city} · {category}", 
-            font=self.title_font, 
-            bg=COLORS["bg"], 
+        self.subcategory_title_label = tk.Label(
+            title_frame,
+            font=self.title_font,
+            bg=COLORS["bg"],
             fg=COLORS["primary"]
         )
-        title_label.pack(side=tk.LEFT)
+        self.subcategory_title_label.pack(side=tk.LEFT)
         
         # 添加提示
         guide_frame = tk.Frame(main_frame, bg=COLORS["light_bg"], padx=15, pady=15)
         guide_frame.pack(fill=tk.X, pady=15)
         
-        guide_text = tk.Label(
+        self.subcategory_guide_label = tk.Label(
             guide_frame,
-            text=f"请选择您在{self.selected_city}感兴趣的{category}",
             font=self.subtitle_font,
             bg=COLORS["light_bg"],
             fg=COLORS["text"]
         )
-        guide_text.pack()
+        self.subcategory_guide_label.pack()
         
-        # 获取子类别
-        subcategories = self.city_data[self.selected_city][category]
+        # 添加底部版权信息（先占住底部，下面的区域填满剩余空间）
+        self.create_footer(main_frame)
         
-        # 如果没有子类别，显示提示信息
-        if not subcategories:
-            no_data_frame = tk.Frame(main_frame, bg=COLORS["bg"], pady=50)
-            no_data_frame.pack(fill=tk.BOTH, expand=True)
-            
-            no_data_label = tk.Label(
-                no_data_frame,
-                text=f"抱歉，暂无{self.selected_city}的{category}数据",
-                font=self.subtitle_font,
-                bg=COLORS["bg"],
-                fg=COLORS["text"]
-            )
-            no_data_label.pack()
-            return
+        # 没有子类别时显示的提示信息
+        self.no_data_frame = tk.Frame(main_frame, bg=COLORS["bg"], pady=50)
+        self.no_data_label = tk.Label(
+            self.no_data_frame,
+            font=self.subtitle_font,
+            bg=COLORS["bg"],
+            fg=COLORS["text"]
+        )
+        self.no_data_label.pack()
         
         # 创建子类别选择区域（使用滚动区域）
-        container = tk.Frame(main_frame, bg=COLORS["bg"])
-        container.pack(fill=tk.BOTH, expand=True, pady=10)
-        
-        # 创建滚动区域
-        canvas = tk.Canvas(container, bg=COLORS["bg"], highlightthickness=0)
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=canvas.yview)
-        
-        subcategories_frame = tk.Frame(canvas, bg=COLORS["bg"])
-        
-        # 配置滚动
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        canvas_frame = canvas.create_window((0, 0), window=subcategories_frame, anchor="nw")
-        
-        # 更新canvas滚动区域
-        def configure_scroll_region(event):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-            # 同时调整窗口宽度
-            canvas.itemconfig(canvas_frame, width=canvas.winfo_width())
-            
-        subcategories_frame.bind("<Configure>", configure_scroll_region)
-        canvas.bind("<Configure>", lambda e: canvas.itemconfig(canvas_frame, width=canvas.winfo_width()))
-        
-        # 启用鼠标滚轮滚动
-        def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
-        
-        # 设置网格
-        max_cols = 3  # 每行显示的子类别数量
-        row, col = 0, 0
-        
-        for i in range(10):  # 预设更多行
-            subcategories_frame.grid_rowconfigure(i, weight=1)
-            
-        for i in range(max_cols):
-            subcategories_frame.grid_columnconfigure(i, weight=1)
-        
-        # 添加子类别卡片
-        for subcategory in subcategories:
-            # 创建子类别卡片
-            subcategory_card = tk.Frame(
-                subcategories_frame, 
-                bg=COLORS["card_bg"],
-                highlightbackground=COLORS["border"],
-                highlightthickness=1,
-                padx=20,
-                pady=20
-            )
-            subcategory_card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-            
-            # 添加子类别标题
-            subcategory_title = tk.Label(
-                subcategory_card,
-                text=subcategory,
-                font=self.card_title_font,
-                bg=COLORS["card_bg"],
-                fg=COLORS["text"]
-            )
-            subcategory_title.pack(pady=(5, 15))
-            
-            # 添加选择按钮
-            subcategory_button = tk.Button(
-                subcategory_card,
-                text="生成旅游规划",
-                font=self.button_font,
-                bg=COLORS["accent"],
-                fg="white",
-                activebackground="#c0392b",  # 深红色
-                activeforeground="white",
-                relief=tk.FLAT,
-                padx=15,
-                pady=8,
-                cursor="hand2",
-                command=lambda sc=subcategory: self.generate_plan(sc)
-            )
-            subcategory_button.pack(pady=5)
-            
-            # 更新行列索引
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
+        self.subcategory_container = tk.Frame(main_frame, bg=COLORS["bg"])
+        self.subcategory_container.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        # 创建子类别网格（只为可见的行创建卡片，换页与滚动时循环使用）
+        self.subcategory_grid = VirtualGrid(
+            self.subcategory_container,
+            columns=SUBCATEGORY_COLUMNS,
+            row_height=SUBCATEGORY_ROW_HEIGHT,
+            create_cell=self.create_subcategory_card,
+            bind_cell=self.bind_subcategory_card,
+            bg=COLORS["bg"]
+        )
+        self.scroll_canvases["subcategory"] = self.subcategory_grid.canvas
+
+    def create_subcategory_card(self, parent):
+        """创建一张子类别卡片，返回 (单元格, 标题, 按钮)"""
+        cell = tk.Frame(parent, bg=COLORS["bg"])
+        
+        # 创建子类别卡片
+        subcategory_card = tk.Frame(
+            cell,
+            bg=COLORS["card_bg"],
+            highlightbackground=COLORS["border"],
+            highlightthickness=1,
+            padx=20,
+            pady=20
+        )
+        subcategory_card.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # 添加底部版权信息
-        footer_frame = tk.Frame(main_frame, bg=COLORS["bg"])
-        footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
+        # 添加子类别标题
+        subcategory_title = tk.Label(
+            subcategory_card,
+            font=self.card_title_font,
+            bg=COLORS["card_bg"],
+            fg=COLORS["text"]
+        )
+        subcategory_title.pack(pady=(5, 15))
         
-        footer_text = tk.Label(
-            footer_frame,
-            text="© 2024 旅游规划生成器 - 使用AI技术定制您的旅行计划",
-            font=("Heiti SC", 10),
-            bg=COLORS["bg"],
-            fg=COLORS["light_text"]
+        # 添加选择按钮
+        subcategory_button = tk.Button(
+            subcategory_card,
+            text="生成旅游规划",
+            font=self.button_font,
+            bg=COLORS["accent"],
+            fg="white",
+            activebackground="#c0392b",  # 深红色
+            activeforeground="white",
+            relief=tk.FLAT,
+            padx=15,
+            pady=8,
+            cursor="hand2"
         )
-        footer_text.pack()
+        subcategory_button.pack(pady=5)
+        return cell, subcategory_title, subcategory_button
+
+    def bind_subcategory_card(self, card, subcategory):
+        _, subcategory_title, subcategory_button = card
+        subcategory_title.config(text=subcategory)
+        subcategory_button.config(command=lambda: self.generate_plan(subcategory))
 
     def generate_plan(self, subcategory):
         """生成旅游规划"""
         self.selected_subcategory = subcategory
         self.navigation_history.append("subcategory")
+        self.plan_streaming = False
         
-        # 清除当前页面内容
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        # 创建主框架
-        main_frame = tk.Frame(self.root, bg=COLORS["bg"])
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        self.show_page("loading")
+        self.selection_info_label.config(
+            text=f"城市：{self.selected_city} | 类别：{self.selected_category} | 特色：{self.selected_subcategory}"
+        )
+        self.start_loading_animation()
         
-        # 创建加载页面
+        # 在有界的工作线程池中生成规划；之前未完成的生成直接取消（连同进行中的请求）
+        self.cancel_generation()
+        try:
+            self.generation_job = self.generation_queue.submit(
+                self.process_plan_generation, self.selected_city, self.selected_category, subcategory
+            )
+        except JobQueueFull:
+            messagebox.showwarning("请稍候", "正在取消之前的生成，请稍后再试")
+            self.show_subcategory(self.selected_category)
+
+    def cancel_generation(self):
+        """取消进行中的规划生成，之后它返回的结果会被丢弃"""
+        if self.generation_job is not None:
+            self.generation_queue.cancel(self.generation_job.id)
+            self.generation_job = None
+
+    def is_current_generation(self, job):
+        """job是否仍是当前的生成（没有被取消或被新的生成替代）"""
+        return job is self.generation_job and not job.cancelled
+
+    def build_loading_page(self, main_frame):
+        """创建加载页面"""
         loading_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         loading_frame.pack(fill=tk.BOTH, expand=True)
         
@@ -639,14 +689,13 @@ class TravelPlannerApp:
         loading_title.pack(pady=(150, 20))
         
         # 添加当前选择信息
-        selection_info = tk.Label(
+        self.selection_info_label = tk.Label(
             loading_frame,
-            text=f"城市：{self.selected_city} | 类别：{self.selected_category} | 特色：{self.selected_subcategory}",
             font=self.subtitle_font,
             bg=COLORS["bg"],
             fg=COLORS["text"]
         )
-        selection_info.pack(pady=(0, 30))
+        self.selection_info_label.pack(pady=(0, 30))
         
         # 添加进度条
         progress_frame = tk.Frame(loading_frame, bg=COLORS["bg"])
@@ -661,41 +710,24 @@ class TravelPlannerApp:
             background=COLORS["primary"]
         )
         
-        progress = ttk.Progressbar(
+        self.progress = ttk.Progressbar(
             progress_frame,
             orient="horizontal",
             length=400,
             mode="indeterminate",
             style="TProgressbar"
         )
-        progress.pack()
-        progress.start(15)
+        self.progress.pack()
         
         # 添加加载提示
-        loading_tips = [
-            "正在为您分析目的地交通情况...",
-            "正在为您筛选最佳旅游路线...",
-            "正在为您整理当地特色美食...",
-            "正在为您规划合理的游玩时间...",
-            "正在为您推荐舒适的住宿选择..."
-        ]
-        
-        tip_label = tk.Label(
+        self.tip_label = tk.Label(
             loading_frame,
-            text=loading_tips[0],
+            text=LOADING_TIPS[0],
             font=self.content_font,
             bg=COLORS["bg"],
             fg=COLORS["light_text"]
         )
-        tip_label.pack(pady=20)
-        
-        # 定时更新提示文字
-        def update_tip(index=0):
-            if index < len(loading_tips):
-                tip_label.config(text=loading_tips[index])
-                self.root.after(2000, update_tip, (index+1) % len(loading_tips))
-        
-        update_tip()
+        self.tip_label.pack(pady=20)
         
         # 添加取消按钮
         cancel_button = tk.Button(
@@ -713,24 +745,50 @@ class TravelPlannerApp:
             command=lambda: self.show_subcategory(self.selected_category)
         )
         cancel_button.pack(pady=30)
-        
-        # 在后台线程中生成规划
-        threading.Thread(target=self.process_plan_generation).start()
 
-    def process_plan_generation(self):
-        """在后台处理旅游规划生成"""
-        # 模拟加载时间
-        time.sleep(3)
+    def start_loading_animation(self):
+        """开始进度条动画与提示文字轮换（离开加载页面时停止）"""
+        self.stop_loading_animation()
+        self.progress.start(15)
+        
+        # 定时更新提示文字
+        def update_tip(index=0):
+            self.tip_label.config(text=LOADING_TIPS[index])
+            self.tip_after_id = self.root.after(2000, update_tip, (index+1) % len(LOADING_TIPS))
         
-        # 调用DeepSeek API生成旅游规划
-        plan = self.call_deepseek_api()
+        update_tip()
+
+    def stop_loading_animation(self):
+        self.progress.stop()
+        if self.tip_after_id is not None:
+            self.root.after_cancel(self.tip_after_id)
+            self.tip_after_id = None
+
+    def process_plan_generation(self, job, city, category, subcategory):
+        """在工作线程中处理旅游规划生成"""
+        # 调用DeepSeek API生成旅游规划，流式返回的文本增量逐段交给主线程渲染
+        plan = self.call_deepseek_api(
+            city, category, subcategory, job=job,
+            on_chunk=lambda chunk: self.root.after(0, self.append_plan_chunk, job, chunk)
+        )
         
-        # 在主线程中更新UI
-        self.root.after(0, lambda: self.show_plan_result(plan))
+        # 在主线程中更新UI（已取消的生成不再更新）
+        if plan is not None and not job.cancelled:
+            self.root.after(0, self.finish_plan_stream, job, plan)
 
-    def call_deepseek_api(self):
-        """调用DeepSeek API生成旅游规划"""
+    def call_deepseek_api(self, city, category, subcategory, job=None, on_chunk=None):
+        """调用DeepSeek API生成旅游规划
+        
+        传入on_chunk时以流式方式调用，每收到一段文本就回调一次；返回完整规划。
+        job被取消时中止进行中的请求并返回None。
+        """
         try:
+            # 先查规划缓存
+            cache_key = plan_cache_key(city, category, subcategory)
+            cached_plan = self.plan_cache.get(cache_key)
+            if cached_plan is not None:
+                return cached_plan
+            
             # 从配置文件中读取API密钥
             api_key = ""
             try:
@@ -740,88 +798,81 @@ class TravelPlannerApp:
             except:
                 pass
             
-            prompt = f"""
-            请根据以下信息生成一个详细的三天旅游行程规划：
-            城市：{self.selected_city}
-            选择的旅游类别：{self.selected_category}
-            特别兴趣点：{self.selected_subcategory}
-            
-            请提供一个包含以下内容的旅游规划：
-            1. 每天的行程安排（上午、下午、晚上）
-            2. 推荐的景点和活动，包括游玩时间
-            3. 餐饮推荐，包括当地特色美食
-            4. 交通建议
-            5. 住宿推荐
-            
-            格式要求：分三天详细规划，每天的行程清晰列出，内容要丰富实用，使用Markdown格式。
-            """
-            
             # 如果没有配置API密钥，返回模拟数据
             if not api_key:
-                return self.generate_mock_plan()
+                return self.generate_mock_plan(city, category, subcategory)
             
             # 实际API调用逻辑
-            # 使用DeepSeek API生成旅游规划
-            url = "https://api.deepseek.com/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            data = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 2000
-            }
+            # 使用DeepSeek API生成旅游规划（共享连接池，带超时与重试）
+            data = build_payload(city, category, subcategory, stream=on_chunk is not None)
             
-            response = requests.post(url, headers=headers, json=data)
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"API调用失败: {response.status_code} - {response.text}")
-                return self.generate_mock_plan()
+            # requests等网络模块只在真正调用API时才导入（通常已经在后台预热时导入过）
+            from common.llm_client import get_client
+            
+            # 读完后关闭响应，归还连接与上游调用名额；job被取消时响应会被提前关闭
+            with get_client().chat_completions(api_key, data, stream=on_chunk is not None, cancel=job) as response:
+                if response.status_code == 200:
+                    if on_chunk is not None:
+                        chunks = []
+                        for content in iter_stream_content(response):
+                            chunks.append(content)
+                            on_chunk(content)
+                        plan = "".join(chunks)
+                    else:
+                        result = response.json()
+                        plan = result["choices"][0]["message"]["content"]
+                    # 只缓存真实生成的规划，模拟数据不入缓存
+                    self.plan_cache.put(cache_key, plan, meta={
+                        "city": city,
+                        "category": category,
+                        "subcategory": subcategory
+                    })
+                    return plan
+                else:
+                    print(f"API调用失败: {response.status_code} - {response.text}")
+                    return self.generate_mock_plan(city, category, subcategory)
                 
         except Exception as e:
+            if job is not None and job.cancelled:
+                # 取消时关闭响应导致的读取错误（或JobCancelled），不是生成失败
+                return None
             print(f"生成旅游规划时出错: {e}")
-            return self.generate_mock_plan()
+            return self.generate_mock_plan(city, category, subcategory)
 
-    def generate_mock_plan(self):
+    def generate_mock_plan(self, city, category, subcategory):
         """生成模拟的旅游规划数据"""
         return f"""
-# {self.selected_city}三日游 - {self.selected_category}特色行程
+# {city}三日游 - {category}特色行程
 
 ## 第一天
 
 ### 上午
 - 8:00-9:00 酒店早餐
-- 9:30-12:00 游览{self.selected_subcategory}，这是{self.selected_city}最著名的{self.selected_category}之一
+- 9:30-12:00 游览{subcategory}，这是{city}最著名的{category}之一
   - 推荐在此处停留约2.5小时，可以深入了解当地文化特色
 
 ### 下午
 - 12:30-13:30 在附近的"老字号餐厅"享用午餐
   - 推荐菜品：当地特色小吃
-- 14:00-17:00 参观{self.selected_city}博物馆
-  - 了解{self.selected_city}的历史文化发展
+- 14:00-17:00 参观{city}博物馆
+  - 了解{city}的历史文化发展
 
 ### 晚上
 - 18:00-19:30 在"夜市美食街"品尝当地特色美食
-- 20:00-21:30 欣赏{self.selected_city}夜景
+- 20:00-21:30 欣赏{city}夜景
 - 22:00 返回酒店休息
 
 ## 第二天
 
 ### 上午
 - 8:00-9:00 酒店早餐
-- 9:30-12:00 前往{self.city_data[self.selected_city][self.selected_category][0] if len(self.city_data[self.selected_city][self.selected_category]) > 0 else "景点A"}
+- 9:30-12:00 前往{self.city_data[city][category][0] if len(self.city_data[city][category]) > 0 else "景点A"}
   - 建议请当地导游讲解，更好地了解当地文化
 
 ### 下午
 - 12:30-13:30 在"人气餐厅"享用午餐
-- 14:00-17:00 游览{self.city_data[self.selected_city][self.selected_category][1] if len(self.city_data[self.selected_city][self.selected_category]) > 1 else "景点B"}
-  - 这里是{self.selected_city}的另一处著名{self.selected_category}
+- 14:00-17:00 游览{self.city_data[city][category][1] if len(self.city_data[city][category]) > 1 else "景点B"}
+  - 这里是{city}的另一处著名{category}
 
 ### 晚上
 - 18:00-20:00 参加当地文化体验活动
@@ -831,7 +882,7 @@ class TravelPlannerApp:
 
 ### 上午
 - 8:00-9:00 酒店早餐
-- 9:30-12:00 参观{self.city_data[self.selected_city][self.selected_category][2] if len(self.city_data[self.selected_city][self.selected_category]) > 2 else "景点C"}
+- 9:30-12:00 参观{self.city_data[city][category][2] if len(self.city_data[city][category]) > 2 else "景点C"}
 
 ### 下午
 - 12:30-13:30 享用午餐
@@ -843,9 +894,9 @@ class TravelPlannerApp:
 - 20:30 返回酒店，准备第二天离开
 
 ## 住宿推荐
-- 豪华选择：{self.selected_city}国际大酒店
-- 中档选择：{self.selected_city}舒适酒店
-- 经济选择：{self.selected_city}青年旅舍
+- 豪华选择：{city}国际大酒店
+- 中档选择：{city}舒适酒店
+- 经济选择：{city}青年旅舍
 
 ## 交通建议
 - 市内交通：建议使用地铁或出租车
@@ -858,63 +909,99 @@ class TravelPlannerApp:
 - 当地紧急电话：110（警察）、120（救护车）
         """
 
-    def show_plan_result(self, plan):
-        """显示旅游规划结果"""
-        # 清除当前页面内容
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def append_plan_chunk(self, job, chunk):
+        """追加流式返回的规划文本（在主线程中调用）
+        
+        只渲染已经完整的行，未结束的行暂存在缓冲区中，等待后续文本。
+        """
+        if not self.is_current_generation(job):
+            return
+        if not self.plan_streaming:
+            self.show_plan_result("", streaming=True)
+        
+        self.plan_stream_buffer += chunk
+        if "\n" not in self.plan_stream_buffer:
+            return
         
-        # 创建主框架
-        main_frame = tk.Frame(self.root, bg=COLORS["bg"])
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        complete, self.plan_stream_buffer = self.plan_stream_buffer.rsplit("\n", 1)
+        # 只追加新的完整行，已显示的内容不重新渲染
+        self.plan_renderer.append(classify_line(line) for line in complete.split("\n"))
+
+    def finish_plan_stream(self, job, plan):
+        """规划生成结束（在主线程中调用）"""
+        if not self.is_current_generation(job):
+            # 已取消或被新的生成替代，结果直接丢弃
+            return
+        self.generation_job = None
+        if not self.plan_streaming:
+            # 缓存命中或模拟数据，没有经过流式渲染
+            self.show_plan_result(plan)
+            return
         
+        self.plan_streaming = False
+        self.current_plan = plan
+        self.current_itinerary = parse_plan(plan)
+        if self.plan_stream_buffer:
+            self.plan_renderer.append([classify_line(self.plan_stream_buffer)])
+        self.plan_stream_buffer = ""
+        self.save_button.config(state="normal")
+
+    def show_plan_result(self, plan, streaming=False):
+        """显示旅游规划结果
+        
+        streaming为True时先显示空白结果页，后续文本由append_plan_chunk逐段追加。
+        """
+        self.plan_streaming = streaming
+        self.plan_stream_buffer = ""
+        self.current_plan = plan
+        # 规划只解析一次，渲染直接使用解析好的结构
+        self.current_itinerary = parse_plan(plan)
+        
+        self.show_page("result")
+        self.result_path_label.config(
+            text=f"{self.selected_city} > {self.selected_category} > {self.selected_subcategory}"
+        )
+        self.result_title_label.config(text=f"{self.selected_city} · 旅游规划")
+        self.save_button.config(state="disabled" if streaming else "normal")
+        
+        # 按行程结构分片渲染，长规划也不会卡住窗口；流式生成时跟随滚动到末尾
+        self.plan_renderer.follow = streaming
+        self.plan_renderer.render(self.current_itinerary.lines())
+        self.plan_text.yview_moveto(0)
+
+    def build_result_page(self, main_frame):
+        """创建规划结果页面（规划内容由show_plan_result更新）"""
         # 创建顶部导航栏
         nav_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         nav_frame.pack(fill=tk.X, pady=(0, 20))
         
         # 添加返回按钮
-        back_button = tk.Button(
-            nav_frame,
-            text="← 返回选择页面",
-            font=self.button_font,
-            bg=COLORS["light_bg"],
-            fg=COLORS["text"],
-            activebackground=COLORS["border"],
-            activeforeground=COLORS["text"],
-            relief=tk.FLAT,
-            padx=10,
-            pady=5,
-            cursor="hand2",
-            command=lambda: self.show_subcategory(self.selected_category)
-        )
-        back_button.pack(side=tk.LEFT)
+        self.create_back_button(nav_frame, "← 返回选择页面", lambda: self.show_subcategory(self.selected_category))
         
         # 添加路径
-        path_label = tk.Label(
+        self.result_path_label = tk.Label(
             nav_frame,
-            text=f"{self.selected_city} > {self.selected_category} > {self.selected_subcategory}",
             font=self.content_font,
             bg=COLORS["bg"],
             fg=COLORS["light_text"]
         )
-        path_label.pack(side=tk.RIGHT)
+        self.result_path_label.pack(side=tk.RIGHT)
         
         # 创建标题区域
         title_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         title_frame.pack(fill=tk.X, pady=15)
         
         # 添加标题
-        title_label = tk.Label(
-            title_frame, 
-            text=f"{self.selected_city} · 旅游规划", 
-            font=self.title_font, 
-            bg=COLORS["bg"], 
+        self.result_title_label = tk.Label(
+            title_frame,
+            font=self.title_font,
+            bg=COLORS["bg"],
             fg=COLORS["primary"]
         )
-        title_label.pack(side=tk.LEFT)
+        self.result_title_label.pack(side=tk.LEFT)
         
         # 添加保存按钮
-        save_button = tk.Button(
+        self.save_button = tk.Button(
             title_frame,
             text="保存规划",
             font=self.button_font,
@@ -926,9 +1013,12 @@ class TravelPlannerApp:
             padx=15,
             pady=5,
             cursor="hand2",
-            command=lambda: self.save_plan(plan)
+            command=lambda: self.save_plan(self.current_plan)
         )
-        save_button.pack(side=tk.RIGHT)
+        self.save_button.pack(side=tk.RIGHT)
+        
+        # 添加底部版权信息（先占住底部，内容区域填满剩余空间）
+        self.create_footer(main_frame)
         
         # 创建规划内容区域
         content_frame = tk.Frame(main_frame, bg=COLORS["card_bg"], padx=20, pady=20)
@@ -950,55 +1040,21 @@ class TravelPlannerApp:
         text_style.tag_configure("normal", font=("Heiti SC", 12), foreground=COLORS["text"], spacing1=3, spacing3=3)
         text_style.tag_configure("bullet", font=("Heiti SC", 12), foreground=COLORS["text"], spacing1=2, lmargin1=20, lmargin2=30)
         
-        # 解析Markdown格式并展示
-        lines = plan.strip().split('\n')
-        for line in lines:
-            if line.startswith('# '):
-                text_style.insert(tk.END, line[2:] + '\n', "title")
-            elif line.startswith('## '):
-                text_style.insert(tk.END, line[3:] + '\n', "heading1")
-            elif line.startswith('### '):
-                text_style.insert(tk.END, line[4:] + '\n', "heading2")
-            elif line.startswith('- '):
-                text_style.insert(tk.END, "• " + line[2:] + '\n', "bullet")
-            elif line.startswith('  - '):
-                text_style.insert(tk.END, "   ◦ " + line[4:] + '\n', "bullet")
-            else:
-                text_style.insert(tk.END, line + '\n', "normal")
-        
         text_style.config(state="disabled")  # 设置为只读
+        self.plan_text = text_style
+        self.plan_renderer = PlanRenderer(text_style, PLAN_LINE_STYLES)
         
         text_style.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 添加底部版权信息
-        footer_frame = tk.Frame(main_frame, bg=COLORS["bg"])
-        footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
-        
-        footer_text = tk.Label(
-            footer_frame,
-            text="© 2024 旅游规划生成器 - 使用AI技术定制您的旅行计划",
-            font=("Heiti SC", 10),
-            bg=COLORS["bg"],
-            fg=COLORS["light_text"]
-        )
-        footer_text.pack()
 
     def save_plan(self, plan):
-        """保存旅游规划到文件"""
+        """保存旅游规划到规划存储"""
         try:
-            # 创建保存目录
-            os.makedirs("plans", exist_ok=True)
-            
-            # 生成文件名
-            filename = f"plans/{self.selected_city}_{self.selected_category}_{self.selected_subcategory}规划.md"
-            
-            # 保存规划
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(plan)
+            # 保存规划（同一选择覆盖为最新版本，旧版本保留在历史中）
+            plan_id = self.plan_store.save(self.selected_city, self.selected_category, self.selected_subcategory, plan)
             
             # 显示保存成功信息
-            messagebox.showinfo("保存成功", f"旅游规划已保存至 {filename}")
+            messagebox.showinfo("保存成功", f"旅游规划已保存（编号 {plan_id}）至 {self.plan_store.path}")
             
         except Exception as e:
             messagebox.showerror("保存失败", f"保存规划时出错: {e}")
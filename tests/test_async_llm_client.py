@@ -0,0 +1,63 @@
+"""AsyncLLMClient：出错时归还调用名额"""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from common.async_llm_client import AsyncLLMClient  # noqa: E402
+
+
+class BrokenBodyHandler(BaseHTTPRequestHandler):
+    """/truncated：正文只写一部分就断开；/gzip：声明gzip编码但正文不是gzip"""
+
+    def do_POST(self):
+        self.server.requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.path == "/gzip":
+            body = b"not gzip at all"
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            self.wfile.write(b'{"choices": [')
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BrokenBodyHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("path", ["/truncated", "/gzip"])
+def test_errors_release_slot(upstream, path):
+    async def run():
+        client = AsyncLLMClient(api_url=f"http://127.0.0.1:{upstream.server_port}{path}", pool_size=2,
+                                max_retries=0, rate=0, queue_timeout=2)
+        try:
+            for _ in range(3):
+                with pytest.raises(httpx.HTTPError):
+                    await client.chat_completions("key", {"messages": []})
+                assert client.governor.stats()["in_flight"] == 0
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert upstream.requests == 3
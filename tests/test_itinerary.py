@@ -0,0 +1,56 @@
+"""行程模型：空行与补充说明的版式"""
+from common.itinerary import (BLANK, BULLET, DETAIL, HEADING1, HEADING2, TEXT, TITLE, Itinerary,
+                              classify_line, parse_plan)
+
+PLAN = """
+# 西安三日游
+
+简介
+
+## 第一天
+### 上午
+- 兵马俑
+  - 提前预约
+
+  - 带上身份证
+### 下午
+- 华清宫
+
+"""
+
+
+def test_lines_keep_blank_lines_and_orphan_details():
+    """空行保留为行间距，没有上一项的补充说明仍是补充说明（与逐行渲染原文一致）"""
+    assert list(parse_plan(PLAN).lines()) == [
+        (TITLE, "西安三日游"),
+        (BLANK, ""),
+        (TEXT, "简介"),
+        (BLANK, ""),
+        (HEADING1, "第一天"),
+        (HEADING2, "上午"),
+        (BULLET, "兵马俑"),
+        (DETAIL, "提前预约"),
+        (BLANK, ""),
+        (DETAIL, "带上身份证"),
+        (HEADING2, "下午"),
+        (BULLET, "华清宫"),
+    ]
+
+
+def test_blank_lines_survive_storage_but_not_api():
+    itinerary = parse_plan(PLAN)
+    restored = Itinerary.loads(itinerary.dumps())
+    assert list(restored.lines()) == list(itinerary.lines())
+
+    data = restored.to_dict()
+    assert data["entries"] == [{"type": TEXT, "text": "简介"}]
+    morning = data["sections"][0]["slots"][0]
+    assert morning["entries"] == [
+        {"type": BULLET, "text": "兵马俑", "details": ["提前预约"]},
+        {"type": DETAIL, "text": "带上身份证"},
+    ]
+    assert [item.text for item in restored.slot(1, "上午").items] == ["兵马俑"]
+
+
+def test_classify_blank_line():
+    assert classify_line("   ") == (BLANK, "")
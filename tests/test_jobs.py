@@ -0,0 +1,41 @@
+"""任务队列：排队名额与取消"""
+import threading
+import time
+
+import pytest
+
+from common.jobs import CANCELLED, SUCCEEDED, JobQueue, JobQueueFull
+
+
+def test_cancelled_queued_jobs_release_their_slots():
+    """排队中被取消的任务立即让出名额，不会因为取消过的任务占位而拒绝新任务"""
+    release = threading.Event()
+    jobs = JobQueue(workers=1, max_pending=2)
+    try:
+        blocker = jobs.submit(lambda job: release.wait(5))
+        # 等唯一的工作线程开始执行，之后提交的任务都留在队列里
+        for _ in range(500):
+            if jobs.stats()["running"] == 1:
+                break
+            time.sleep(0.01)
+
+        queued = [jobs.submit(lambda job: "queued") for _ in range(2)]
+        with pytest.raises(JobQueueFull):
+            jobs.submit(lambda job: "rejected")
+
+        for job in queued:
+            jobs.cancel(job.id)
+            assert job.status == CANCELLED
+        assert jobs.stats()["pending"] == 0
+
+        accepted = [jobs.submit(lambda job: "accepted") for _ in range(2)]
+        release.set()
+        for job in accepted:
+            assert job.wait(5)
+            assert job.status == SUCCEEDED
+            assert job.result == "accepted"
+        assert blocker.wait(5)
+        assert jobs.stats()["pending"] == 0
+    finally:
+        release.set()
+        jobs.shutdown()
@@ -0,0 +1,103 @@
+"""LLMClient：出错与取消时归还调用名额"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from common.jobs import Job, JobCancelled
+from common.llm_client import LLMClient
+
+
+class TruncatedBodyHandler(BaseHTTPRequestHandler):
+    """返回200、声明1000字节正文，只写一部分就断开连接"""
+
+    def do_POST(self):
+        self.server.requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        self.wfile.write(b'{"choices": [')
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TruncatedBodyHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_truncated_body_releases_slot(upstream):
+    url = f"http://127.0.0.1:{upstream.server_port}/chat/completions"
+    client = LLMClient(api_url=url, pool_size=2, max_retries=1, backoff_base=0.01, rate=0, queue_timeout=2)
+    for _ in range(3):
+        with pytest.raises(requests.RequestException):
+            client.chat_completions("key", {"messages": []})
+        assert client.governor.stats()["in_flight"] == 0
+    # 每次调用都真正到达了上游（首次 + 1次重试），没有因为名额泄漏而在排队时超时
+    assert upstream.requests == 6
+
+
+class StalledBodyHandler(BaseHTTPRequestHandler):
+    """返回响应头与一部分正文后停住，不再发送"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        self.wfile.write(b'{"choices": [')
+        self.wfile.flush()
+        self.server.stop.wait(10)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stalled_upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StalledBodyHandler)
+    server.stop = threading.Event()
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.stop.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_cancel_during_body_read(stalled_upstream):
+    url = f"http://127.0.0.1:{stalled_upstream.server_port}/chat/completions"
+    client = LLMClient(api_url=url, rate=0, read_timeout=10)
+    job = Job(None, (), {})
+    threading.Timer(0.3, job.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(JobCancelled):
+        client.chat_completions("key", {"messages": []}, cancel=job)
+    assert time.monotonic() - started < 5
+    assert client.governor.stats()["in_flight"] == 0
+
+
+def test_stream_close_unregisters_cancel_callback(stalled_upstream):
+    url = f"http://127.0.0.1:{stalled_upstream.server_port}/chat/completions"
+    client = LLMClient(api_url=url, rate=0)
+    job = Job(None, (), {})
+    response = client.chat_completions("key", {"messages": []}, stream=True, cancel=job)
+    assert len(job._cancel_callbacks) == 1
+    response.close()
+    assert job._cancel_callbacks == []
+    assert client.governor.stats()["in_flight"] == 0
@@ -0,0 +1,56 @@
+"""规划缓存：无法解码的条目按未命中处理"""
+import os
+
+from common.plan_cache import PlanCache
+from common.plan_codec import PlanCodec
+
+PLAN = "# 西安三日游\n\n## 第一天\n- 8:00-9:00 酒店早餐\n- 9:30-12:00 参观兵马俑\n" * 5
+
+
+def samples(name):
+    return [f"# {name}{i}日游\n## 第一天\n- 上午游览{name}第{i}号景点\n- 下午品尝{name}特色美食{i}\n" * 3
+            for i in range(200)]
+
+
+def make_codec(directory, name):
+    codec = PlanCodec(directory)
+    codec.train(samples(name))
+    return codec
+
+
+def assert_miss_and_dropped(cache, key):
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats["decode_errors"] == 1
+    assert stats["misses"] == 1
+    assert not os.path.exists(cache._path(key))
+    # 已丢弃，再次读取是普通的未命中
+    assert cache.get(key) is None
+    assert cache.stats()["decode_errors"] == 1
+
+
+def test_swapped_dictionary_is_a_miss(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    writer = PlanCache(cache_dir, codec=make_codec(str(tmp_path / "dicts_a"), "西安"))
+    writer.put("k1", PLAN)
+    assert writer.get("k1") == PLAN
+
+    # 同一版本号换成另一份字典
+    reader = PlanCache(cache_dir, codec=make_codec(str(tmp_path / "dicts_b"), "拉萨"))
+    assert_miss_and_dropped(reader, "k1")
+
+
+def test_missing_dictionary_is_a_miss(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    PlanCache(cache_dir, codec=make_codec(str(tmp_path / "dicts"), "西安")).put("k1", PLAN)
+    reader = PlanCache(cache_dir, codec=PlanCodec(str(tmp_path / "empty")))
+    assert_miss_and_dropped(reader, "k1")
+
+
+def test_corrupt_memory_entry_is_a_miss(tmp_path):
+    cache = PlanCache(str(tmp_path / "cache"), codec=PlanCodec())
+    cache.put("k1", PLAN)
+    expires_at, body, encoding = cache._memory["k1"]
+    cache._memory["k1"] = (expires_at, b"garbage" + body, encoding)
+    assert_miss_and_dropped(cache, "k1")
+    assert "k1" not in cache._memory
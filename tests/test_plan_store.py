@@ -0,0 +1,28 @@
+"""规划库：单次读取元数据与行程结构"""
+from common.itinerary import Itinerary
+from common.plan_store import PlanStore
+
+
+def test_get_with_itinerary_reads_once(tmp_path):
+    store = PlanStore(str(tmp_path / "plans.db"))
+    plan_id = store.save("西安", "人文景观", "兵马俑", "# 西安\n## 第1天\n- 兵马俑")
+
+    plan = store.get(plan_id, itinerary=True)
+    assert "plan" not in plan
+    assert plan["city"] == "西安"
+    assert isinstance(plan["itinerary"], Itinerary)
+    assert plan["itinerary"].to_dict() == store.get_itinerary(plan_id).to_dict()
+    assert store.get(plan_id)["plan"].startswith("# 西安")
+
+    assert store.get(plan_id + 1, itinerary=True) is None
+    assert store.get_itinerary(plan_id + 1) is None
+
+
+def test_old_structure_version_reparsed_from_body(tmp_path):
+    """旧版本存储格式的结构不再直接使用，从正文重新解析（保留空行）"""
+    store = PlanStore(str(tmp_path / "plans.db"))
+    plan_id = store.save("西安", "人文景观", "兵马俑", "# 西安\n\n- 兵马俑")
+    old, encoding = store.codec.encode('[1,"西安",[["bullet","兵马俑"]],[]]')
+    with store._connection() as conn:
+        conn.execute("UPDATE plans SET structure = ?, structure_encoding = ? WHERE id = ?", (old, encoding, plan_id))
+    assert [kind for kind, _ in store.get_itinerary(plan_id).lines()] == ["title", "blank", "bullet"]
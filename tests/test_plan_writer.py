@@ -0,0 +1,50 @@
+"""后台规划写入器：写入ID、日志截断与重放"""
+import json
+import os
+
+from common.plan_store import PlanStore
+from common.plan_writer import PlanWriter
+
+
+def make_writer(tmp_path, **kwargs):
+    store = PlanStore(str(tmp_path / "plans.db"))
+    return store, PlanWriter(store, journal_dir=str(tmp_path / "journal"), flush_interval=0.01, **kwargs)
+
+
+def test_write_id_resolves_after_commit(tmp_path):
+    store, writer = make_writer(tmp_path)
+    pending = writer.submit("西安", "人文景观", "兵马俑", "# 西安\n- 兵马俑")
+    assert len(pending.write_id) == 32
+    plan_id = pending.wait(5)
+    assert plan_id is not None
+    assert store.resolve_write(pending.write_id) == plan_id
+    assert store.resolve_write("0" * 32) is None
+    writer.shutdown()
+
+
+def test_journal_truncated_when_drained(tmp_path):
+    _, writer = make_writer(tmp_path)
+    for i in range(5):
+        writer.submit("西安", "人文景观", f"景点{i}", f"# 西安\n- 景点{i}")
+    writer.submit("西安", "人文景观", "景点x", "# 西安\n- 景点x").wait(5)
+    assert writer.queue_depth() == 0
+    assert os.path.getsize(writer.journal_path) == 0
+    writer.shutdown()
+
+
+def test_replaying_committed_records_does_not_duplicate(tmp_path):
+    store, writer = make_writer(tmp_path)
+    pending = writer.submit("西安", "人文景观", "兵马俑", "# 西安\n- 兵马俑")
+    plan_id = pending.wait(5)
+    # 模拟提交后、截断前崩溃：把已落库的记录放回一个无人持有的日志
+    orphan = tmp_path / "journal" / "999999.jsonl"
+    with open(orphan, "w", encoding="utf-8") as f:
+        f.write(json.dumps(pending.to_record(), ensure_ascii=False) + "\n")
+    writer.shutdown()
+
+    store2, writer2 = make_writer(tmp_path)
+    writer2.start()
+    writer2.shutdown()
+    assert not orphan.exists()
+    assert len(store2.history(plan_id)) == 1
+    assert store2.resolve_write(pending.write_id) == plan_id
@@ -0,0 +1,21 @@
+"""检索片段：位置换算与HTML转义"""
+from common.search import make_snippet
+
+
+def test_snippet_escapes_plan_text():
+    text = "第一天<script>alert(1)</script>去北京故宫，晚上吃<b>烤鸭</b>"
+    snippet = make_snippet(text, "北京")
+    assert "<script>" not in snippet
+    assert "<b>" not in snippet
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in snippet
+    assert "<mark>北京</mark>" in snippet
+
+
+def test_snippet_escapes_match_and_fallback():
+    assert make_snippet("看<北京>", "北京") == "看&lt;<mark>北京</mark>&gt;"
+    assert make_snippet("<img src=x onerror=alert(1)>", "上海") == "&lt;img src=x onerror=alert(1)&gt;"
+
+
+def test_snippet_maps_normalized_offsets():
+    assert "<mark>北京</mark>" in make_snippet("行程安排……明天去北京故宫参观", "北京")
+    assert "<mark>㎞</mark>" in make_snippet("全程约5㎞，之后去北京", "km")
@@ -1,11 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import atexit
 import json
 import os
-import requests
+import re
+import sys
 import logging
+import time
 from dotenv import load_dotenv
 
+# 共享模块（common/）位于仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from common.catalog import DEFAULT_CATALOG, load_catalog
+from common.jobs import JobQueue, JobQueueFull
+from common.llm_client import get_client
+from common.metrics import (
+    CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_REQUESTS_IN_FLIGHT,
+    PLAN_CACHE_HIT_RATIO, PLAN_CACHE_LOOKUPS, PLAN_MOCK_FALLBACKS, PLAN_WRITE_QUEUE_DEPTH, REGISTRY, record_usage
+)
+from common.plan_cache import PlanCache
+from common.plan_codec import PlanCodec
+from common.plan_store import PlanStore
+from common.plan_writer import PlanWriter
+from common.precompressed import PrecompressedResponse
+from common.prompt import build_payload, plan_cache_key
+from common.singleflight import SingleFlight
+from common.sse import format_sse, iter_stream_content
+from common.tracing import Profiler, configure_trace_log, end_trace, span, start_trace
+
 # 加载环境变量
 load_dotenv()
 
@@ -17,91 +40,167 @@ os.makedirs("plans", exist_ok=True)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 分段计时写入单独的trace日志（JSON行）
+configure_trace_log(os.getenv("TRACE_LOG", "logs/trace.jsonl"))
+
+# 是否允许通过 X-Profile 请求头或 ?profile=1 剖析单个请求
+ALLOW_PROFILING = os.getenv("ALLOW_PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
 app = Flask(__name__)
 CORS(app)  # 启用CORS以允许前端访问
 
-# 加载城市数据
+# 加载城市数据（优先使用已编译的目录快照）
 def load_city_data():
-    city_data = {}
     try:
-        with open("induction.me", "r", encoding="utf-8") as f:
-            content = f.read()
-            
-        current_city = None
-        current_category = None
-        
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # 检查是否是新城市
-            if not line.startswith("人文景观") and not line.startswith("自然景观") and not line.startswith("饮食文化") and not any(c.isdigit() for c in line):
-                current_city = line.replace("：", "").strip()
-                if current_city not in city_data:
-                    city_data[current_city] = {
-                        "人文景观": [], 
-                        "自然景观": [], 
-                        "饮食文化": []
-                    }
-            
-            # 检查是否是新分类
-            elif line.startswith("人文景观"):
-                current_category = "人文景观"
-            elif line.startswith("自然景观"):
-                current_category = "自然景观"
-            elif line.startswith("饮食文化"):
-                current_category = "饮食文化"
-            
-            # 处理分类内容
-            elif current_city and current_category and "：" not in line:
-                items = [item.strip() for item in line.replace("，", ",").split(",")]
-                for item in items:
-                    if item and not item.isdigit() and item not in city_data[current_city][current_category]:
-                        if item.strip():  # 确保不添加空字符串
-                            city_data[current_city][current_category].append(item.strip())
-    
+        return load_catalog("induction.me")
     except Exception as e:
         logger.error(f"加载城市数据出错: {e}")
         # 如果出错，使用默认数据
-        city_data = {
-            "北京": {
-                "人文景观": ["故宫博物院", "八达岭长城", "颐和园"],
-                "自然景观": ["百里画廊", "京东大峡谷", "八达岭国家森林公园"],
-                "饮食文化": ["北京烤鸭", "稻香村糕点", "涮羊肉"]
-            }
-        }
-    
-    return city_data
+        return DEFAULT_CATALOG
+
+# 预先序列化目录接口的响应（附带ETag与压缩版本）
+def build_catalog_responses(city_data, max_age):
+    responses = {("cities",): PrecompressedResponse(sorted(city_data.keys()), max_age)}
+    for city, categories in city_data.items():
+        responses[("categories", city)] = PrecompressedResponse(list(categories.keys()), max_age)
+        for category, subcategories in categories.items():
+            responses[("subcategories", city, category)] = PrecompressedResponse(subcategories, max_age)
+    return responses
+
+def catalog_response(entry):
+    """返回预先生成的目录响应，客户端缓存仍有效时返回304"""
+    if entry.not_modified(request.headers.get("If-None-Match")):
+        return Response(status=304, headers=entry.headers())
+    body, encoding = entry.select(request.headers.get("Accept-Encoding"))
+    response = Response(body, mimetype="application/json", headers=entry.headers())
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
 
 # 全局数据
 city_data = load_city_data()
+catalog_responses = build_catalog_responses(city_data, int(os.getenv("CATALOG_MAX_AGE", "300")))
+
+# 规划正文的字典压缩（缓存与存储共用同一套字典）
+plan_codec = PlanCodec(os.getenv("PLAN_DICT_DIR", "plans/dicts"))
+
+# 规划缓存（内存LRU + 磁盘持久化）
+plan_cache = PlanCache(
+    directory=os.getenv("PLAN_CACHE_DIR", "cache/plans"),
+    max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "2048")),
+    max_memory_bytes=int(os.getenv("PLAN_CACHE_MAX_MEMORY_BYTES", str(16 * 1024 * 1024))),
+    ttl=int(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600))),
+    max_disk_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    codec=plan_codec
+)
+
+# 规划存储（SQLite，WAL模式）
+plan_store = PlanStore(os.getenv("PLAN_DB", "plans/plans.db"), codec=plan_codec)
+
+# 规划先进入预写日志，由后台线程批量落库；退出时写完剩余的规划
+plan_writer = PlanWriter(
+    plan_store,
+    journal_dir=os.getenv("PLAN_JOURNAL_DIR", "plans/journal"),
+    batch_size=int(os.getenv("PLAN_WRITE_BATCH", "50")),
+    flush_interval=float(os.getenv("PLAN_WRITE_INTERVAL", "0.2"))
+)
+atexit.register(plan_writer.shutdown)
+# 生成任务等待规划落库的最长时间（秒）
+PLAN_WRITE_WAIT = float(os.getenv("PLAN_WRITE_WAIT", "5"))
+
+# 写入ID（PendingWrite.write_id）的格式
+WRITE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# 相同选择的并发生成请求只调用一次上游
+plan_flight = SingleFlight()
+
+# 规划生成任务队列（有界工作线程池）
+job_queue = JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+    retention=int(os.getenv("JOB_RETENTION", "3600")),
+    # 设置后任务状态同时写入共享目录，多进程部署时轮询请求落到任何一个工作进程都能查到
+    # （gunicorn.conf.py默认打开；单进程时任务表只在内存里，状态变化不写文件）
+    state_dir=os.getenv("JOB_STATE_DIR") or None
+)
+
+# 采集时从各组件读取的指标
+for _result, _field in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses")):
+    PLAN_CACHE_LOOKUPS.labels(_result).set_function(lambda field=_field: plan_cache.stats()[field])
+PLAN_CACHE_HIT_RATIO.set_function(lambda: plan_cache.stats()["hit_ratio"])
+LLM_REQUESTS_IN_FLIGHT.set_function(lambda: get_client().governor.stats()["in_flight"])
+LLM_QUEUE_DEPTH.set_function(lambda: get_client().governor.stats()["queue_depth"])
+PLAN_WRITE_QUEUE_DEPTH.set_function(plan_writer.queue_depth)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    g.trace = start_trace(request.path)
+    
+    if ALLOW_PROFILING and (request.headers.get("X-Profile") or request.args.get("profile")):
+        g.profiler = Profiler(PROFILE_DIR)
+        g.profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        response.headers["X-Profile-File"] = profiler.stop(route)
+    
+    trace = g.pop("trace", None)
+    if trace is not None:
+        end_trace(trace, route=route, method=request.method, status=response.status_code)
+        timing = trace.server_timing()
+        if "Server-Timing" in response.headers:
+            timing = f"{timing}, {response.headers['Server-Timing']}"
+        response.headers["Server-Timing"] = timing
+    
+    started = g.pop("request_started", None)
+    if started is not None:
+        HTTP_REQUEST_DURATION.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    HTTP_REQUESTS_IN_FLIGHT.dec()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的指标"""
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
 
 # API路由
 @app.route('/api/cities', methods=['GET'])
 def get_cities():
     """获取所有城市列表"""
-    cities = sorted(list(city_data.keys()))
-    return jsonify(cities)
+    return catalog_response(catalog_responses[("cities",)])
 
 @app.route('/api/city/<city>/categories', methods=['GET'])
 def get_categories(city):
     """获取指定城市的分类列表"""
-    if city not in city_data:
+    entry = catalog_responses.get(("categories", city))
+    if entry is None:
         return jsonify({"error": "城市不存在"}), 404
-    return jsonify(list(city_data[city].keys()))
+    return catalog_response(entry)
 
 @app.route('/api/city/<city>/category/<category>', methods=['GET'])
 def get_subcategories(city, category):
     """获取指定城市和分类的子类别列表"""
-    if city not in city_data or category not in city_data[city]:
+    entry = catalog_responses.get(("subcategories", city, category))
+    if entry is None:
         return jsonify({"error": "城市或分类不存在"}), 404
-    return jsonify(city_data[city][category])
+    return catalog_response(entry)
 
 @app.route('/api/generate_plan', methods=['POST'])
 def generate_plan():
-    """生成旅游规划"""
+    """提交旅游规划生成任务，立即返回任务ID
+    
+    通过 GET /api/jobs/<job_id> 查询进度与结果，DELETE /api/jobs/<job_id> 取消任务。
+    """
     data = request.json
     city = data.get('city')
     category = data.get('category')
@@ -111,73 +210,213 @@ def generate_plan():
         return jsonify({"error": "请提供城市、分类和子类别"}), 400
     
     try:
-        # 调用AI生成旅游规划
-        plan = call_deepseek_api(city, category, subcategory)
+        job = job_queue.submit(run_generation_job, city, category, subcategory)
+    except JobQueueFull as e:
+        logger.warning(f"生成任务排队已满: {e}")
+        return jsonify({"error": "当前生成任务过多，请稍后再试"}), 503
+    
+    return jsonify({"job_id": job.id, "status": job.status}), 202, {"Location": f"/api/jobs/{job.id}"}
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询生成任务的状态与结果"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    
+    response = jsonify(job.to_dict())
+    # 任务结束后附带后台生成各阶段的耗时
+    trace = getattr(job, "trace", None)
+    if trace is not None and trace.duration is not None:
+        response.headers["Server-Timing"] = trace.server_timing(prefix="job_")
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消生成任务"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs', methods=['GET'])
+def get_job_stats():
+    """获取任务队列与请求合并的统计信息"""
+    stats = job_queue.stats()
+    stats["coalescing"] = plan_flight.stats()
+    return jsonify(stats)
+
+def run_generation_job(job, city, category, subcategory):
+    """在工作线程中生成并保存旅游规划"""
+    # 已取消的任务不再调用上游
+    if job.cancelled:
+        return None
+    
+    job.trace = start_trace("generate_plan_job", trace_id=job.id)
+    try:
+        # 相同选择的并发任务共享一次上游调用和一次写入
+        with span("generate"):
+            result, _ = plan_flight.do(
+                plan_cache_key(city, category, subcategory),
+                generate_and_save_plan, city, category, subcategory
+            )
+    finally:
+        end_trace(job.trace, city=city, category=category, subcategory=subcategory)
+    return result
+
+def generate_and_save_plan(city, category, subcategory):
+    """生成旅游规划并保存到规划存储"""
+    # 调用AI生成旅游规划
+    plan = call_deepseek_api(city, category, subcategory)
+    
+    # 保存规划（任务在后台运行，可以等到落库后带上规划ID；超时则为None，规划仍会写入）
+    pending = store_plan(city, category, subcategory, plan)
+    
+    return {"plan": plan, **saved_plan(pending)}
+
+@app.route('/api/generate_plan/stream', methods=['GET', 'POST'])
+def generate_plan_stream():
+    """以Server-Sent Events流式返回旅游规划
+
+    每个文本增量以 ``token`` 事件推送，生成结束后推送 ``done`` 事件：规划进入预写日志后立即推送，
+    带写入ID（write_id），落库后用 GET /api/plans/writes/<write_id> 查到规划ID。
+    GET方式通过查询参数传递选择，便于浏览器端直接使用EventSource。
+    """
+    data = request.json if request.method == 'POST' else request.args
+    city = data.get('city')
+    category = data.get('category')
+    subcategory = data.get('subcategory')
+    
+    if not city or not category or not subcategory:
+        return jsonify({"error": "请提供城市、分类和子类别"}), 400
+    
+    def generate():
+        # 响应体在请求结束后才逐段生成，单独记录一条追踪
+        trace = start_trace("generate_plan_stream")
+        chunks = []
+        try:
+            for content in stream_deepseek_api(city, category, subcategory):
+                if not chunks:
+                    trace.add_span("first_token", trace.started, time.perf_counter() - trace.started)
+                chunks.append(content)
+                yield format_sse({"content": content}, event="token")
+            
+            pending = store_plan(city, category, subcategory, "".join(chunks))
+            yield format_sse(queued_plan(pending), event="done")
         
-        # 保存规划
-        filename = f"plans/{city}_{category}_{subcategory}规划.md"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(plan)
+        except Exception as e:
+            logger.error(f"流式生成规划时出错: {e}")
+            yield format_sse({"error": f"生成规划时出错: {e}"}, event="error")
         
-        return jsonify({"plan": plan, "filename": filename})
+        finally:
+            end_trace(trace, city=city, category=category, subcategory=subcategory)
     
-    except Exception as e:
-        logger.error(f"生成规划时出错: {e}")
-        return jsonify({"error": f"生成规划时出错: {e}"}), 500
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # 关闭反向代理缓冲，保证逐段送达
+    })
+
+def store_plan(city, category, subcategory, plan):
+    """把规划写入预写日志（返回时已持久化），由后台写入器批量落库，返回PendingWrite"""
+    with span("journal_plan"):
+        return plan_writer.submit(city, category, subcategory, plan)
+
+def queued_plan(pending):
+    """已进入预写日志的规划（不等落库）：{"write_id", "plan_id"}，还没落库时plan_id为None并带 pending: True"""
+    if pending.plan_id is None:
+        return {"write_id": pending.write_id, "plan_id": None, "pending": True}
+    return {"write_id": pending.write_id, "plan_id": pending.plan_id}
+
+def saved_plan(pending):
+    """等待规划落库（最多PLAN_WRITE_WAIT秒，只在后台任务中使用），返回值同queued_plan"""
+    with span("wait_store"):
+        pending.wait(PLAN_WRITE_WAIT)
+    return queued_plan(pending)
 
 def call_deepseek_api(city, category, subcategory):
     """调用DeepSeek API生成旅游规划"""
     try:
+        # 先查规划缓存
+        with span("cache_lookup"):
+            cache_key = plan_cache_key(city, category, subcategory)
+            cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            return cached_plan
+        
         # 从配置文件中读取API密钥
         api_key = os.getenv("DEEPSEEK_API_KEY", "")
         
-        prompt = f"""
-        请根据以下信息生成一个详细的三天旅游行程规划：
-        城市：{city}
-        选择的旅游类别：{category}
-        特别兴趣点：{subcategory}
-        
-        请提供一个包含以下内容的旅游规划：
-        1. 每天的行程安排（上午、下午、晚上）
-        2. 推荐的景点和活动，包括游玩时间
-        3. 餐饮推荐，包括当地特色美食
-        4. 交通建议
-        5. 住宿推荐
-        
-        格式要求：分三天详细规划，每天的行程清晰列出，内容要丰富实用，使用Markdown格式。
-        """
-        
         # 如果没有配置API密钥，返回模拟数据
         if not api_key:
-            return generate_mock_plan(city, category, subcategory)
+            return fallback_plan(city, category, subcategory, "no_api_key")
         
         # 实际API调用逻辑
-        # 使用DeepSeek API生成旅游规划
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
+        # 使用DeepSeek API生成旅游规划（共享连接池，带超时与重试）
+        with span("build_prompt"):
+            data = build_payload(city, category, subcategory)
         
-        response = requests.post(url, headers=headers, json=data)
+        response = get_client().chat_completions(api_key, data)
         if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            with span("decode"):
+                result = response.json()
+            record_usage(result.get("usage"))
+            plan = result["choices"][0]["message"]["content"]
+            # 只缓存真实生成的规划，模拟数据不入缓存
+            with span("cache_store"):
+                plan_cache.put(cache_key, plan, meta={"city": city, "category": category, "subcategory": subcategory})
+            return plan
         else:
             logger.error(f"API调用失败: {response.status_code} - {response.text}")
-            return generate_mock_plan(city, category, subcategory)
+            return fallback_plan(city, category, subcategory, "upstream_status")
             
     except Exception as e:
         logger.error(f"生成旅游规划时出错: {e}")
-        return generate_mock_plan(city, category, subcategory)
+        return fallback_plan(city, category, subcategory, "error")
+
+def stream_deepseek_api(city, category, subcategory):
+    """以流式方式调用DeepSeek API，逐段产出规划文本
+
+    缓存命中、未配置密钥或调用失败时，一次性产出完整规划（缓存或模拟数据）。
+    """
+    cache_key = plan_cache_key(city, category, subcategory)
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan is not None:
+        yield cached_plan
+        return
+    
+    api_key = os.getenv("DEEPSEEK_API_KEY", "")
+    if not api_key:
+        yield fallback_plan(city, category, subcategory, "no_api_key")
+        return
+    
+    data = build_payload(city, category, subcategory, stream=True)
+    
+    try:
+        response = get_client().chat_completions(api_key, data, stream=True)
+    except Exception as e:
+        logger.error(f"生成旅游规划时出错: {e}")
+        yield fallback_plan(city, category, subcategory, "error")
+        return
+    
+    with response:
+        if response.status_code != 200:
+            logger.error(f"API调用失败: {response.status_code} - {response.text}")
+            yield fallback_plan(city, category, subcategory, "upstream_status")
+            return
+        
+        chunks = []
+        for content in iter_stream_content(response, on_usage=record_usage):
+            chunks.append(content)
+            yield content
+    
+    plan = "".join(chunks)
+    if plan:
+        plan_cache.put(cache_key, plan, meta={"city": city, "category": category, "subcategory": subcategory})
+
+def fallback_plan(city, category, subcategory, reason):
+    """回退到模拟规划，并按原因计数"""
+    PLAN_MOCK_FALLBACKS.labels(reason).inc()
+    return generate_mock_plan(city, category, subcategory)
 
 def generate_mock_plan(city, category, subcategory):
     """生成模拟的旅游规划数据"""
@@ -251,9 +490,82 @@ def generate_mock_plan(city, category, subcategory):
 - 当地紧急电话：110（警察）、120（救护车）
     """
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取规划缓存的命中统计"""
+    return jsonify(plan_cache.stats())
+
+@app.route('/api/plans/writes/<write_id>', methods=['GET'])
+def get_plan_write(write_id):
+    """按写入ID查询落库后的规划ID；还没落库时返回202（未知或超过保留时间的写入ID同样如此）"""
+    if not WRITE_ID_PATTERN.fullmatch(write_id):
+        return jsonify({"error": "写入ID无效"}), 404
+    plan_id = plan_store.resolve_write(write_id)
+    if plan_id is None:
+        return jsonify({"write_id": write_id, "plan_id": None, "pending": True}), 202
+    return jsonify({"write_id": write_id, "plan_id": plan_id})
+
+@app.route('/api/plans/writer', methods=['GET'])
+def get_writer_stats():
+    """获取后台规划写入器的队列与批次统计"""
+    return jsonify(plan_writer.stats())
+
+@app.route('/api/llm/stats', methods=['GET'])
+def get_llm_stats():
+    """获取大模型客户端的请求计数与连接池状态"""
+    return jsonify(get_client().stats())
+
+@app.route('/api/plans', methods=['GET'])
+def list_plans():
+    """分页列出已保存的规划，可按城市、分类、子类别筛选"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        page_size = min(100, max(1, int(request.args.get('page_size', 20))))
+    except ValueError:
+        return jsonify({"error": "page和page_size必须是整数"}), 400
+    
+    plans, total = plan_store.list(
+        city=request.args.get('city'),
+        category=request.args.get('category'),
+        subcategory=request.args.get('subcategory'),
+        page=page,
+        page_size=page_size
+    )
+    return jsonify({"plans": plans, "total": total, "page": page, "page_size": page_size})
+
+@app.route('/api/plan/<int:plan_id>', methods=['GET'])
+def get_plan(plan_id):
+    """获取单个规划（含正文）；?format=json 返回解析好的行程结构（标题、每天的时段与列表项）代替正文"""
+    output_format = request.args.get('format', 'markdown')
+    if output_format not in ("markdown", "json"):
+        return jsonify({"error": "format只能是markdown或json"}), 400
+    # 元数据与正文（或行程结构）一次读出，规划在两次查询之间被删除也只会是404
+    plan = plan_store.get(plan_id, itinerary=output_format == "json")
+    if plan is None:
+        return jsonify({"error": "规划不存在"}), 404
+    if output_format == "json":
+        plan["itinerary"] = plan["itinerary"].to_dict()
+    return jsonify(plan)
+
+@app.route('/api/search', methods=['GET'])
+def search_plans():
+    """全文检索已保存的规划，按相关度返回命中片段"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "请提供检索词q"}), 400
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        page_size = min(100, max(1, int(request.args.get('page_size', 20))))
+    except ValueError:
+        return jsonify({"error": "page和page_size必须是整数"}), 400
+    
+    with span("search"):
+        results, total = plan_store.search(query, limit=page_size, offset=(page - 1) * page_size)
+    return jsonify({"query": query, "results": results, "total": total, "page": page, "page_size": page_size})
+
 @app.route('/api/save_plan', methods=['POST'])
 def save_plan():
-    """保存旅游规划到文件"""
+    """保存旅游规划（进入预写日志后立即返回202与写入ID，后台批量落库）"""
     data = request.json
     plan = data.get('plan')
     city = data.get('city')
@@ -264,21 +576,16 @@ def save_plan():
         return jsonify({"error": "请提供完整信息"}), 400
     
     try:
-        # 创建保存目录
-        os.makedirs("plans", exist_ok=True)
-        
-        # 生成文件名
-        filename = f"plans/{city}_{category}_{subcategory}规划.md"
-        
         # 保存规划
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(plan)
+        result = queued_plan(store_plan(city, category, subcategory, plan))
         
-        return jsonify({"success": True, "filename": filename})
+        return jsonify({"success": True, **result}), 202 if result.get("pending") else 200
         
     except Exception as e:
         logger.error(f"保存规划时出错: {e}")
         return jsonify({"error": f"保存规划时出错: {e}"}), 500
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000) 
\ No newline at end of file
+    # 开发服务器（单进程）；生产环境使用多进程启动：gunicorn -c gunicorn.conf.py
+    plan_writer.start()
+    app.run(debug=os.getenv("DEBUG", "false").lower() in ("1", "true", "yes"), port=int(os.getenv("PORT", "5000"))) 
\ No newline at end of file
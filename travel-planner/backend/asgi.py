@@ -0,0 +1,586 @@
+"""异步（ASGI）服务模式
+
+与app.py暴露相同的路由，并共用其中的目录、规划缓存、规划存储与后台写入器；
+区别在于生成链路全部是协程：上游请求走httpx的异步客户端（common/async_llm_client.py），
+生成任务是asyncio任务（AsyncJobQueue）。等待上游时不占用线程，一个进程可以同时
+挂起成千上万个生成请求，内存占用只是每个请求一个协程。
+
+不依赖Web框架，直接实现ASGI接口。需要额外安装：pip install -r requirements-serving.txt（uvicorn、httpx）
+启动：
+    uvicorn asgi:app --port 5000
+
+说明：按需性能剖析（X-Profile）只在app.py的同步模式下提供。
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+import app as flask_app
+from common.async_llm_client import get_async_client
+from common.async_jobs import AsyncJobQueue
+from common.jobs import JobQueueFull
+from common.metrics import (
+    CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_REQUESTS_IN_FLIGHT,
+    REGISTRY, record_usage
+)
+from common.prompt import build_payload, plan_cache_key
+from common.singleflight import AsyncSingleFlight
+from common.sse import aiter_stream_content, format_sse
+from common.tracing import end_trace, span, start_trace
+
+logger = logging.getLogger(__name__)
+# httpx默认每个请求记一条INFO日志，高并发下没有意义
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# 与同步模式共用的组件
+city_data = flask_app.city_data
+catalog_responses = flask_app.catalog_responses
+plan_cache = flask_app.plan_cache
+plan_store = flask_app.plan_store
+plan_writer = flask_app.plan_writer
+fallback_plan = flask_app.fallback_plan
+queued_plan = flask_app.queued_plan
+PLAN_WRITE_WAIT = flask_app.PLAN_WRITE_WAIT
+WRITE_ID_PATTERN = flask_app.WRITE_ID_PATTERN
+
+# 协程任务几乎不占资源，同时运行的任务数可以远大于线程模式
+job_queue = AsyncJobQueue(
+    workers=int(os.getenv("ASYNC_JOB_WORKERS", "1000")),
+    max_pending=int(os.getenv("ASYNC_JOB_MAX_PENDING", "10000")),
+    retention=int(os.getenv("JOB_RETENTION", "3600")),
+    state_dir=os.getenv("JOB_STATE_DIR") or None
+)
+plan_flight = AsyncSingleFlight()
+
+LLM_REQUESTS_IN_FLIGHT.set_function(lambda: get_async_client().governor.stats()["in_flight"])
+LLM_QUEUE_DEPTH.set_function(lambda: get_async_client().governor.stats()["queue_depth"])
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1")
+                        for name, value in scope.get("headers", [])}
+        self.args = {name: values[0] for name, values in
+                     parse_qs(scope.get("query_string", b"").decode("utf-8")).items()}
+
+    def json(self):
+        """请求体中的JSON对象；请求体不是合法的JSON对象（格式错误、数组等）时返回None，由路由返回400"""
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class Response:
+    def __init__(self, body=b"", status=200, headers=None, media_type="application/json"):
+        # body为bytes，或产出str/bytes的异步生成器（流式响应）
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.status = status
+        self.headers = dict(headers or {})
+        if media_type and "Content-Type" not in self.headers:
+            self.headers["Content-Type"] = media_type
+
+
+def jsonify(data, status=200, headers=None):
+    return Response(json.dumps(data, ensure_ascii=False), status, headers)
+
+
+# ---- 路由 ----
+
+ROUTES = []
+
+
+def route(rule, methods=("GET",)):
+    """注册路由，规则写法同Flask：<name> 或 <int:name>"""
+    def compile_part(match):
+        converter, name = match.group(1), match.group(2)
+        return rf"(?P<{name}>\d+)" if converter == "int" else rf"(?P<{name}>[^/]+)"
+
+    pattern = re.compile("^" + re.sub(r"<(?:(\w+):)?(\w+)>", compile_part, rule) + "$")
+    converters = {name: int for name in re.findall(r"<int:(\w+)>", rule)}
+
+    def decorator(handler):
+        ROUTES.append((rule, pattern, converters, tuple(methods), handler))
+        return handler
+    return decorator
+
+
+def match_route(method, path):
+    """返回 (规则, 处理函数, 参数)；路径存在但方法不对时处理函数为None"""
+    allowed = False
+    for rule, pattern, converters, methods, handler in ROUTES:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if method not in methods:
+            allowed = True
+            continue
+        params = {name: converters.get(name, str)(value) for name, value in match.groupdict().items()}
+        return rule, handler, params
+    return ("method_not_allowed" if allowed else "unmatched"), None, None
+
+
+# ---- ASGI入口 ----
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type"
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    request = Request(scope, body)
+
+    started = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    trace = start_trace(request.path)
+    try:
+        rule, handler, params = match_route(request.method, request.path)
+        if request.method == "OPTIONS":
+            response = Response(status=200, media_type=None)
+        elif handler is None:
+            status = 405 if rule == "method_not_allowed" else 404
+            response = jsonify({"error": "Not Found" if status == 404 else "Method Not Allowed"}, status)
+        else:
+            try:
+                response = await handler(request, **params)
+            except Exception as e:
+                logger.exception(f"处理请求出错: {e}")
+                response = jsonify({"error": "Internal Server Error"}, 500)
+
+        end_trace(trace, route=rule, method=request.method, status=response.status)
+        timing = trace.server_timing()
+        if "Server-Timing" in response.headers:
+            timing = f"{timing}, {response.headers['Server-Timing']}"
+        response.headers["Server-Timing"] = timing
+        response.headers.update(CORS_HEADERS)
+        HTTP_REQUEST_DURATION.labels(rule, request.method, response.status).observe(time.perf_counter() - started)
+        await send_response(response, receive, send)
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+
+
+async def send_response(response, receive, send):
+    headers = [(name.lower().encode("latin-1"), str(value).encode("latin-1"))
+               for name, value in response.headers.items()]
+    if isinstance(response.body, bytes):
+        headers.append((b"content-length", str(len(response.body)).encode("ascii")))
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
+        return
+
+    await send({"type": "http.response.start", "status": response.status, "headers": headers})
+    # 客户端断开后停止生成（关闭生成器会关闭上游的流式响应）
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        async for chunk in response.body:
+            if disconnected.is_set():
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        await response.body.aclose()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # 尽早重放上次未落库的规划
+            await asyncio.to_thread(plan_writer.start)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await job_queue.shutdown()
+            await get_async_client().aclose()
+            await asyncio.to_thread(plan_writer.shutdown)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def catalog_response(request, entry):
+    """返回预先生成的目录响应，客户端缓存仍有效时返回304"""
+    if entry.not_modified(request.headers.get("if-none-match")):
+        return Response(status=304, headers=entry.headers(), media_type=None)
+    body, encoding = entry.select(request.headers.get("accept-encoding"))
+    response = Response(body, headers=entry.headers())
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@route("/metrics")
+async def metrics(request):
+    """Prometheus格式的指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@route("/api/cities")
+async def get_cities(request):
+    """获取所有城市列表"""
+    return catalog_response(request, catalog_responses[("cities",)])
+
+
+@route("/api/city/<city>/categories")
+async def get_categories(request, city):
+    """获取指定城市的分类列表"""
+    entry = catalog_responses.get(("categories", city))
+    if entry is None:
+        return jsonify({"error": "城市不存在"}, 404)
+    return catalog_response(request, entry)
+
+
+@route("/api/city/<city>/category/<category>")
+async def get_subcategories(request, city, category):
+    """获取指定城市和分类的子类别列表"""
+    entry = catalog_responses.get(("subcategories", city, category))
+    if entry is None:
+        return jsonify({"error": "城市或分类不存在"}, 404)
+    return catalog_response(request, entry)
+
+
+@route("/api/generate_plan", methods=("POST",))
+async def generate_plan(request):
+    """提交旅游规划生成任务，立即返回任务ID"""
+    data = request.json() or {}
+    city = data.get("city")
+    category = data.get("category")
+    subcategory = data.get("subcategory")
+
+    if not city or not category or not subcategory:
+        return jsonify({"error": "请提供城市、分类和子类别"}, 400)
+
+    try:
+        job = job_queue.submit(run_generation_job, city, category, subcategory)
+    except JobQueueFull as e:
+        logger.warning(f"生成任务排队已满: {e}")
+        return jsonify({"error": "当前生成任务过多，请稍后再试"}, 503)
+
+    return jsonify({"job_id": job.id, "status": job.status}, 202, {"Location": f"/api/jobs/{job.id}"})
+
+
+@route("/api/jobs/<job_id>")
+async def get_job(request, job_id):
+    """查询生成任务的状态与结果"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}, 404)
+
+    response = jsonify(job.to_dict())
+    trace = getattr(job, "trace", None)
+    if trace is not None and trace.duration is not None:
+        response.headers["Server-Timing"] = trace.server_timing(prefix="job_")
+    return response
+
+
+@route("/api/jobs/<job_id>", methods=("DELETE",))
+async def cancel_job(request, job_id):
+    """取消生成任务（运行中的任务会中断上游请求）"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}, 404)
+    return jsonify(job.to_dict())
+
+
+@route("/api/jobs")
+async def get_job_stats(request):
+    """获取任务队列与请求合并的统计信息"""
+    stats = job_queue.stats()
+    stats["coalescing"] = plan_flight.stats()
+    return jsonify(stats)
+
+
+async def run_generation_job(job, city, category, subcategory):
+    """生成并保存旅游规划（协程任务）"""
+    job.trace = start_trace("generate_plan_job", trace_id=job.id)
+    try:
+        # 相同选择的并发任务共享一次上游调用和一次写入
+        with span("generate"):
+            result, _ = await plan_flight.do(
+                plan_cache_key(city, category, subcategory),
+                generate_and_save_plan, city, category, subcategory
+            )
+    finally:
+        end_trace(job.trace, city=city, category=category, subcategory=subcategory)
+    return result
+
+
+async def generate_and_save_plan(city, category, subcategory):
+    """生成旅游规划并保存到规划存储"""
+    plan = await call_deepseek_api(city, category, subcategory)
+
+    pending = await store_plan(city, category, subcategory, plan)
+
+    return {"plan": plan, **(await saved_plan(pending))}
+
+
+@route("/api/generate_plan/stream", methods=("GET", "POST"))
+async def generate_plan_stream(request):
+    """以Server-Sent Events流式返回旅游规划（事件格式同app.py）"""
+    data = (request.json() if request.method == "POST" else request.args) or {}
+    city = data.get("city")
+    category = data.get("category")
+    subcategory = data.get("subcategory")
+
+    if not city or not category or not subcategory:
+        return jsonify({"error": "请提供城市、分类和子类别"}, 400)
+
+    async def generate():
+        trace = start_trace("generate_plan_stream")
+        chunks = []
+        stream = stream_deepseek_api(city, category, subcategory)
+        try:
+            async for content in stream:
+                if not chunks:
+                    trace.add_span("first_token", trace.started, time.perf_counter() - trace.started)
+                chunks.append(content)
+                yield format_sse({"content": content}, event="token")
+
+            pending = await store_plan(city, category, subcategory, "".join(chunks))
+            yield format_sse(queued_plan(pending), event="done")
+
+        except Exception as e:
+            logger.error(f"流式生成规划时出错: {e}")
+            yield format_sse({"error": f"生成规划时出错: {e}"}, event="error")
+
+        finally:
+            await stream.aclose()
+            end_trace(trace, city=city, category=category, subcategory=subcategory)
+
+    return Response(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+async def store_plan(city, category, subcategory, plan):
+    """把规划写入预写日志（fsync在线程池中执行），返回PendingWrite"""
+    with span("journal_plan"):
+        return await asyncio.to_thread(plan_writer.submit, city, category, subcategory, plan)
+
+
+async def saved_plan(pending):
+    """等待规划落库（最多PLAN_WRITE_WAIT秒，只在后台任务中使用），返回值同app.queued_plan"""
+    with span("wait_store"):
+        await wait_for_write(pending, PLAN_WRITE_WAIT)
+    return queued_plan(pending)
+
+
+async def wait_for_write(pending, timeout):
+    """不占用线程地等待规划落库，返回规划ID（超时返回None）"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(plan_id):
+        if not future.done():
+            future.set_result(plan_id)
+
+    pending.add_done_callback(lambda plan_id: loop.call_soon_threadsafe(resolve, plan_id))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def call_deepseek_api(city, category, subcategory):
+    """调用DeepSeek API生成旅游规划"""
+    try:
+        with span("cache_lookup"):
+            cache_key = plan_cache_key(city, category, subcategory)
+            # 磁盘层命中要读文件并解压，放到线程池中，不阻塞事件循环
+            cached_plan = await asyncio.to_thread(plan_cache.get, cache_key)
+        if cached_plan is not None:
+            return cached_plan
+
+        api_key = os.getenv("DEEPSEEK_API_KEY", "")
+        if not api_key:
+            return fallback_plan(city, category, subcategory, "no_api_key")
+
+        with span("build_prompt"):
+            data = build_payload(city, category, subcategory)
+
+        response = await get_async_client().chat_completions(api_key, data)
+        if response.status_code == 200:
+            with span("decode"):
+                result = response.json()
+            record_usage(result.get("usage"))
+            plan = result["choices"][0]["message"]["content"]
+            with span("cache_store"):
+                await asyncio.to_thread(plan_cache.put, cache_key, plan,
+                                        {"city": city, "category": category, "subcategory": subcategory})
+            return plan
+        else:
+            logger.error(f"API调用失败: {response.status_code} - {response.text}")
+            return fallback_plan(city, category, subcategory, "upstream_status")
+
+    except Exception as e:
+        logger.error(f"生成旅游规划时出错: {e}")
+        return fallback_plan(city, category, subcategory, "error")
+
+
+async def stream_deepseek_api(city, category, subcategory):
+    """以流式方式调用DeepSeek API，逐段产出规划文本（回退逻辑同app.py）"""
+    cache_key = plan_cache_key(city, category, subcategory)
+    cached_plan = await asyncio.to_thread(plan_cache.get, cache_key)
+    if cached_plan is not None:
+        yield cached_plan
+        return
+
+    api_key = os.getenv("DEEPSEEK_API_KEY", "")
+    if not api_key:
+        yield fallback_plan(city, category, subcategory, "no_api_key")
+        return
+
+    data = build_payload(city, category, subcategory, stream=True)
+
+    try:
+        response = await get_async_client().chat_completions(api_key, data, stream=True)
+    except Exception as e:
+        logger.error(f"生成旅游规划时出错: {e}")
+        yield fallback_plan(city, category, subcategory, "error")
+        return
+
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            logger.error(f"API调用失败: {response.status_code} - {response.text}")
+            yield fallback_plan(city, category, subcategory, "upstream_status")
+            return
+
+        chunks = []
+        async for content in aiter_stream_content(response, on_usage=record_usage):
+            chunks.append(content)
+            yield content
+    finally:
+        await response.aclose()
+
+    plan = "".join(chunks)
+    if plan:
+        await asyncio.to_thread(plan_cache.put, cache_key, plan,
+                                {"city": city, "category": category, "subcategory": subcategory})
+
+
+@route("/api/plans")
+async def list_plans(request):
+    """分页列出已保存的规划，可按城市、分类、子类别筛选"""
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        page_size = min(100, max(1, int(request.args.get("page_size", 20))))
+    except ValueError:
+        return jsonify({"error": "page和page_size必须是整数"}, 400)
+
+    plans, total = await asyncio.to_thread(
+        plan_store.list, request.args.get("city"), request.args.get("category"),
+        request.args.get("subcategory"), page, page_size
+    )
+    return jsonify({"plans": plans, "total": total, "page": page, "page_size": page_size})
+
+
+@route("/api/plan/<int:plan_id>")
+async def get_plan(request, plan_id):
+    """获取单个规划（含正文）；?format=json 返回解析好的行程结构代替正文"""
+    output_format = request.args.get("format", "markdown")
+    if output_format not in ("markdown", "json"):
+        return jsonify({"error": "format只能是markdown或json"}, 400)
+    plan = await asyncio.to_thread(plan_store.get, plan_id, output_format == "json")
+    if plan is None:
+        return jsonify({"error": "规划不存在"}, 404)
+    if output_format == "json":
+        plan["itinerary"] = plan["itinerary"].to_dict()
+    return jsonify(plan)
+
+
+@route("/api/search")
+async def search_plans(request):
+    """全文检索已保存的规划，按相关度返回命中片段"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "请提供检索词q"}, 400)
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        page_size = min(100, max(1, int(request.args.get("page_size", 20))))
+    except ValueError:
+        return jsonify({"error": "page和page_size必须是整数"}, 400)
+
+    with span("search"):
+        results, total = await asyncio.to_thread(plan_store.search, query, page_size, (page - 1) * page_size)
+    return jsonify({"query": query, "results": results, "total": total, "page": page, "page_size": page_size})
+
+
+@route("/api/cache/stats")
+async def get_cache_stats(request):
+    """获取规划缓存的命中统计"""
+    return jsonify(plan_cache.stats())
+
+
+@route("/api/plans/writes/<write_id>")
+async def get_plan_write(request, write_id):
+    """按写入ID查询落库后的规划ID；还没落库时返回202"""
+    if not WRITE_ID_PATTERN.fullmatch(write_id):
+        return jsonify({"error": "写入ID无效"}, 404)
+    plan_id = await asyncio.to_thread(plan_store.resolve_write, write_id)
+    if plan_id is None:
+        return jsonify({"write_id": write_id, "plan_id": None, "pending": True}, 202)
+    return jsonify({"write_id": write_id, "plan_id": plan_id})
+
+
+@route("/api/plans/writer")
+async def get_writer_stats(request):
+    """获取后台规划写入器的队列与批次统计"""
+    return jsonify(plan_writer.stats())
+
+
+@route("/api/llm/stats")
+async def get_llm_stats(request):
+    """获取异步大模型客户端的请求计数与限流器状态"""
+    return jsonify(get_async_client().stats())
+
+
+@route("/api/save_plan", methods=("POST",))
+async def save_plan(request):
+    """保存旅游规划（进入预写日志后立即返回202与写入ID，后台批量落库）"""
+    data = request.json() or {}
+    plan = data.get("plan")
+    city = data.get("city")
+    category = data.get("category")
+    subcategory = data.get("subcategory")
+
+    if not plan or not city or not category or not subcategory:
+        return jsonify({"error": "请提供完整信息"}, 400)
+
+    try:
+        result = queued_plan(await store_plan(city, category, subcategory, plan))
+        return jsonify({"success": True, **result}, 202 if result.get("pending") else 200)
+    except Exception as e:
+        logger.error(f"保存规划时出错: {e}")
+        return jsonify({"error": f"保存规划时出错: {e}"}, 500)
@@ -0,0 +1,66 @@
+"""生产环境的多进程启动配置（gunicorn，依赖见 requirements-serving.txt）
+
+    cd travel-planner/backend
+    gunicorn -c gunicorn.conf.py                                            # 同步模式（app:app）
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app  # 异步模式
+
+- 预加载：主进程先导入应用（城市目录、预先压缩的目录响应等只读数据），再fork出工作进程，
+  这些内存页由各进程写时复制共享。导入期间关闭垃圾回收、fork之前gc.freeze()，
+  子进程的垃圾回收不会去改写这些对象的GC头，共享的页就不会被复制
+- 工作进程数默认等于CPU核数（WEB_CONCURRENCY可覆盖），每个工作进程用WEB_THREADS个线程处理请求
+- 平滑重启：kill -HUP <主进程> 逐个启动新的工作进程并让旧进程处理完手上的请求再退出
+  （最多等GRACEFUL_TIMEOUT秒）。预加载模式下HUP不会重新导入代码，发布新代码时先
+  kill -USR2 <主进程> 启动新的主进程，确认正常后再向旧主进程发送 QUIT
+- 工作进程之间共享的状态都在磁盘上：规划缓存的磁盘层（PLAN_CACHE_DIR，任何一个进程生成的规划
+  其他进程都能命中）、规划库（SQLite WAL）、各进程自己的预写日志（PLAN_JOURNAL_DIR）与任务状态
+  （JOB_STATE_DIR，本配置默认打开）。内存层缓存、请求合并、限流器与/metrics的指标仍是每个进程各自一份
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# 本文件先于应用执行，监听地址与进程数也从.env读取
+load_dotenv()
+# 多个工作进程之间通过共享目录查询、取消任务（单进程运行时不需要，应用里默认关闭）
+os.environ.setdefault("JOB_STATE_DIR", "cache/jobs")
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or multiprocessing.cpu_count()
+worker_class = "gthread"
+# SSE流式接口在生成期间一直占用一个线程
+threads = int(os.getenv("WEB_THREADS", "32"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+preload_app = True
+wsgi_app = "app:app"
+
+# 配置文件在预加载应用之前执行：导入期间不做垃圾回收，避免在共享的页里留下空洞
+gc.disable()
+
+
+def when_ready(server):
+    """应用已预加载、即将fork工作进程：把现有对象移出垃圾回收的跟踪范围"""
+    gc.freeze()
+    gc.enable()
+    server.log.info(f"已预加载应用，启动 {server.num_workers} 个工作进程")
+
+
+def post_fork(server, worker):
+    # HUP重新读取本配置时会再次关闭垃圾回收，工作进程里总是重新打开
+    gc.enable()
+
+
+def post_worker_init(worker):
+    """工作进程就绪：打开自己的预写日志，并重放已退出进程遗留的规划"""
+    sys.modules["app"].plan_writer.start()
+
+
+def worker_exit(server, worker):
+    """工作进程退出（平滑重启或停止）：取消还在排队的任务，等运行中的任务结束，再把规划全部落库"""
+    backend = sys.modules.get("app")
+    if backend is None:
+        return
+    backend.job_queue.shutdown(wait=True, cancel_pending=True)
+    backend.plan_writer.shutdown()
@@ -0,0 +1,89 @@
+"""批量预生成旅游规划（缓存预热）
+
+遍历induction.me中所有 城市 × 分类 × 子类别，把规划预先生成到规划缓存中，
+高峰期的请求即可直接从磁盘读取，而不必等待大模型。
+
+已缓存且未过期的条目会被跳过，因此中断后重新运行即可从上次的位置继续。
+
+用法：
+    python warmup.py --concurrency 4 --rate 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app import city_data, plan_cache
+from common.llm_client import get_client
+from common.prompt import build_payload, plan_cache_key
+
+
+def iter_catalog():
+    """遍历目录中的所有 (城市, 分类, 子类别)"""
+    for city in sorted(city_data):
+        for category, subcategories in city_data[city].items():
+            for subcategory in subcategories:
+                yield city, category, subcategory
+
+
+def warm_one(api_key, city, category, subcategory):
+    """生成一条规划并写入缓存，返回 (状态, 耗时)"""
+    start = time.time()
+    response = get_client().chat_completions(api_key, build_payload(city, category, subcategory))
+    if response.status_code != 200:
+        return f"失败 {response.status_code}", time.time() - start
+    plan = response.json()["choices"][0]["message"]["content"]
+    plan_cache.put(
+        plan_cache_key(city, category, subcategory), plan,
+        meta={"city": city, "category": category, "subcategory": subcategory}
+    )
+    return "完成", time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量预生成旅游规划到规划缓存")
+    parser.add_argument("--concurrency", type=int, default=4, help="最大并发请求数")
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒最多发起的请求数（0表示不限）")
+    parser.add_argument("--min-ttl", type=int, default=24 * 3600,
+                        help="剩余有效期少于该秒数的缓存条目也会重新生成")
+    args = parser.parse_args()
+
+    api_key = os.getenv("DEEPSEEK_API_KEY", "")
+    if not api_key:
+        print("未配置DEEPSEEK_API_KEY，无法预生成规划")
+        return 1
+
+    entries = list(iter_catalog())
+    todo = [entry for entry in entries if not plan_cache.is_fresh(plan_cache_key(*entry), args.min_ttl)]
+    print(f"目录共 {len(entries)} 条，已缓存 {len(entries) - len(todo)} 条，待生成 {len(todo)} 条")
+    if not todo:
+        return 0
+
+    # 预热沿用共享客户端的限流器：设置速率上限与并发上限，遇到429会自动降速
+    get_client().governor.configure(rate=args.rate, max_in_flight=args.concurrency)
+    start = time.time()
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(warm_one, api_key, *entry): entry for entry in todo}
+        for future in as_completed(futures):
+            city, category, subcategory = futures[future]
+            try:
+                status, elapsed = future.result()
+            except Exception as e:
+                status, elapsed = f"出错 {e}", 0.0
+            done += 1
+            if status != "完成":
+                failed += 1
+            throughput = done / (time.time() - start)
+            print(f"[{done}/{len(todo)}] {city}/{category}/{subcategory} {status} "
+                  f"({elapsed:.1f}s, {throughput:.2f} 条/秒)")
+
+    total = time.time() - start
+    print(f"预生成结束：成功 {done - failed} 条，失败 {failed} 条，用时 {total:.1f}s，"
+          f"平均 {done / total:.2f} 条/秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())